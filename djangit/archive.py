@@ -0,0 +1,256 @@
+"""
+  cold storage: versions that only commits older than a threshold can reach move,
+  with the through rows of their additions, to archive tables (see djangit.models.archive.ArchivedVersionBase)
+
+  a version stays hot while it's added by a recent commit, live at an old commit that has recent children,
+  or referenced by anything other than a commit, so resolving recent commits never needs the archive
+  resolving old commits (version_sets, version_for) transparently merges both tiers,
+  so do the readers of additions elsewhere (merge, pack, feed, log, rewrite) through addition_tiers
+  lazy querysets (at_commit, version_sets(lazy=True)) only read the hot tables, they raise
+  ArchivedHistoryException when some of the versions live at the commit are archived
+  archived commits can't be rebased or squashed, and versions a new commit adds again are unarchived first
+
+  pointer records stay in their tables: they are shared by versions of both tiers and only hold ids
+"""
+from django.db import router, transaction
+from django.db.models import Q, F, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .gc import _references
+from .models.bulk import _through_attrs, _bulk_create_through_rows
+
+
+def addition_tiers(version_cls):
+  """
+    [ (model, through, commit_name, version_name) ] for each table holding additions of version_cls:
+    the hot table with its adds_* through table, then the archive (when there is one) with its added_in through table
+    commit_name and version_name are the names of the through model's foreign keys
+  """
+  commit_cls = version_cls.commit_model
+  m2m_field = commit_cls._meta.get_field(commit_cls._add_attr_name_for_version_cls(version_cls))
+  tiers = [ (version_cls, m2m_field.remote_field.through, m2m_field.m2m_field_name(), m2m_field.m2m_reverse_field_name()) ]
+  archive_cls = version_cls._archive_cls
+  if archive_cls is not None:
+    m2m_field = archive_cls._meta.get_field('added_in')
+    tiers.append((archive_cls, m2m_field.remote_field.through, m2m_field.m2m_reverse_field_name(), m2m_field.m2m_field_name()))
+  return tiers
+
+
+def _archived_additions(version_cls, commits, using=None):
+  (through, archive_attr, commit_attr) = _through_attrs(version_cls._archive_cls._meta.get_field('added_in'))
+  return through._base_manager.using(using).filter(**{ f"{commit_attr}__in": commits })
+
+
+def touches_archive(version_cls, commit):
+  """ whether resolving commit needs version_cls's archive """
+  return (
+    version_cls._archive_cls is not None and
+    _archived_additions(version_cls, commit._chain_queryset(), using=commit._state.db).exists()
+  )
+
+
+def has_archived_additions(commits):
+  """ whether any commit of the commits queryset added versions that are archived by now """
+  return any(
+    _archived_additions(version_cls, commits, using=commits.db).exists()
+    for version_cls in commits.model.tracked_models.values()
+    if version_cls._archive_cls is not None
+  )
+
+
+def _live_in_tier(version_cls, commit, archived=False):
+  """
+    the eternals of version_cls whose version live at commit is in the hot table (or in the archive when archived),
+    annotated with that version's id as live_id
+    shaped like VersionQuerySet.hot_at_commit, so using it as an `__in` subquery scans the eternals once
+  """
+  eternal_cls = version_cls._eternal_cls
+  (model, other) = (version_cls, version_cls._archive_cls)
+  if archived:
+    (model, other) = (other, model)
+  chain = commit._chain_queryset()
+
+  def added_in_chain(model):
+    return model._base_manager.filter(added_in__in=chain).values('eternal_id')
+
+  additions = (
+    model._base_manager
+      .filter(eternal_id=OuterRef('pk'), added_in__in=chain)
+      .order_by('-added_in__level')
+  )
+  removals = (
+    eternal_cls.objects
+      .filter(id=OuterRef('pk'), removed_in__in=chain)
+      .order_by('-removed_in__level')
+  )
+  rows = eternal_cls.objects.using(commit._state.db)
+  if archived:
+    # the archive is expected to be small next to the eternals, only the ones it holds additions of are scanned
+    rows = rows.filter(pk__in=added_in_chain(model))
+  rows = (
+    rows
+      .annotate(live_id=Subquery(additions.values('id')[:1]))
+      .annotate(live_depth=Subquery(additions.values('added_in__level')[:1]))
+      .filter(live_id__isnull=False)
+      .annotate(removal_depth=Subquery(removals.values('removed_in__level')[:1]))
+      .filter(Q(live_depth__gt=F('removal_depth')) | Q(removal_depth__isnull=True))
+  )
+  if other is None:
+    return rows
+  # a deeper addition in the other tier wins, only objects with additions in both tiers need to compare them
+  deeper_in_other = Exists(
+    other._base_manager.filter(eternal_id=OuterRef('pk'), added_in__in=chain, added_in__level__gt=OuterRef('live_depth'))
+  )
+  return rows.exclude(Q(pk__in=added_in_chain(other)) & deeper_in_other)
+
+
+def live_version_ids(version_cls, commit):
+  """
+    (hot ids, archived ids): lazy querysets of the ids of the versions live at commit in each tier,
+    archived ids is None when version_cls has no archive
+  """
+  hot_ids = _live_in_tier(version_cls, commit).values('live_id')
+  if version_cls._archive_cls is None:
+    return (hot_ids, None)
+  return (hot_ids, _live_in_tier(version_cls, commit, archived=True).values('live_id'))
+
+
+def live_eternals(version_cls, commit):
+  """
+    lazy queryset of the eternals of version_cls live at commit, over the hot table and the archive
+    one scan of the eternals, comparing the deepest addition of each tier with the deepest removal
+  """
+  chain = commit._chain_queryset()
+  eternal_cls = version_cls._eternal_cls
+
+  def addition_depth(model):
+    return Subquery(
+      model._base_manager.filter(eternal_id=OuterRef('pk'), added_in__in=chain)
+        .order_by('-added_in__level')
+        .values('added_in__level')[:1]
+    )
+
+  removal_depth = Subquery(
+    eternal_cls.objects.filter(id=OuterRef('pk'), removed_in__in=chain)
+      .order_by('-removed_in__level')
+      .values('removed_in__level')[:1]
+  )
+  depth = Coalesce(addition_depth(version_cls), -1)
+  if version_cls._archive_cls is not None:
+    depth = Greatest(depth, Coalesce(addition_depth(version_cls._archive_cls), -1))
+  return (
+    eternal_cls.objects.using(commit._state.db)
+      .annotate(depth=depth, removal_depth=removal_depth)
+      .filter(depth__gte=0)
+      .filter(Q(removal_depth__isnull=True) | Q(removal_depth__lt=F('depth')))
+  )
+
+
+def has_live_archived_versions(version_cls, commit):
+  """ whether some of the versions live at commit are archived, i.e. whether the hot table alone can't resolve it """
+  if version_cls._archive_cls is None:
+    return False
+  return _live_in_tier(version_cls, commit, archived=True).exists()
+
+
+def versions_with_archive(version_cls, commit, eternal_ids=None):
+  """
+    like version_cls.objects.at_commit(commit), over the hot table and the archive
+    returns { eternal_id : version }, archived versions are restored as instances of version_cls
+  """
+  using = commit._state.db
+  (hot_ids, archived_ids) = live_version_ids(version_cls, commit)
+  if eternal_ids is not None:
+    (hot_ids, archived_ids) = (hot_ids.filter(pk__in=eternal_ids), archived_ids.filter(pk__in=eternal_ids))
+
+  versions = { v.eternal_id: v for v in version_cls._base_manager.using(using).filter(pk__in=hot_ids) }
+  for archived in version_cls._archive_cls._base_manager.using(using).filter(pk__in=archived_ids):
+    versions[archived.eternal_id] = archived.restore()
+  return versions
+
+
+def archive_versions(commit_cls, before, batch_size=1000, using=None):
+  """
+    moves the versions only commits finalized before `before` can reach into the archive tables,
+    batch_size versions per transaction
+    returns { version_model_label : number of versions archived }
+  """
+  using = using or router.db_for_write(commit_cls)
+  commits = commit_cls.objects.using(using)
+  old = commits.filter(checksum__isnull=False, committed_at__lt=before)
+  recent = commits.exclude(pk__in=old.values('pk'))
+  # what's live where old history meets recent history
+  boundaries = list(old.filter(children_commits__in=recent).distinct())
+
+  counts = {}
+  for version_cls in commit_cls.tracked_models.values():
+    archive_cls = version_cls._archive_cls
+    if archive_cls is None:
+      continue
+
+    candidates = (
+      version_cls._base_manager.using(using)
+        .filter(added_in__in=old)
+        .exclude(added_in__in=recent)
+        .filter(*_references(version_cls, ignored=(commit_cls,)))
+    )
+    for boundary in boundaries:
+      candidates = candidates.exclude(pk__in=version_cls.objects.hot_at_commit(boundary).values('pk'))
+    candidates = candidates.distinct()
+
+    (through, commit_attr, version_attr) = _through_attrs(
+      commit_cls._meta.get_field(commit_cls._add_attr_name_for_version_cls(version_cls))
+    )
+    columns = [ f.attname for f in version_cls._meta.concrete_fields ]
+    counts[version_cls._meta.label] = 0
+    while True:
+      rows = list(candidates.values(*columns)[:batch_size])
+      if not rows:
+        break
+      ids = [ row['id'] for row in rows ]
+      links = through._base_manager.using(using).filter(**{ f"{version_attr}__in": ids })
+      with transaction.atomic(using=using):
+        archive_cls._base_manager.using(using).bulk_create([ archive_cls(**row) for row in rows ], batch_size=batch_size)
+        _bulk_create_through_rows(
+          archive_cls._meta.get_field('added_in'),
+          list(links.values_list(version_attr, commit_attr)),
+          batch_size,
+          using=using,
+        )
+        links.delete()
+        version_cls._base_manager.using(using).filter(pk__in=ids).delete()
+      counts[version_cls._meta.label] += len(ids)
+
+  return counts
+
+
+def unarchive_versions(version_cls, ids, batch_size=1000, using=None):
+  """
+    moves the archived versions among ids back to the hot table, with the through rows of their additions,
+    e.g. before a new commit adds them again (ids of versions that aren't archived are ignored)
+    returns the versions that were moved
+  """
+  archive_cls = version_cls._archive_cls
+  if archive_cls is None:
+    return []
+  using = using or router.db_for_write(version_cls)
+  archived = list(archive_cls._base_manager.using(using).filter(pk__in=ids))
+  if not archived:
+    return []
+
+  commit_cls = version_cls.commit_model
+  archived_ids = [ a.pk for a in archived ]
+  (through, archive_attr, commit_attr) = _through_attrs(archive_cls._meta.get_field('added_in'))
+  links = through._base_manager.using(using).filter(**{ f"{archive_attr}__in": archived_ids })
+  versions = [ a.restore() for a in archived ]
+  with transaction.atomic(using=using):
+    version_cls._base_manager.using(using).bulk_create(versions, batch_size=batch_size)
+    _bulk_create_through_rows(
+      commit_cls._meta.get_field(commit_cls._add_attr_name_for_version_cls(version_cls)),
+      list(links.values_list(commit_attr, archive_attr)),
+      batch_size,
+      using=using,
+    )
+    links.delete()
+    archive_cls._base_manager.using(using).filter(pk__in=archived_ids).delete()
+  return versions
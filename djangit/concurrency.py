@@ -0,0 +1,70 @@
+"""
+  concurrency for writers committing onto the same branch: inserting a commit takes a pessimistic lock on its tree,
+  moving a branch head is optimistic:
+
+  * commits are append-only: a new commit is only ever inserted below its parent, and finalized once,
+    by a conditional update that leaves the tree coordinates alone (CommitBase.commit)
+  * insertions into a commit tree take a pessimistic lock: create_child_locked selects the tree's root row for update,
+    so the lft/rght shifts MPTT makes for concurrent insertions are serialized in a single lock order instead of
+    deadlocking. writers of one tree insert one at a time, whatever branch they commit to, and the lock is held until
+    their transaction ends, so commit throughput on one tree does not grow with the number of writers
+  * branch heads move by compare-and-swap (RefBase.compare_and_swap), so a writer that built on a stale head
+    finds out instead of overwriting another writer's commit
+  * commit_to_branch runs each attempt in one transaction; on conflict it rolls back and retries on the new head,
+    after an exponential, jittered backoff
+"""
+import time
+import random
+
+from django.db import transaction, OperationalError
+
+from .utils import StaleHeadException
+
+
+# lock timeouts and deadlocks surface as OperationalError
+RETRYABLE = (StaleHeadException, OperationalError)
+
+
+def create_child_locked(parent, **commit_attrs):
+  """
+    inserts a commit below parent under a pessimistic lock: the row of its tree's root is selected for update
+    and stays locked until the caller's transaction ends, blocking every other insertion into the same tree
+  """
+  commit_cls = parent.__class__
+  commits = commit_cls.objects.db_manager(parent._state.db)
+  with transaction.atomic(using=commits.db):
+    tree_id = commits.filter(pk=parent.pk).values('tree_id')
+    list(commits.select_for_update().filter(tree_id__in=tree_id, level=0).values_list('pk', flat=True))
+    # mptt shifts the tree from the parent's coordinates, they have to be read under the lock
+    parent = commits.get(pk=parent.pk)
+    return commits.create(parent_commit=parent, **commit_attrs)
+
+
+def _backoff(attempt, backoff, max_backoff):
+  return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+def commit_to_branch(ref, stage, attempts=8, backoff=0.01, max_backoff=1.0, **commit_attrs):
+  """
+    creates a child of ref's head, lets stage(commit) add its versions and removals, finalizes it and advances ref
+
+    each attempt is one transaction, so stage is called again (on the new head) after a conflict
+    and has to create the versions it stages itself; call this outside of any transaction, so attempts can roll back
+    returns the finalized commit, raises the last conflict after `attempts` attempts
+  """
+  using = ref._state.db
+  refs = ref.__class__.objects.using(using)
+  for attempt in range(attempts):
+    try:
+      with transaction.atomic(using=using):
+        ref = refs.get(pk=ref.pk)
+        head = ref.head
+        commit = create_child_locked(head, **commit_attrs)
+        stage(commit)
+        commit.commit()
+        ref.compare_and_swap(head, commit)
+      return commit
+    except RETRYABLE:
+      if attempt == attempts - 1:
+        raise
+      time.sleep(_backoff(attempt, backoff, max_backoff))
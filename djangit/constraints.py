@@ -0,0 +1,132 @@
+"""
+  constraints that can't be database constraints because several versions of an object coexist,
+  so they are checked when a commit is finalized instead, e.g.
+
+    class Team(VersionedModel):
+      commit_model = Commit
+      versioned_constraints = [ UniqueTogether(['name']), EternalExists('division') ]
+
+  each check is a query restricted to the objects the commit touches, against the state resolved at the commit
+  when the commit reaches a model's archive (see djangit.archive), that state covers the archived versions too,
+  which costs one more query per model and validation
+"""
+import abc
+
+from django.db.models import Exists, OuterRef
+
+from .archive import touches_archive, live_eternals, live_version_ids
+
+
+class ConstraintViolation:
+  def __init__(self, constraint, version_cls, eternal_id, message):
+    self.constraint = constraint
+    self.version_cls = version_cls
+    self.eternal_id = eternal_id
+    self.message = message
+
+  def __repr__(self):
+    return f"<ConstraintViolation - {self.version_cls.__name__} {self.eternal_id}: {self.message}>"
+
+
+def _reaches_archive(version_cls, commit):
+  """ touches_archive, remembered for the rest of commit.constraint_violations() """
+  reach = getattr(commit, '_archive_reach', None)
+  if reach is None:
+    return touches_archive(version_cls, commit)
+  if version_cls not in reach:
+    reach[version_cls] = touches_archive(version_cls, commit)
+  return reach[version_cls]
+
+
+def _live_ids(version_cls, commit):
+  """ (hot ids, archived ids) of the versions live at commit, archived ids is None when the archive isn't involved """
+  if _reaches_archive(version_cls, commit):
+    return live_version_ids(version_cls, commit)
+  return (version_cls.objects.hot_at_commit(commit).values('id'), None)
+
+
+def _live_eternal_ids(version_cls, commit):
+  if _reaches_archive(version_cls, commit):
+    return live_eternals(version_cls, commit).values('pk')
+  return version_cls.objects.hot_at_commit(commit).values('eternal_id')
+
+
+class VersionedConstraint(abc.ABC):
+  @abc.abstractmethod
+  def violations(self, version_cls, commit):
+    """ returns a list of ConstraintViolation """
+
+  @staticmethod
+  def _added_by(version_cls, commit):
+    """ versions commit adds that are live at commit """
+    return version_cls.objects.hot_at_commit(commit).filter(added_in=commit)
+
+
+class UniqueTogether(VersionedConstraint):
+  def __init__(self, fields):
+    self.fields = list(fields)
+
+  def violations(self, version_cls, commit):
+    (hot_ids, archived_ids) = _live_ids(version_cls, commit)
+
+    def clashing(model, ids):
+      return Exists(
+        model._base_manager
+          .filter(id__in=ids, **{ f: OuterRef(f) for f in self.fields })
+          .exclude(eternal_id=OuterRef('eternal_id'))
+      )
+
+    clashes = clashing(version_cls, hot_ids)
+    if archived_ids is not None:
+      clashes |= clashing(version_cls._archive_cls, archived_ids)
+    return [
+      ConstraintViolation(
+        self,
+        version_cls,
+        v.eternal_id,
+        f"another {version_cls.__name__} already has the same {', '.join(self.fields)}",
+      )
+      for v in self._added_by(version_cls, commit).filter(clashes)
+    ]
+
+
+class EternalExists(VersionedConstraint):
+  """
+    field is a foreign key to another versioned model's eternal model,
+    which has to be live wherever the referencing version is
+  """
+  def __init__(self, field):
+    self.field = field
+
+  def violations(self, version_cls, commit):
+    field = version_cls._meta.get_field(self.field)
+    target_cls = field.related_model._version_class
+    live_targets = _live_eternal_ids(target_cls, commit)
+    removed_targets = getattr(commit, commit._rm_attr_name_for_version_cls(target_cls)).values('id')
+    (hot_ids, archived_ids) = _live_ids(version_cls, commit)
+
+    def pointing_to_removed(model, ids):
+      return (
+        model._base_manager
+          .filter(id__in=ids, **{ f"{field.attname}__in": removed_targets })
+          .values_list('eternal_id', field.attname)
+      )
+
+    dangling = (
+      # versions added by the commit that point to a missing object
+      self._added_by(version_cls, commit).exclude(**{ f"{field.attname}__in": live_targets })
+        .values_list('eternal_id', field.attname)
+        # live versions pointing to an object the commit removes
+        .union(pointing_to_removed(version_cls, hot_ids))
+    )
+    if archived_ids is not None:
+      dangling = dangling.union(pointing_to_removed(version_cls._archive_cls, archived_ids))
+    return [
+      ConstraintViolation(
+        self,
+        version_cls,
+        eternal_id,
+        f"{self.field} {target_id} does not exist at this commit",
+      )
+      for (eternal_id, target_id) in dangling
+    ]
@@ -0,0 +1,144 @@
+"""
+  change feed: every committed addition and removal, in commit order, for downstream consumers
+
+  commits are numbered with a feed position when they're finalized (see CommitBase._next_feed_positions),
+  and read by position with keyset pagination, and each commit's changes are streamed with chunked queries,
+  so memory stays constant whatever the size of the history; reading the feed doesn't write, it works on replicas
+"""
+import heapq
+
+from django.db.models import Max
+
+from .models.bulk import _pointer_fields, _related_ids
+from .utils import chunked
+
+
+def resolve_cursor(commit_cls, cursor, using=None):
+  """ cursor is a commit, a commit checksum or a commit id """
+  if cursor is None or isinstance(cursor, commit_cls):
+    return cursor
+  commits = commit_cls.objects.using(using)
+  commit = commits.filter(checksum=str(cursor)).first()
+  if commit is None and str(cursor).isdigit():
+    commit = commits.filter(pk=int(cursor), checksum__isnull=False).first()
+  if commit is None:
+    raise commit_cls.DoesNotExist(f"No finalized commit matches cursor {cursor}")
+  return commit
+
+
+def _resolve_position(commit_cls, cursor, after_commit, using=None):
+  """
+    the feed position to resume after: cursor is a position the feed emitted, or a finalized commit or its checksum,
+    after_commit anything resolve_cursor takes
+    a position stays a valid cursor once the commit at it was renumbered, any up to the last one handed out is accepted
+  """
+  if after_commit is not None:
+    if cursor is not None:
+      raise ValueError("Pass either a cursor or after_commit")
+    cursor = resolve_cursor(commit_cls, after_commit, using=using)
+  if cursor is None:
+    return 0
+  if isinstance(cursor, commit_cls) or not str(cursor).isdigit():
+    commit = resolve_cursor(commit_cls, cursor, using=using)
+    if commit.feed_position is None:
+      raise commit_cls.DoesNotExist(f"Commit {commit.pk} is not finalized, it has no feed position")
+    return commit.feed_position
+  position = int(cursor)
+  last = commit_cls._base_manager.using(using).aggregate(last=Max('feed_position'))['last'] or 0
+  if position > last:
+    raise commit_cls.DoesNotExist(f"No feed position {position}, the last one is {last}")
+  return position
+
+
+def _commits_after(commit_cls, position, chunk_size, using=None):
+  numbered = commit_cls.objects.using(using).filter(feed_position__isnull=False).order_by('feed_position')
+  while True:
+    page = list(numbered.filter(feed_position__gt=position)[:chunk_size])
+    yield from page
+    if len(page) < chunk_size:
+      return
+    position = page[-1].feed_position
+
+
+def _additions(commit, version_cls, chunk_size):
+  pointer_fields = _pointer_fields(version_cls)
+  columns = [ f.attname for f in version_cls._content_fields() ]
+  # additions of old commits may have moved to the archive (see djangit.archive), both tiers are merged by id
+  tiers = [
+    model._base_manager.using(commit._state.db)
+      .filter(added_in=commit)
+      .order_by('pk')
+      .values('pk', 'eternal_id', 'checksum', *columns)
+      .iterator(chunk_size=chunk_size)
+    for model in (version_cls, version_cls._archive_cls)
+    if model is not None
+  ]
+  rows = heapq.merge(*tiers, key=lambda row: row['pk'])
+  for batch in chunked(rows, chunk_size):
+    related_by_field = {
+      f: _related_ids(f.related_model, [ row[f.attname] for row in batch if row[f.attname] is not None ])
+      for f in pointer_fields
+    }
+    for row in batch:
+      fields = { name: row[name] for name in columns }
+      for (f, related) in related_by_field.items():
+        del fields[f.attname]
+        fields[f.name] = related[row[f.attname]] if row[f.attname] is not None else []
+      yield (row['eternal_id'], row['pk'], row['checksum'], fields)
+
+
+def change_feed(commit_cls, cursor=None, chunk_size=500, using=None, after_commit=None):
+  """
+    returns an iterator of one dict per change of every finalized commit after cursor (from the beginning when None),
+    the position of a commit event or a commit's checksum, or after after_commit, a commit id or checksum
+    (see resolve_cursor); unknown cursors raise the commit model's DoesNotExist:
+
+      { "op": "add", "commit": id, "model": name, "eternal_id": id, "version_id": id, "checksum": ..., "fields": {...} }
+      { "op": "remove", "commit": id, "model": name, "eternal_id": id }
+
+    followed by a { "op": "commit", "commit": id, "position": ..., "checksum": ..., ... } event once a commit
+    is fully emitted; consumers that persist the position of the last of those can pass it back as cursor
+    and resume without re-reading history, it stays valid whatever happens to that commit later
+    commits rewritten since they were emitted (see djangit.rewrite) are emitted again, with their new checksums
+    pointer fields are emitted as sorted lists of related ids
+  """
+  # resolved before the first event is asked for, so a bad cursor fails at the call
+  position = _resolve_position(commit_cls, cursor, after_commit, using=using)
+  return _events(commit_cls, position, chunk_size, using)
+
+
+def _events(commit_cls, position, chunk_size, using):
+  for commit in _commits_after(commit_cls, position, chunk_size, using=using):
+    for (name, version_cls) in sorted(commit_cls.tracked_models.items()):
+      for (eternal_id, version_id, checksum, fields) in _additions(commit, version_cls, chunk_size):
+        yield {
+          "op": "add",
+          "commit": commit.pk,
+          "model": name,
+          "eternal_id": eternal_id,
+          "version_id": version_id,
+          "checksum": checksum,
+          "fields": fields,
+        }
+
+      removed_ids = (
+        getattr(commit, commit._rm_attr_name_for_version_cls(version_cls))
+          .order_by('pk')
+          .values_list('pk', flat=True)
+      )
+      for eternal_id in removed_ids.iterator(chunk_size=chunk_size):
+        yield {
+          "op": "remove",
+          "commit": commit.pk,
+          "model": name,
+          "eternal_id": eternal_id,
+        }
+
+    yield {
+      "op": "commit",
+      "commit": commit.pk,
+      "position": commit.feed_position,
+      "checksum": commit.checksum,
+      "parent": commit.parent_commit_id,
+      "committed_at": commit.committed_at,
+    }
@@ -0,0 +1,92 @@
+"""
+  garbage collection of rows no commit can reach:
+  versions no commit adds, pointer records no version points to,
+  and eternals that no version, commit or foreign key references
+
+  copy-on-write editing (save_or_create, set_m2m, VersionModelForm) and create_initial leave such rows behind
+  rows younger than the grace period are left alone, they may belong to a draft that isn't attached to a commit yet
+"""
+import time
+import datetime
+
+from django.db import router, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models.bulk import _pointer_fields
+
+
+def _references(model, ignored=()):
+  """
+    an anti-join condition per reverse relation pointing to model: m2m through tables and foreign keys alike
+    relations whose related model is in ignored are skipped
+  """
+  conditions = []
+  for rel in model._meta.related_objects:
+    if rel.related_model in ignored:
+      continue
+    if rel.many_to_many:
+      through = rel.through
+      referencing = through._base_manager.filter(**{ rel.field.m2m_reverse_field_name(): OuterRef('pk') })
+    else:
+      referencing = rel.related_model._base_manager.filter(**{ rel.field.name: OuterRef('pk') })
+    conditions.append(~Exists(referencing))
+  return conditions
+
+
+def unreachable(model, cutoff, using=None):
+  """ rows of model created before cutoff that nothing references """
+  return model._base_manager.using(using).filter(*_references(model), created_at__lt=cutoff)
+
+
+def _delete_in_batches(queryset, batch_size, pause):
+  deleted = 0
+  while True:
+    pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+    if not pks:
+      return deleted
+    with transaction.atomic(using=queryset.db):
+      # the anti-joins are re-checked by the delete itself, in case a row got referenced in the meantime
+      queryset.filter(pk__in=pks).delete()
+    deleted += len(pks)
+    if pause:
+      time.sleep(pause)
+
+
+def collect_garbage(commit_cls, grace=datetime.timedelta(days=1), batch_size=1000, pause=0, dry_run=False, using=None):
+  """
+    deletes unreachable rows of commit_cls's tracked models, their eternals and their pointer records
+    batch_size rows at a time, sleeping pause seconds between batches
+    returns { model_label : number of rows reclaimed (or reclaimable, with dry_run) }
+  """
+  using = using or router.db_for_write(commit_cls)
+  cutoff = timezone.now() - grace
+  version_models = list(commit_cls.tracked_models.values())
+  pointer_models = list(dict.fromkeys(
+    f.related_model for version_cls in version_models for f in _pointer_fields(version_cls)
+  ))
+  eternal_models = [ version_cls._eternal_cls for version_cls in version_models ]
+
+  counts = { model._meta.label: 0 for model in [ *version_models, *pointer_models, *eternal_models ] }
+
+  if dry_run:
+    # a version that only unreachable versions reference is reported by the real run, not by this count
+    for model in [ *version_models, *pointer_models, *eternal_models ]:
+      counts[model._meta.label] = unreachable(model, cutoff, using).count()
+    return counts
+
+  # versions can reference each other, e.g. Employee.team, so versions are swept until nothing else frees up
+  # pointer records and eternals are only referenced by versions and commits, one sweep each is enough
+  while True:
+    swept = 0
+    for model in version_models:
+      deleted = _delete_in_batches(unreachable(model, cutoff, using), batch_size, pause)
+      counts[model._meta.label] += deleted
+      swept += deleted
+    if not swept:
+      break
+
+  for model in [ *pointer_models, *eternal_models ]:
+    counts[model._meta.label] += _delete_in_batches(unreachable(model, cutoff, using), batch_size, pause)
+
+  return counts
@@ -0,0 +1,221 @@
+"""
+  read-side history queries: commit logs, per-object history and blame
+"""
+import json
+import operator
+from functools import reduce
+
+from django.db.models import OuterRef, Subquery, Exists, Count, IntegerField, Q, F
+from django.db.models.functions import Coalesce
+
+from .models.proxy_models import _RealPointerField
+from .archive import addition_tiers
+
+
+def _changes_count(through, commit_name):
+  """ correlated subquery counting a commit's rows in a through table, whose foreign key to commits is commit_name """
+  return Coalesce(
+    Subquery(
+      through._base_manager
+        .filter(**{ commit_name: OuterRef('pk') })
+        .order_by()
+        .values(commit_name)
+        .annotate(n=Count('*'))
+        .values('n')[:1],
+      output_field=IntegerField(),
+    ),
+    0,
+  )
+
+
+def commit_log(head, before_level=None, page_size=50):
+  """
+    returns (page, next_cursor) for head's ancestry (head included), newest first
+
+    each commit of the page gets a change_counts attribute of the form
+
+      { version_model_name : (number_of_versions_added, number_of_objects_removed) }
+
+    pages are keyed on level, which is unique within a chain: pass next_cursor back as before_level
+    to get the next page, it is None on the last page
+    a page is a single query, whatever the depth of the history
+  """
+  commit_cls = head.__class__
+  count_names = {}
+  annotations = {}
+  for (name, cls) in commit_cls.tracked_models.items():
+    add_name = f"{commit_cls._add_attr_name_for_version_cls(cls)}_count"
+    rm_name = f"{commit_cls._rm_attr_name_for_version_cls(cls)}_count"
+    count_names[name] = (add_name, rm_name)
+    # additions of old commits may have moved to the archive, see djangit.archive
+    annotations[add_name] = reduce(operator.add, [
+      _changes_count(through, commit_name)
+      for (_model, through, commit_name, _version_name) in addition_tiers(cls)
+    ])
+    rm_field = commit_cls._meta.get_field(commit_cls._rm_attr_name_for_version_cls(cls))
+    annotations[rm_name] = _changes_count(rm_field.remote_field.through, rm_field.m2m_field_name())
+
+  (page, next_cursor) = paginate_by_level(
+    head._chain_queryset().annotate(**annotations),
+    before_level,
+    page_size,
+  )
+
+  for c in page:
+    c.change_counts = {
+      name: (getattr(c, add_name), getattr(c, rm_name))
+      for (name, (add_name, rm_name)) in count_names.items()
+    }
+
+  return (page, next_cursor)
+
+
+def paginate_by_level(commits, before_level=None, page_size=50):
+  """
+    keyset pagination of commits from a single chain, newest first
+    returns (page, next_cursor), next_cursor is None on the last page
+  """
+  commits = commits.order_by('-level')
+  if before_level is not None:
+    commits = commits.filter(level__lt=before_level)
+
+  page = list(commits[:page_size + 1])
+  next_cursor = page[page_size - 1].level if len(page) > page_size else None
+  return (page[:page_size], next_cursor)
+
+
+def object_history(head, eternal):
+  """
+    lazy queryset of the commits in head's chain (head included) that added a version of eternal or removed it,
+    newest first (the equivalent of git log -- path)
+
+    commits are annotated with 
+    * added_version_id: the version of eternal they added, if any
+    * removed: whether they removed eternal
+    this is a single query, driven by the indexes on the through tables' foreign keys
+  """
+  commit_cls = head.__class__
+  version_cls = eternal._version_class
+  rm_field = commit_cls._meta.get_field(commit_cls._rm_attr_name_for_version_cls(version_cls))
+
+  removals = rm_field.remote_field.through._base_manager.filter(**{
+    rm_field.m2m_reverse_field_name(): eternal,
+  })
+  touching = Q(pk__in=removals.values(rm_field.m2m_field_name()))
+  added_version_ids = []
+  # additions of old commits may have moved to the archive, see djangit.archive
+  for (_model, through, commit_name, version_name) in addition_tiers(version_cls):
+    adds = through._base_manager.filter(**{ f"{version_name}__eternal": eternal })
+    touching |= Q(pk__in=adds.values(commit_name))
+    added_version_ids.append(
+      Subquery(adds.filter(**{ commit_name: OuterRef('pk') }).values(f"{version_name}_id")[:1])
+    )
+
+  return (
+    head._chain_queryset()
+      .filter(touching)
+      .annotate(
+        added_version_id=Coalesce(*added_version_ids) if len(added_version_ids) > 1 else added_version_ids[0],
+        removed=Exists(removals.filter(**{ rm_field.m2m_field_name(): OuterRef('pk') })),
+      )
+      .order_by('-level')
+  )
+
+
+def _comparable_columns(version_cls, version_name):
+  """
+    the columns blame compares successive versions on, as { field_name : lookup }
+    pointer fields compare on their pointer's checksum, falling back to the pointer id while it isn't finalized
+  """
+  if version_cls.track_field_digests:
+    return { 'field_digests': f"{version_name}__field_digests" }
+
+  columns = {}
+  for f in version_cls._content_fields():
+    if isinstance(f, _RealPointerField):
+      columns[f.name] = f"{version_name}__{f.name}__checksum"
+      columns[f"{f.name}_pointer"] = f"{version_name}__{f.attname}"
+    else:
+      columns[f.name] = f"{version_name}__{f.attname}"
+  return columns
+
+
+def _field_values(version_cls, row):
+  """ turns a row of comparable columns into { field_name : comparable value } """
+  if version_cls.track_field_digests:
+    if row['column_field_digests'] is None:
+      # versions that aren't finalized yet have no digests stored
+      return json.loads(version_cls._base_manager.get(pk=row['blamed_version_id'])._compute_field_digests())
+    return json.loads(row['column_field_digests'])
+
+  values = {}
+  for f in version_cls._content_fields():
+    value = row[f"column_{f.name}"]
+    if isinstance(f, _RealPointerField) and value is None:
+      pointer_id = row[f"column_{f.name}_pointer"]
+      value = pointer_id and f"pointer-{pointer_id}"
+    values[f.name] = value
+  return values
+
+
+def blame(eternal, commit):
+  """
+    returns { field_name : commit } naming, for each field of eternal as of commit, 
+    the commit of the chain that last changed it
+    returns None if eternal isn't live at commit
+
+    every addition of eternal in the chain is read in a single fetch (archived ones included, see djangit.archive),
+    and only the comparable columns are selected (just the digests, for models with track_field_digests)
+    removals reset blame, a re-added object counts as newly created
+  """
+  version_cls = eternal._version_class
+  commit_cls = commit.__class__
+  rm_field = commit_cls._meta.get_field(commit_cls._rm_attr_name_for_version_cls(version_cls))
+  chain = commit._chain_queryset()
+
+  (hot, *archived) = [
+    through._base_manager
+      .filter(**{ f"{commit_name}__in": chain, f"{version_name}__eternal": eternal })
+      .values(
+        blamed_commit_id=F(f"{commit_name}_id"),
+        blamed_level=F(f"{commit_name}__level"),
+        blamed_version_id=F(f"{version_name}_id"),
+        **{ f"column_{name}": F(lookup) for (name, lookup) in _comparable_columns(version_cls, version_name).items() }
+      )
+    for (_model, through, commit_name, version_name) in addition_tiers(version_cls)
+  ]
+  additions = hot.union(*archived, all=True)
+  removals = (
+    rm_field.remote_field.through._base_manager
+      .filter(**{ f"{rm_field.m2m_field_name()}__in": chain, rm_field.m2m_reverse_field_name(): eternal })
+      .values_list(f"{rm_field.m2m_field_name()}__level", flat=True)
+  )
+
+  # at a given level, removals win over additions (see CommitBase.version_sets)
+  events = sorted(
+    [ (row['blamed_level'], 0, row) for row in additions ] +
+    [ (level, 1, None) for level in removals ],
+    key=lambda event: event[:2],
+  )
+
+  blamed_commit_ids = None
+  previous_values = None
+  for (_level, is_removal, row) in events:
+    if is_removal:
+      (blamed_commit_ids, previous_values) = (None, None)
+      continue
+
+    values = _field_values(version_cls, row)
+    if previous_values is None:
+      blamed_commit_ids = { name: row['blamed_commit_id'] for name in values }
+    else:
+      for (name, value) in values.items():
+        if value != previous_values.get(name):
+          blamed_commit_ids[name] = row['blamed_commit_id']
+    previous_values = values
+
+  if blamed_commit_ids is None:
+    return None
+
+  commits = commit_cls.objects.in_bulk(set(blamed_commit_ids.values()))
+  return { name: commits[commit_id] for (name, commit_id) in blamed_commit_ids.items() }
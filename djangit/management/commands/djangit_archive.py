@@ -0,0 +1,28 @@
+import datetime
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from djangit.archive import archive_versions
+
+
+class Command(BaseCommand):
+  help = "Moves versions that only old commits can reach to the archive tables"
+
+  def add_arguments(self, parser):
+    parser.add_argument('commit_model', help="label of the commit model, e.g. examples.Commit")
+    parser.add_argument('--older-than-days', type=float, required=True, help="commits finalized before this are old")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--database', default='default')
+
+  def handle(self, *args, **options):
+    commit_cls = apps.get_model(options['commit_model'])
+    counts = archive_versions(
+      commit_cls,
+      before=timezone.now() - datetime.timedelta(days=options['older_than_days']),
+      batch_size=options['batch_size'],
+      using=options['database'],
+    )
+    for (label, count) in counts.items():
+      self.stdout.write(f"{label}: {count} archived")
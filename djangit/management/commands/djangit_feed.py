@@ -0,0 +1,34 @@
+import json
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from djangit.feed import change_feed
+
+
+class Command(BaseCommand):
+  help = "Streams committed changes as JSON lines, in commit order"
+
+  def add_arguments(self, parser):
+    parser.add_argument('commit_model', help="label of the commit model, e.g. examples.Commit")
+    cursor = parser.add_mutually_exclusive_group()
+    cursor.add_argument('--cursor', default=None, help="position or checksum of the last commit event already consumed")
+    cursor.add_argument('--after-commit', default=None, help="id or checksum of the last commit already consumed")
+    parser.add_argument('--database', default='default')
+    parser.add_argument('--chunk-size', type=int, default=500)
+
+  def handle(self, *args, **options):
+    commit_cls = apps.get_model(options['commit_model'])
+    try:
+      events = change_feed(
+        commit_cls,
+        cursor=options['cursor'],
+        after_commit=options['after_commit'],
+        chunk_size=options['chunk_size'],
+        using=options['database'],
+      )
+    except commit_cls.DoesNotExist as e:
+      raise CommandError(str(e))
+    for event in events:
+      self.stdout.write(json.dumps(event, cls=DjangoJSONEncoder, sort_keys=True))
@@ -0,0 +1,33 @@
+import datetime
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from djangit.gc import collect_garbage
+
+
+class Command(BaseCommand):
+  help = "Deletes versions, pointer records and eternals that no commit can reach"
+
+  def add_arguments(self, parser):
+    parser.add_argument('commit_model', help="label of the commit model, e.g. examples.Commit")
+    parser.add_argument('--grace-hours', type=float, default=24, help="rows younger than this are kept, they may be in-flight drafts")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=0, help="seconds to pause between batches")
+    parser.add_argument('--dry-run', action='store_true', help="only count what would be reclaimed")
+    parser.add_argument('--database', default='default')
+
+  def handle(self, *args, **options):
+    commit_cls = apps.get_model(options['commit_model'])
+    counts = collect_garbage(
+      commit_cls,
+      grace=datetime.timedelta(hours=options['grace_hours']),
+      batch_size=options['batch_size'],
+      pause=options['sleep'],
+      dry_run=options['dry_run'],
+      using=options['database'],
+    )
+    verb = "reclaimable" if options['dry_run'] else "reclaimed"
+    for (label, count) in counts.items():
+      self.stdout.write(f"{label}: {count} {verb}")
+    self.stdout.write(f"total: {sum(counts.values())} {verb}")
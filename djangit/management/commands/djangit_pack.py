@@ -0,0 +1,24 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from djangit.feed import resolve_cursor
+from djangit.pack import pack
+
+
+class Command(BaseCommand):
+  help = "Writes a range of finalized commits, with everything they reference, to a pack file"
+
+  def add_arguments(self, parser):
+    parser.add_argument('commit_model', help="label of the commit model, e.g. examples.Commit")
+    parser.add_argument('output', help="path of the pack file to write (gzipped JSON lines)")
+    parser.add_argument('--head', required=True, help="id or checksum of the last commit to pack")
+    parser.add_argument('--base', default=None, help="id or checksum of an ancestor the receiving side already has")
+    parser.add_argument('--database', default='default')
+    parser.add_argument('--batch-size', type=int, default=1000)
+
+  def handle(self, *args, **options):
+    commit_cls = apps.get_model(options['commit_model'])
+    using = options['database']
+    head = resolve_cursor(commit_cls, options['head'], using=using)
+    base = resolve_cursor(commit_cls, options['base'], using=using)
+    pack(head, options['output'], base=base, batch_size=options['batch_size'])
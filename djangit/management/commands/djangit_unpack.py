@@ -0,0 +1,19 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from djangit.pack import unpack
+
+
+class Command(BaseCommand):
+  help = "Loads a pack file written by djangit_pack, verifying every checksum"
+
+  def add_arguments(self, parser):
+    parser.add_argument('commit_model', help="label of the commit model, e.g. examples.Commit")
+    parser.add_argument('input', help="path of the pack file to load")
+    parser.add_argument('--database', default='default')
+    parser.add_argument('--batch-size', type=int, default=1000)
+
+  def handle(self, *args, **options):
+    commit_cls = apps.get_model(options['commit_model'])
+    commits = unpack(commit_cls, options['input'], using=options['database'], batch_size=options['batch_size'])
+    self.stdout.write(f"Loaded {len(commits)} new commit(s)")
@@ -0,0 +1,225 @@
+from django.db import transaction
+from django.db.models import Q
+
+from .models.proxy_models import _RealPointerField
+from .archive import touches_archive, versions_with_archive, unarchive_versions
+from .utils import full_group_by, chunked, MergeConflictException
+
+
+class Conflict:
+  """
+    field is None when one side removed the object and the other modified it
+  """
+
+  def __init__(self, version_cls, eternal_id, field, base, ours, theirs):
+    self.version_cls = version_cls
+    self.eternal_id = eternal_id
+    self.field = field
+    self.base = base
+    self.ours = ours
+    self.theirs = theirs
+
+  def __repr__(self):
+    field_name = self.field.name if self.field else "removal"
+    return f"<Conflict - {self.version_cls.__name__} {self.eternal_id} {field_name}>"
+
+
+class MergeResult:
+  """
+    the outcome of merging theirs into ours, relative to their lowest common ancestor (base)
+
+    * conflicts: list of Conflict
+    * changes: { our_version : { field_name : their_value } }, in the format of CommitBase.stage_changes
+    * versions: their versions that can be adopted as-is
+    * removals: eternals that theirs removed and ours didn't touch
+  """
+
+  def __init__(self, base, ours, theirs):
+    self.base = base
+    self.ours = ours
+    self.theirs = theirs
+    self.conflicts = []
+    self.changes = {}
+    self.versions = []
+    self.removals = []
+
+  @property
+  def is_clean(self):
+    return not self.conflicts
+
+  def apply(self, working_commit):
+    """
+      adds the auto-merged change set to working_commit, which is expected to be a child of ours
+    """
+    if self.conflicts:
+      raise MergeConflictException(self.conflicts)
+
+    with transaction.atomic():
+      working_commit.stage_changes(self.changes)
+      for (cls, v_list) in full_group_by(self.versions, lambda v: v.__class__):
+        # versions adopted from old history may have been archived, they have to be hot again to be added
+        unarchive_versions(cls, [ v.pk for v in v_list ])
+        getattr(working_commit, working_commit._add_attr_name_for_version_cls(cls)).add(*v_list)
+      for (cls, e_list) in full_group_by(self.removals, lambda e: e._version_class):
+        getattr(working_commit, working_commit._rm_attr_name_for_version_cls(cls)).add(*e_list)
+
+    return working_commit
+
+
+def lowest_common_ancestor(commit_a, commit_b):
+  """ returns None when the commits live in separate trees """
+  return (
+    commit_a._chain_queryset()
+      .filter(pk__in=commit_b._chain_queryset())
+      .order_by('-level')
+      .first()
+  )
+
+
+def _same_version(a, b):
+  if a is None or b is None:
+    return a is None and b is None
+  return a.pk == b.pk
+
+
+def _same_value(field, a, b):
+  if isinstance(field, _RealPointerField):
+    # pointer checksums only depend on the related ids, so they double as content hashes
+    pointer_a = getattr(a, field.name)
+    pointer_b = getattr(b, field.name)
+    if pointer_a is None or pointer_b is None:
+      return pointer_a is None and pointer_b is None
+    return pointer_a.pk == pointer_b.pk or bool(pointer_a.checksum and pointer_a.checksum == pointer_b.checksum)
+
+  return getattr(a, field.attname) == getattr(b, field.attname)
+
+
+def _merged_value(field, version):
+  if isinstance(field, _RealPointerField):
+    return getattr(version, field.name)
+  return getattr(version, field.attname)
+
+
+def _touched_eternals(version_cls, side_chain):
+  """ Q over eternals added or removed by any commit of side_chain """
+  touched = (
+    Q(id__in=version_cls._base_manager.filter(added_in__in=side_chain).values('eternal_id')) |
+    Q(id__in=version_cls._eternal_cls.objects.filter(removed_in__in=side_chain).values('id'))
+  )
+  if version_cls._archive_cls is not None:
+    touched |= Q(id__in=version_cls._archive_cls._base_manager.filter(added_in__in=side_chain).values('eternal_id'))
+  return touched
+
+
+def _side_chain(commit, base):
+  chain = commit._chain_queryset()
+  if base is None:
+    return chain
+  return chain.filter(level__gt=base.level)
+
+
+def _versions_by_eternal(version_cls, commit, eternal_ids):
+  if commit is None:
+    return {}
+  if touches_archive(version_cls, commit):
+    return versions_with_archive(version_cls, commit, eternal_ids)
+  pointer_names = [ f.name for f in version_cls._meta.fields if isinstance(f, _RealPointerField) ]
+  return {
+    v.eternal_id: v
+    for v in (
+      version_cls.objects.hot_at_commit(commit)
+        .filter(eternal_id__in=eternal_ids)
+        .select_related(*pointer_names)
+    )
+  }
+
+
+def _merge_object(result, version_cls, eternal_id, base_v, our_v, their_v):
+  if _same_version(our_v, their_v) or _same_version(their_v, base_v):
+    return
+
+  if _same_version(our_v, base_v):
+    if their_v is None:
+      result.removals.append(version_cls._eternal_cls(pk=eternal_id))
+    else:
+      result.versions.append(their_v)
+    return
+
+  if our_v is None or their_v is None:
+    result.conflicts.append(Conflict(version_cls, eternal_id, None, base_v, our_v, their_v))
+    return
+
+  field_changes = {}
+  for field in version_cls._content_fields():
+    if _same_value(field, our_v, their_v):
+      continue
+    if base_v is not None and _same_value(field, base_v, our_v):
+      field_changes[field.name if isinstance(field, _RealPointerField) else field.attname] = _merged_value(field, their_v)
+    elif base_v is not None and _same_value(field, base_v, their_v):
+      continue
+    else:
+      result.conflicts.append(Conflict(version_cls, eternal_id, field, base_v, our_v, their_v))
+
+  if field_changes:
+    result.changes[our_v] = field_changes
+
+
+def three_way_merge(ours, theirs, batch_size=500):
+  """
+    field-level merge of theirs into ours
+
+    only eternals touched on both sides since the lowest common ancestor are loaded and compared,
+    everything touched by theirs alone is resolved with set-based queries
+  """
+  base = lowest_common_ancestor(ours, theirs)
+  result = MergeResult(base, ours, theirs)
+
+  our_side = _side_chain(ours, base)
+  their_side = _side_chain(theirs, base)
+
+  for version_cls in ours.tracked_models.values():
+    eternal_cls = version_cls._eternal_cls
+    touched_by_ours = _touched_eternals(version_cls, our_side)
+    touched_by_theirs = _touched_eternals(version_cls, their_side)
+
+    theirs_only = eternal_cls.objects.filter(touched_by_theirs).exclude(touched_by_ours)
+    if touches_archive(version_cls, ours) or touches_archive(version_cls, theirs):
+      # old history, what's live has to be resolved over both tiers (see djangit.archive)
+      theirs_only_ids = list(theirs_only.values_list('id', flat=True))
+      their_versions = versions_with_archive(version_cls, theirs, theirs_only_ids)
+      our_versions = versions_with_archive(version_cls, ours, theirs_only_ids)
+      result.versions.extend(their_versions.values())
+      result.removals.extend(
+        eternal_cls.objects.filter(id__in=[ i for i in theirs_only_ids if i in our_versions and i not in their_versions ])
+      )
+    else:
+      result.versions.extend(
+        version_cls.objects.hot_at_commit(theirs).filter(eternal_id__in=theirs_only.values('id'))
+      )
+      result.removals.extend(
+        theirs_only
+          .exclude(id__in=version_cls.objects.hot_at_commit(theirs).values('eternal_id'))
+          .filter(id__in=version_cls.objects.hot_at_commit(ours).values('eternal_id'))
+      )
+
+    touched_by_both = (
+      eternal_cls.objects
+        .filter(touched_by_ours)
+        .filter(touched_by_theirs)
+        .values_list('id', flat=True)
+    )
+    for eternal_ids in chunked(touched_by_both.iterator(), batch_size):
+      base_versions = _versions_by_eternal(version_cls, base, eternal_ids)
+      our_versions = _versions_by_eternal(version_cls, ours, eternal_ids)
+      their_versions = _versions_by_eternal(version_cls, theirs, eternal_ids)
+      for eternal_id in eternal_ids:
+        _merge_object(
+          result,
+          version_cls,
+          eternal_id,
+          base_versions.get(eternal_id),
+          our_versions.get(eternal_id),
+          their_versions.get(eternal_id),
+        )
+
+  return result
@@ -1,2 +1,4 @@
 from .commit import *
-from .proxy_models import _RealPointerField
\ No newline at end of file
+from .refs import RefBase, CheckedOutRefBase
+from .archive import ArchivedVersionBase
+from .proxy_models import _RealPointerField
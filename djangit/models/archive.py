@@ -0,0 +1,64 @@
+from django.db import models
+from django.db.models.base import ModelBase
+
+
+class ArchiveMeta(ModelBase):
+  """
+    concrete subclasses name the versioned model they archive with a version_model class attribute,
+    the version model's fields are copied, and an 'added_in' m2m to its commit model holds the archived additions
+  """
+  def __new__(cls, cls_name, bases, cls_attrs, **kwargs):
+    new_cls = super().__new__(cls, cls_name, bases, cls_attrs, **kwargs)
+    if new_cls._meta.abstract:
+      return new_cls
+
+    version_model = cls_attrs['version_model']
+    for field in version_model._meta.concrete_fields:
+      if field.primary_key:
+        continue
+      if field.is_relation:
+        target = field.remote_field.model
+        # the referenced version may be archived too, so there can't be a database constraint
+        references_versions = hasattr(target, '_eternal_cls')
+        new_field = field.__class__(
+          target,
+          null=field.null,
+          on_delete=models.DO_NOTHING if references_versions else field.remote_field.on_delete,
+          db_constraint=not references_versions,
+          related_name=f"archived_%(class)s_{field.name}",
+        )
+      else:
+        (_name, _path, args, field_kwargs) = field.deconstruct()
+        new_field = field.__class__(*args, **field_kwargs)
+      new_field.contribute_to_class(new_cls, field.name)
+
+    models.ManyToManyField(
+      version_model.commit_model,
+      related_name="+",
+    ).contribute_to_class(new_cls, 'added_in')
+
+    version_model._archive_cls = new_cls
+    return new_cls
+
+
+class ArchivedVersionBase(models.Model, metaclass=ArchiveMeta):
+  """
+    cold storage for versions that only old commits can reach, see djangit.archive
+  """
+  class Meta:
+    abstract = True
+
+  # the id the version had in the hot table
+  id = models.IntegerField(primary_key=True)
+
+  def restore(self):
+    """ an unsaved-looking instance of the version model, as it was before archival """
+    version_model = self.version_model
+    version = version_model(**{ f.attname: getattr(self, f.attname) for f in version_model._meta.concrete_fields })
+    version._state.adding = False
+    version._state.db = self._state.db
+    # related rows this row was loaded with (e.g. with select_related) come along
+    for f in version_model._meta.concrete_fields:
+      if f.is_relation and self._meta.get_field(f.name).is_cached(self):
+        setattr(version, f.name, getattr(self, f.name))
+    return version
@@ -0,0 +1,300 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from ..utils import (
+  full_group_by,
+  LockedInformationException,
+  chunked,
+  bulk_create_with_pks,
+  hash_for_string,
+  hash_for_model_instance,
+)
+from .proxy_models import _RealPointerField, ManyToManyPointerBase
+
+
+def _pointer_fields(version_cls):
+  return [ f for f in version_cls._meta.fields if isinstance(f, _RealPointerField) ]
+
+
+def _identity_fields(version_cls):
+  """ foreign keys checksums hash by their target's hash_identity (see field_identity), targets have to be loaded """
+  return [ f for f in version_cls._meta.fields if f.many_to_one and hasattr(f.related_model, 'hash_identity') ]
+
+
+def _load_identities(versions, using=None):
+  """ loads the targets of the identity fields of versions that aren't loaded yet, one query per field """
+  for version_cls in set(v.__class__ for v in versions):
+    for f in _identity_fields(version_cls):
+      missing = [ v for v in versions if v.__class__ is version_cls and not f.is_cached(v) and getattr(v, f.attname) is not None ]
+      if missing:
+        targets = f.related_model._base_manager.using(using).in_bulk([ getattr(v, f.attname) for v in missing ])
+        for v in missing:
+          setattr(v, f.name, targets[getattr(v, f.attname)])
+
+
+def _through_attrs(m2m_field):
+  """ returns (through_model, source_attname, target_attname) for an auto-created through table """
+  through = m2m_field.remote_field.through
+  source_attr = through._meta.get_field(m2m_field.m2m_field_name()).attname
+  target_attr = through._meta.get_field(m2m_field.m2m_reverse_field_name()).attname
+  return (through, source_attr, target_attr)
+
+
+def _bulk_create_through_rows(m2m_field, pairs, batch_size, using=None):
+  """
+    inserts (source_id, target_id) pairs directly into the auto-created through table of m2m_field
+  """
+  (through, source_attr, target_attr) = _through_attrs(m2m_field)
+  through._base_manager.using(using).bulk_create(
+    [ through(**{ source_attr: source_id, target_attr: target_id }) for (source_id, target_id) in pairs ],
+    batch_size=batch_size,
+  )
+
+
+def _related_ids(pointer_model, pointer_ids, using=None):
+  """ { pointer_id : sorted related ids }, read from the through table in one query """
+  (through, source_attr, target_attr) = _through_attrs(pointer_model._meta.get_field('related'))
+  related = defaultdict(list)
+  rows = (
+    through._base_manager.using(using)
+      .filter(**{ f"{source_attr}__in": pointer_ids })
+      .order_by(source_attr, target_attr)
+      .values_list(source_attr, target_attr)
+  )
+  for (pointer_id, target_id) in rows:
+    related[pointer_id].append(target_id)
+  return related
+
+
+def _bulk_create_pointers(pointer_model, id_lists, batch_size):
+  """
+    returns a list of pointer records (None for empty relations) matching id_lists
+    records are checksummed on creation, so identical id-lists can safely share one record
+  """
+  keys = [ tuple(sorted(set(ids))) if ids else None for ids in id_lists ]
+  pointers_by_key = {
+    key: pointer_model(checksum=hash_for_string(str(list(key))))
+    for key in keys
+    if key is not None
+  }
+  bulk_create_with_pks(pointer_model, list(pointers_by_key.values()), batch_size)
+
+  _bulk_create_through_rows(
+    pointer_model._meta.get_field('related'),
+    (
+      (pointer.id, target_id)
+      for (key, pointer) in pointers_by_key.items()
+      for target_id in key
+    ),
+    batch_size,
+  )
+
+  return [ pointers_by_key.get(key) for key in keys ]
+
+
+def _bulk_create_versions(version_cls, rows, batch_size):
+  rows = [ dict(row) for row in rows ]
+
+  pointers_by_field = {
+    f.name : _bulk_create_pointers(
+      f.related_model,
+      [ row.pop(f.name, None) for row in rows ],
+      batch_size,
+    )
+    for f in _pointer_fields(version_cls)
+  }
+
+  eternal_cls = version_cls._eternal_cls
+  eternals = bulk_create_with_pks(eternal_cls, [ eternal_cls() for _ in rows ], batch_size)
+
+  versions = [
+    version_cls(
+      eternal=eternal,
+      **row,
+      **{ name: pointers[i] for (name, pointers) in pointers_by_field.items() },
+    )
+    for (i, (eternal, row)) in enumerate(zip(eternals, rows))
+  ]
+
+  # checksums don't cover ids, versions are inserted checksummed
+  _load_identities(versions)
+  for v in versions:
+    v.checksum = hash_for_model_instance(v)
+    if version_cls.track_field_digests:
+      v.field_digests = v._compute_field_digests()
+  return bulk_create_with_pks(version_cls, versions, batch_size)
+
+
+def bulk_import(commit_cls, rows_by_model, parent_commit=None, batch_size=1000, **commit_attrs):
+  """
+    creates a finalized commit that adds brand new objects, e.g.
+
+      Commit.bulk_import({
+        Division: ( {"name": name, "tags": [tag.id]} for name in names ),
+      })
+
+    rows_by_model maps version classes (in insertion order) to iterables of field dicts
+    pointer fields take lists of related ids, other values are passed to the version constructor
+    rows are consumed batch_size at a time and every row is checksummed on insertion,
+    so memory stays bounded and finalizing the commit only has to hash the commit itself
+  """
+  if hasattr(rows_by_model, 'items'):
+    rows_by_model = rows_by_model.items()
+
+  with transaction.atomic():
+    commit = commit_cls.objects.create(parent_commit=parent_commit, **commit_attrs)
+
+    for (version_cls, rows) in rows_by_model:
+      adds_field = commit_cls._meta.get_field(commit_cls._add_attr_name_for_version_cls(version_cls))
+      for batch in chunked(rows, batch_size):
+        versions = _bulk_create_versions(version_cls, batch, batch_size)
+        _bulk_create_through_rows(adds_field, ( (commit.id, v.id) for v in versions ), batch_size)
+
+    commit.commit()
+
+  return commit
+
+
+def _resolve_pointer_changes(pointer_field, edits, batch_size):
+  """
+    edits are (version, related_ids) pairs
+    returns the pointer record (or None) each version should point to, in the same order
+    * unchanged id-sets keep their pointer record
+    * unfinalized pointer records that only the edited version uses are rewritten in place
+    * finalized ones, and ones other versions share (e.g. drafts cloned from one another), are copied on write
+  """
+  pointer_model = pointer_field.related_model
+  related_field = pointer_model._meta.get_field('related')
+  (through, source_attr, target_attr) = _through_attrs(related_field)
+
+  existing_ids = set( getattr(v, pointer_field.attname) for (v, _ids) in edits ) - {None}
+  existing = { pk: pointer_model(pk=pk) for pk in existing_ids }
+  current_related = { pk: set() for pk in existing_ids }
+  # a single left join fetches checksums and related ids of every existing pointer
+  for (pk, checksum, related_id) in pointer_model._base_manager.filter(pk__in=existing_ids).values_list('pk', 'checksum', 'related'):
+    existing[pk].checksum = checksum
+    if related_id is not None:
+      current_related[pk].add(related_id)
+
+  # rewriting a pointer record in place would change every version using it
+  unfinalized_ids = [ pk for (pk, pointer) in existing.items() if not pointer.checksum ]
+  users = dict(
+    pointer_field.model._base_manager
+      .filter(**{ f"{pointer_field.attname}__in": unfinalized_ids })
+      .order_by()
+      .values_list(pointer_field.attname)
+      .annotate(users=Count('pk'))
+  ) if unfinalized_ids else {}
+
+  resolved = []
+  rewritten = {}
+  created = []
+  for (version, ids) in edits:
+    ids = set(ids or [])
+    pk = getattr(version, pointer_field.attname)
+    if pk is not None and current_related[pk] == ids:
+      resolved.append(existing[pk])
+    elif not ids:
+      resolved.append(None)
+    elif pk is not None and users.get(pk) == 1 and not version.checksum:
+      rewritten[pk] = ids
+      resolved.append(existing[pk])
+    else:
+      new_pointer = pointer_model()
+      created.append((new_pointer, ids))
+      resolved.append(new_pointer)
+
+  if rewritten:
+    through._base_manager.filter(**{ f"{source_attr}__in": list(rewritten) }).delete()
+  bulk_create_with_pks(pointer_model, [ p for (p, _ids) in created ], batch_size)
+  _bulk_create_through_rows(
+    related_field,
+    [
+      (pointer.pk, target_id)
+      for (pointer, ids) in [ *created, *( (existing[pk], ids) for (pk, ids) in rewritten.items() ) ]
+      for target_id in sorted(ids)
+    ],
+    batch_size,
+  )
+
+  return resolved
+
+
+def _stage_changes_for_class(commit, version_cls, items, batch_size):
+  pointer_fields = { f.name: f for f in _pointer_fields(version_cls) }
+
+  targets = [
+    (version, (version.clone() if version.checksum else version), field_values)
+    for (version, field_values) in items
+  ]
+
+  for (name, pointer_field) in pointer_fields.items():
+    # values are lists of related ids, or existing pointer records to share as-is
+    edits = [
+      (version, field_values[name])
+      for (version, _target, field_values) in targets
+      if name in field_values and not isinstance(field_values[name], ManyToManyPointerBase)
+    ]
+    pointers = iter(_resolve_pointer_changes(pointer_field, edits, batch_size) if edits else [])
+    for (_version, target, field_values) in targets:
+      if name in field_values:
+        value = field_values[name]
+        setattr(target, name, value if isinstance(value, ManyToManyPointerBase) else next(pointers))
+
+  changed_fields = set()
+  for (_version, target, field_values) in targets:
+    for (name, value) in field_values.items():
+      changed_fields.add(name)
+      if name not in pointer_fields:
+        setattr(target, name, value)
+
+  copies = [ target for (version, target, _values) in targets if target is not version ]
+  in_place = [ target for (version, target, _values) in targets if target is version ]
+  bulk_create_with_pks(version_cls, copies, batch_size)
+  if in_place and changed_fields:
+    version_cls._base_manager.bulk_update(in_place, list(changed_fields), batch_size=batch_size)
+
+  adds_field = commit._meta.get_field(commit._add_attr_name_for_version_cls(version_cls))
+  (through, commit_attr, version_attr) = _through_attrs(adds_field)
+  links = through._base_manager.filter(**{ commit_attr: commit.pk })
+
+  # finalized versions being replaced must stop being added by the working commit
+  links.filter(**{
+    f"{version_attr}__in": [ version.pk for (version, target, _values) in targets if target is not version ]
+  }).delete()
+  already_linked = set(
+    links.filter(**{ f"{version_attr}__in": [ v.pk for v in in_place ] })
+      .values_list(version_attr, flat=True)
+  )
+  _bulk_create_through_rows(
+    adds_field,
+    [ (commit.pk, target.pk) for (_version, target, _values) in targets if target.pk not in already_linked ],
+    batch_size,
+  )
+
+  return [ (version, target) for (version, target, _values) in targets ]
+
+
+def stage_changes(commit, changes, batch_size=1000):
+  """
+    applies {version: {field_name: value}} edits to many versions at once and adds the results to commit
+    pointer fields take lists of related ids (or an existing pointer record)
+    finalized versions are copied on write, unfinalized ones are updated in place,
+    and each version class costs a fixed number of queries regardless of how many rows change
+    returns a dict mapping each passed version to its (possibly new) edited version,
+    unfinalized versions map to themselves: the instances passed in are the ones edited
+  """
+  if commit.checksum:
+    raise LockedInformationException("Cannot stage changes onto a finalized commit")
+
+  if hasattr(changes, 'items'):
+    changes = changes.items()
+
+  results = {}
+  with transaction.atomic():
+    for (version_cls, items) in full_group_by(changes, lambda item: item[0].__class__):
+      results.update(_stage_changes_for_class(commit, version_cls, items, batch_size))
+
+  return results
@@ -1,10 +1,11 @@
 import uuid, json, datetime, types, copy
 from itertools import chain
+from collections import defaultdict
 
 from django.conf import settings
 from django.db.models.base import ModelBase
-from django.db import models, transaction
-from django.db.models import Q, OuterRef, Subquery, F
+from django.db import models, transaction, IntegrityError
+from django.db.models import Q, OuterRef, Subquery, F, Max
 from django.forms import (
   Form,
 )
@@ -19,17 +20,26 @@ from django.contrib import admin
 from django.utils import timezone
 from django.db.models.signals import pre_save, post_save, m2m_changed
 
+from asgiref.sync import sync_to_async
+
 from mptt.models import MPTTModel, TreeForeignKey
 
 from ..diffs import Diff, TagM2MDiff
+from ..merge import three_way_merge
+from ..log import commit_log, object_history, blame
+from ..archive import touches_archive, versions_with_archive
+from ..replicas import replica_for
 from ..utils import (
   full_group_by,
   hash_for_model_instance,
   hash_for_string,
+  hash_for_commit,
+  field_identity,
   flatten,
-  find,
+  chunked,
   current_time,
-  LockedInformationException
+  LockedInformationException,
+  ConstraintViolationException,
 )
 from .proxy_models import (
   ManyToManyPointerBase,
@@ -38,6 +48,18 @@ from .proxy_models import (
   PointerField,
   _RealPointerField,
 )
+from .querysets import VersionManager
+from .bulk import bulk_import, stage_changes, _through_attrs, _pointer_fields, _identity_fields, _related_ids
+
+def _send_post_save(model, instances, update_fields, using):
+  """ rows finalized with bulk or conditional updates skip save(), post_save receivers still hear about them """
+  if not post_save.has_listeners(model):
+    return
+  for instance in instances:
+    post_save.send(
+      sender=model, instance=instance, created=False, update_fields=frozenset(update_fields), raw=False, using=using,
+    )
+
 
 class CommitBase(MPTTModel):
   tracked_models = {}
@@ -45,6 +67,10 @@ class CommitBase(MPTTModel):
   class Meta:
     abstract=True
     ordering = [ 'committed_at' ]
+    indexes = [
+      # as-of lookups filter one commit tree by commit date, see ancestor_as_of
+      models.Index(fields=['tree_id', 'committed_at'], name='%(app_label)s_%(class)s_as_of'),
+    ]
 
   class MPTTMeta:
     parent_attr= "parent_commit"
@@ -54,8 +80,17 @@ class CommitBase(MPTTModel):
     max_length=100,
   )
 
+  # indexed for as-of (wall-clock) lookups, see ancestor_as_of
   committed_at = models.DateTimeField(
-    null=True
+    null=True,
+    db_index=True,
+  )
+
+  # the order the change feed emits finalized commits in, numbered when they're finalized, see djangit.feed
+  feed_position = models.PositiveIntegerField(
+    null=True,
+    unique=True,
+    editable=False,
   )
 
   # TODO: allow merge commits by making this m2m
@@ -68,6 +103,7 @@ class CommitBase(MPTTModel):
   time = models.DateTimeField(
     default=timezone.now,
     null=True,
+    db_index=True,
   )
 
   def _add_versions(self,versions):
@@ -113,6 +149,8 @@ class CommitBase(MPTTModel):
 
         { version_model_cls : queryset }
 
+      (lazy querysets raise ArchivedHistoryException when some of the live versions are archived, see djangit.archive)
+
       otherwise, will return nested dict of the form 
 
         { 
@@ -121,7 +159,7 @@ class CommitBase(MPTTModel):
           }
         }
 
-      conceptually, the query below gets executed as so:
+      conceptually, the query (see VersionQuerySet.at_commit) gets executed as so:
       * get the chain of commits 
       * For each tracked model...
         1. get all the relevant version-additions made by the commit-chain
@@ -135,63 +173,82 @@ class CommitBase(MPTTModel):
         
     """    
 
-    commit_chain_ids = [a.id for a in self.get_ancestors()]
-    commit_chain_ids.append(self.id)
-
-    # for each tracked model, compute the inner join of its table and this commit chain
-    # we only care about the youngest (generational not necessarily chronological) version
-    # for each group of eternal IDs
-
     final_versions = {}
     for cls in self.tracked_models.values():
-      
-      related_additions = (
-        cls.objects
-          .filter(eternal_id=OuterRef('pk') )
-          .filter(added_in__in=commit_chain_ids)
-          .order_by('-added_in__level')
-      )
-
-      related_removals = (
-        cls._eternal_cls.objects.filter(id=OuterRef('pk'))
-          .filter(removed_in__in=commit_chain_ids)
-          .order_by('-removed_in__level')
-      )
-
-      version_ids = set( 
-        row['proper_version'] for row in (
-          cls._eternal_cls.objects
-          .annotate(proper_version=Subquery(related_additions.values('id')[:1]))
-          .annotate(addition_depth=Subquery(related_additions.values('added_in__level')[:1]))
-          .annotate(removal_depth=Subquery(related_removals.values('removed_in__level')[:1]))
-          .filter(proper_version__isnull=False)
-          .filter(
-            Q(addition_depth__gt=F('removal_depth')) | 
-            Q(removal_depth__isnull=True)
-          )
-          .values('proper_version')
-        )
-      )
-
-
-      # is there a way to combine this with the previous query?
-      version_qs = cls.objects.filter(id__in=version_ids)
-
       if lazy:
-        final_versions[cls] = version_qs
+        # lazy querysets only cover the hot tables, at_commit raises when that isn't enough, see djangit.archive
+        final_versions[cls] = cls.objects.at_commit(self)
+      elif touches_archive(cls, self):
+        final_versions[cls] = versions_with_archive(cls, self)
       else:
         final_versions[cls] = { 
           v.eternal_id : v
-          for v in version_qs.all()
+          for v in cls.objects.hot_at_commit(self)
         }
 
     return final_versions
 
+  async def aversion_sets(self, lazy=False):
+    """
+      version_sets for async code: the whole resolution runs in one hop to the thread that owns the connection
+      lazy querysets can then be consumed with async for, see VersionQuerySet.aiterator
+    """
+    return await sync_to_async(self.version_sets)(lazy=lazy)
+
+  def _chain_queryset(self):
+    """
+      lazy queryset of this commit and its ancestors
+      tree coordinates are read inside the query, so a stale in-memory instance still gets the right chain
+    """
+    commits = self.__class__.objects.using(self._state.db)
+    this_commit = commits.filter(pk=self.pk)
+    return commits.filter(
+      tree_id=Subquery(this_commit.values('tree_id')[:1]),
+      lft__lte=Subquery(this_commit.values('lft')[:1]),
+      rght__gte=Subquery(this_commit.values('rght')[:1]),
+    )
+
+  def on_replica(self, replicas=None):
+    """ this commit as loaded from a read replica that has it, or self, see djangit.replicas.replica_for """
+    return replica_for(self, replicas)
+
+  def ancestor_as_of(self, moment):
+    """
+      returns the most recent commit of this chain (self included) that was committed at or before moment
+      returns None if the chain has nothing committed by then
+    """
+    return (
+      self._chain_queryset()
+        .filter(committed_at__lte=moment)
+        .order_by('-level')
+        .first()
+    )
+
+  def version_sets_as_of(self, moment, lazy=False):
+    """
+      same as version_sets, but for the state of this branch at a wall-clock moment
+    """
+    commit = self.ancestor_as_of(moment)
+    if commit is None:
+      return {
+        cls: (cls.objects.none() if lazy else {})
+        for cls in self.tracked_models.values()
+      }
+    return commit.version_sets(lazy=lazy)
+
   def _compute_hash(self):
 
-    hash_for_added = "".join(
-      "".join(v.checksum for v in vlist)
-      for vlist in self._versions_added_by_class.values()
+    # only checksums are read, and streamed, so large commits don't get loaded into memory
+    # versions are ordered by checksum, ids differ from one database to the other (see djangit.pack)
+    added_checksums = (
+      checksum
+      for cls in self.tracked_models.values()
+      for checksum in (
+        getattr(self, self._add_attr_name_for_version_cls(cls))
+          .order_by('checksum')
+          .values_list('checksum', flat=True)
+          .iterator()
+      )
     )
 
     if self.parent_commit:
@@ -201,7 +258,7 @@ class CommitBase(MPTTModel):
     else:
       parent_checksum = ""
 
-    return hash_for_string( hash_for_added + parent_checksum )
+    return hash_for_commit(added_checksums, parent_checksum)
 
 
   def save(self,*args,**kwargs):
@@ -211,11 +268,168 @@ class CommitBase(MPTTModel):
     super().save(*args,**kwargs)  
 
   def commit(self):
-    with transaction.atomic():
+    """
+      finalizes this commit, see djangit.concurrency for committing onto a branch other writers are advancing
+
+      commits are append-only: the row is finalized by a single conditional update that fails if another writer
+      finalized it first, and that leaves out the tree coordinates, which concurrent insertions may have shifted
+      the commit, and the versions and pointer records finalized in bulk, don't go through save(),
+      post_save is still sent for each of them (with update_fields), pre_save isn't
+    """
+    using = self._state.db
+    with transaction.atomic(using=using):
+      self.validate_constraints()
       self._finalize_versions()
       self.checksum = self._compute_hash()
       self.committed_at = current_time()
-      super().save()
+      while True:
+        (self.feed_position,) = self.__class__._next_feed_positions(1, using)
+        try:
+          with transaction.atomic(using=using):
+            finalized = (
+              self.__class__.objects.using(using)
+                .filter(pk=self.pk, checksum__isnull=True)
+                .update(**self._finalizing_values())
+            )
+          break
+        except IntegrityError:
+          # a concurrent commit took the position first, it's visible now that its transaction ended
+          if not self.__class__._base_manager.using(using).filter(feed_position=self.feed_position).exists():
+            raise
+      if not finalized:
+        raise LockedInformationException("Commit was already finalized")
+      _send_post_save(self.__class__, [ self ], self._finalizing_values(), using)
+      # branches pointing to a working commit cached it unfinalized, and its changes may have grown since
+      if hasattr(self.__class__, 'refs'):
+        self.__class__.refs.rel.related_model.refresh_heads([self], using=using)
+
+  @classmethod
+  def _next_feed_positions(cls, count, using):
+    """
+      the feed positions for count commits finalized in the caller's transaction, see djangit.feed
+
+      positions are unique: a writer numbering after an uncommitted one blocks on its position until it ends,
+      so a position only gets taken once all the ones before it are visible
+    """
+    last = cls._base_manager.using(using).aggregate(last=Max('feed_position'))['last'] or 0
+    return range(last + 1, last + 1 + count)
+
+  def _finalizing_values(self):
+    """ column values commit() writes: all but the primary key, the parent and the tree coordinates MPTT maintains """
+    opts = self._mptt_meta
+    skipped = {
+      opts.left_attr,
+      opts.right_attr,
+      opts.tree_id_attr,
+      opts.level_attr,
+      self._meta.get_field(opts.parent_attr).attname,
+    }
+    return {
+      f.attname: getattr(self, f.attname)
+      for f in self._meta.concrete_fields
+      if not f.primary_key and f.attname not in skipped
+    }
+
+  async def acommit(self):
+    await sync_to_async(self.commit)()
+
+  @classmethod
+  def bulk_import(cls, rows_by_model, parent_commit=None, batch_size=1000, **commit_attrs):
+    """
+      builds and finalizes a new commit from large datasets, see djangit.models.bulk.bulk_import
+    """
+    return bulk_import(cls, rows_by_model, parent_commit=parent_commit, batch_size=batch_size, **commit_attrs)
+
+  def stage_changes(self, changes, batch_size=1000):
+    """
+      bulk copy-on-write edits of many versions into this working commit, see djangit.models.bulk.stage_changes
+    """
+    return stage_changes(self, changes, batch_size=batch_size)
+
+  def stage(self, versions=(), removals=(), **staged_attrs):
+    """
+      the staging workflow from the README: 
+      moves a selection of this working commit's changes into a new, finalized commit 
+      that gets slotted in as this commit's parent
+
+      versions are a subset of this commit's added versions, 
+      removals are versions OR eternals this commit removes
+      changes move by re-pointing their through-table rows, 
+      so cost scales with the selection, not with the size of the working commit
+      returns the staged commit
+    """
+    if self.checksum:
+      raise LockedInformationException("Cannot stage changes out of a finalized commit")
+
+    eternals = [
+      v.eternal if isinstance(v, VersionedModel) else v
+      for v in removals
+    ]
+
+    with transaction.atomic():
+      staged = self.__class__.objects.create(parent_commit=self.parent_commit, **staged_attrs)
+
+      for (cls,v_list) in full_group_by(versions, lambda v: v.__class__):
+        self._move_through_rows(staged, self._add_attr_name_for_version_cls(cls), [v.pk for v in v_list])
+      for (cls,e_list) in full_group_by(eternals, lambda e: e._version_class):
+        self._move_through_rows(staged, self._rm_attr_name_for_version_cls(cls), [e.pk for e in e_list])
+
+      staged.commit()
+
+      # inserting staged may have shifted this commit's tree coordinates
+      self.refresh_from_db(fields=['lft', 'rght', 'tree_id', 'level'])
+      self.parent_commit = staged
+      self.save()
+
+    return staged
+
+  def _move_under(self, new_parent):
+    """
+      re-parents this commit, finalized or not, along with its whole subtree in a single tree operation
+      checksums of the moved subtree are left stale, see djangit.rewrite.recompute_checksums
+    """
+    self.refresh_from_db(fields=['lft', 'rght', 'tree_id', 'level'])
+    self.parent_commit = new_parent
+    # skips save(), which refuses finalized commits: re-parenting is the one edit history rewriting makes to them,
+    # and every caller recomputes the checksums it invalidates within the same transaction
+    super().save()
+
+  def _move_through_rows(self, other_commit, attr_name, target_ids):
+    (through, commit_attr, target_attr) = _through_attrs(self._meta.get_field(attr_name))
+    for ids in chunked(target_ids, 500):
+      (
+        through._base_manager
+          .filter(**{ commit_attr: self.pk, f"{target_attr}__in": ids })
+          .update(**{ commit_attr: other_commit.pk })
+      )
+
+  def three_way_merge(self, theirs):
+    """
+      field-level merge of theirs into this commit, returns a djangit.merge.MergeResult
+    """
+    return three_way_merge(self, theirs)
+
+  def constraint_violations(self):
+    """
+      checks the versioned_constraints of every tracked model (see djangit.constraints)
+      against the objects this commit touches
+    """
+    # whether the commit reaches each model's archive, asked once per model for all its constraints
+    self._archive_reach = {}
+    try:
+      return [
+        violation
+        for cls in self.tracked_models.values()
+        for constraint in cls.versioned_constraints
+        for violation in constraint.violations(cls, self)
+      ]
+    finally:
+      self._archive_reach = None
+
+  def validate_constraints(self):
+    violations = self.constraint_violations()
+    if violations:
+      raise ConstraintViolationException(violations)
 
   @staticmethod
   def _add_attr_name_for_version_cls(cls):
@@ -226,75 +440,110 @@ class CommitBase(MPTTModel):
     return f"removes_{cls.__name__.lower()}"
 
   def _finalize_versions(self):
-    for versions in self._versions_added_by_class.values():
-      for v in versions:
-        if not v.checksum:
+    """
+      checksums the versions this commit adds, and their pointer records, like finalize_version and finalize would,
+      with a fixed number of queries per tracked model however many versions the commit adds
+      everything is read from and written to the commit's own database
+      models overriding finalize_version (or pointer models overriding finalize) are finalized one row at a time
+      through their override instead
+    """
+    using = self._state.db
+    for cls in self.tracked_models.values():
+      pointer_fields = _pointer_fields(cls)
+      unfinalized = list(
+        getattr(self, self._add_attr_name_for_version_cls(cls))
+          .filter(checksum__isnull=True)
+          .select_related(*[ f.name for f in _identity_fields(cls) ])
+      )
+      if not unfinalized:
+        continue
+
+      # pointers go first, field digests of versions use their checksums
+      for field in pointer_fields:
+        pointers = [ getattr(v, field.name) for v in unfinalized ]
+        pointers = list({ p.pk: p for p in pointers if p is not None and not p.checksum }.values())
+        if field.related_model.finalize is not ManyToManyPointerBase.finalize:
+          for p in pointers:
+            p.finalize()
+          continue
+        related = _related_ids(field.related_model, [ p.pk for p in pointers ], using=using)
+        for p in pointers:
+          p.checksum = hash_for_string(str(related[p.pk]))
+        field.related_model._base_manager.using(using).bulk_update(pointers, ['checksum'])
+        _send_post_save(field.related_model, pointers, ['checksum'], using)
+
+      if cls.finalize_version is not VersionedModel.finalize_version:
+        for v in unfinalized:
           v.finalize_version()
-          for field in v._meta.fields:
-            if isinstance(field, _RealPointerField):
-              pointer = getattr(v,field.name)
-              if pointer and not pointer.checksum:
-                pointer.finalize()
+        continue
+      for v in unfinalized:
+        v.checksum = hash_for_model_instance(v)
+        if v.track_field_digests:
+          v.field_digests = v._compute_field_digests()
+      finalized_fields = ['checksum', 'field_digests'] if cls.track_field_digests else ['checksum']
+      cls._base_manager.using(using).bulk_update(unfinalized, finalized_fields)
+      _send_post_save(cls, unfinalized, finalized_fields, using)
+
+  def log(self, before_level=None, page_size=50):
+    """
+      keyset-paginated history of this commit's chain, see djangit.log.commit_log
+    """
+    return commit_log(self, before_level=before_level, page_size=page_size)
+
+  def blame(self, eternal):
+    """
+      { field_name : commit that last changed it } for eternal as of this commit, see djangit.log.blame
+    """
+    return blame(eternal, self)
 
   def ancestors(self):
     """
       returns in reverse-generational order 
     """
-    if not self.parent_commit:
-      return []
-    
-    return [ self.parent_commit, *self.parent_commit.ancestors() ]
+    return list(self._chain_queryset().exclude(pk=self.pk).order_by('-level'))
 
   def descendants(self):
     """
       returns in children in depth-first order, nodes comes before their own descendants
     """
-    children = list( self.__class__.objects.filter(parent_commit=self) )
-
-    if not children:
-      return []
+    # one query for the whole subtree, tree coordinates are read inside it like in _chain_queryset
+    # siblings keep the default ordering
+    commits = self.__class__.objects.using(self._state.db)
+    this_commit = commits.filter(pk=self.pk)
+    subtree_commits = commits.filter(
+      tree_id=Subquery(this_commit.values('tree_id')[:1]),
+      lft__gt=Subquery(this_commit.values('lft')[:1]),
+      rght__lt=Subquery(this_commit.values('rght')[:1]),
+    )
+    children = defaultdict(list)
+    for commit in subtree_commits.order_by(*self._meta.ordering, 'pk'):
+      children[commit.parent_commit_id].append(commit)
 
+    def subtree(commit):
+      return flatten([ [ child, *subtree(child) ] for child in children[commit.pk] ])
 
-    return flatten([
-      [ child, *child.descendants() ]
-      for child in children
-    ])
+    return subtree(self)
 
   def version_for(self,eternal):
     version_cls = eternal._version_class
+
+    if touches_archive(version_cls, self):
+      return versions_with_archive(version_cls, self, eternal_ids=[eternal.pk]).get(eternal.pk)
+
+    # the closest commit of the chain that added or removed the object decides, see VersionQuerySet.at_commit
+    return version_cls.objects.hot_at_commit(self).filter(eternal_id=eternal.pk).first()
     
-    # if this commit removed this object, then it has no version of this object
-    if eternal in getattr(self, self._rm_attr_name_for_version_cls(version_cls) ).all():
-      return None
-    
-    # if this commit added a version of this obj, then that version is the relevant version
-    versions_added_for_this_cls = self._versions_added_for_class(version_cls)
-    v = find(versions_added_for_this_cls, lambda v:v.eternal==eternal)
-    if v:
-      return v
-    
-    # if this commit didn't remove/add the object object, than its parent's version can be no less relevant
-    if self.parent_commit:
-      return self.parent_commit.version_for(eternal)
-    
-    return None
-    
+  async def aversions_for(self, eternal):
+    """ version_for for async code, in one hop to the thread that owns the connection """
+    return await sync_to_async(self.version_for)(eternal)
+
   def relevant_history_with_respect_to(self,eternal):
     """
       returns that modify (or remove) an object
       includes self, if relevant
+      see djangit.log.object_history for the lazy/paginated version
     """
-    v_cls = eternal._version_class
-    add_attr = self._add_attr_name_for_version_cls(v_cls)
-    rm_attr = self._rm_attr_name_for_version_cls(v_cls)
-    relevant_commits = [
-      c for c in [ self, *self.ancestors() ]
-      if (
-        eternal in [ added.eternal for added in getattr(c, add_attr).all() ] or
-        eternal in getattr(c,rm_attr).all()
-      )
-    ]
-    return relevant_commits
+    return list(object_history(self, eternal))
 
 class VersionMeta(ModelBase):
   """
@@ -326,6 +575,14 @@ class VersionMeta(ModelBase):
       cls_attrs[name] = real_field
 
 
+    # chainable time-travel queries, e.g. Division.objects.at_commit(c)
+    if 'objects' not in cls_attrs:
+      cls_attrs['objects'] = VersionManager()
+
+    # opt-in per-field digests, see VersionedModel.track_field_digests
+    if cls_attrs.get('track_field_digests'):
+      cls_attrs['field_digests'] = models.TextField(null=True, editable=False)
+
     #actually create the class:
     new_cls = super().__new__(cls, cls_name, bases, cls_attrs, **kwargs )
 
@@ -337,12 +594,16 @@ class VersionMeta(ModelBase):
     # create eternal model
     # eternal class' only purpose is to add an auto-incrementing unique 'eternal_id' value to each version table
     # it seems easier/more orm-friendly to create a model for it than to allow joins on an arbitrary int column and hook it up to a legit DB sequence
+    # ids are only unique within a database, the uuid identifies the object in all of them (checksums cover it, see field_identity)
     eternal_cls = type(
       f"Eternal{cls_name}",
       (models.Model,),
       dict(
         # _version_class=version_model_cls,
         __module__=module,
+        created_at=models.DateTimeField(default=timezone.now, editable=False),
+        uuid=models.UUIDField(default=uuid.uuid4, unique=True, editable=False),
+        hash_identity=property(lambda eternal: str(eternal.uuid)),
       )
     )
 
@@ -379,6 +640,27 @@ class VersionedModel(models.Model, HasManyToManyPointerFields, metaclass=Version
 
   checksum = models.CharField(null=True,max_length=100)
 
+  # not part of the checksum (editable=False), only used to spare in-flight drafts from djangit_gc
+  created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+  # set by djangit.models.archive.ArchiveMeta when an archive model is declared for this model
+  _archive_cls = None
+
+  # see djangit.constraints, checked when commits are finalized
+  versioned_constraints = []
+
+  # set to True on a versioned model to store a digest of each field when versions are finalized
+  # blame then compares digests instead of reading old row bodies
+  track_field_digests = False
+
+  @classmethod
+  def _content_fields(cls):
+    """ the fields holding a version's data, as opposed to its identity """
+    return [
+      f for f in cls._meta.concrete_fields
+      if f.name not in ('id', 'checksum', 'eternal', 'field_digests', 'created_at')
+    ]
+
   @classmethod
   def create_initial(cls,**attrs):
     eternal = cls._eternal_cls.objects.create()
@@ -393,6 +675,9 @@ class VersionedModel(models.Model, HasManyToManyPointerFields, metaclass=Version
     clone = copy.copy(self)
     clone.checksum=None
     clone.pk = None
+    clone.created_at = timezone.now()
+    if self.track_field_digests:
+      clone.field_digests = None
     return clone
 
   
@@ -407,9 +692,28 @@ class VersionedModel(models.Model, HasManyToManyPointerFields, metaclass=Version
     super().save(*args,**kwargs)
 
   def finalize_version(self):
+    """
+      checksums this version when a commit adding it is finalized
+      CommitBase.commit finalizes versions in bulk, bypassing this method, unless a model overrides it
+    """
     self.checksum = hash_for_model_instance(self)
+    if self.track_field_digests:
+      self.field_digests = self._compute_field_digests()
     super().save()
 
+  def _compute_field_digests(self):
+    return json.dumps(
+      { f.name: self._field_digest(f) for f in self._content_fields() },
+      sort_keys=True,
+    )
+
+  def _field_digest(self, field):
+    """ pointer fields are represented by their pointer's checksum (or id, while it isn't finalized) """
+    if isinstance(field, _RealPointerField):
+      pointer = getattr(self, field.name)
+      return pointer and (pointer.checksum or f"pointer-{pointer.pk}")
+    return hash_for_string(json.dumps(field_identity(self, field, field.value_from_object(self)), default=str))
+
   def save_or_create(self,force_new=False):
     if self.checksum or force_new:
       new_inst = self.clone()
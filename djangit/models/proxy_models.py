@@ -50,6 +50,13 @@ class ManyToManyPointerBase(models.Model):
     abstract=True
 
   checksum = models.CharField(null=True,max_length=100)
+  # only used to spare in-flight drafts from djangit_gc
+  created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+  @property
+  def hash_identity(self):
+    """ versions are hashed against their pointer records' checksums, which don't depend on ids, see field_identity """
+    return self.checksum
 
 
   @classmethod
@@ -81,6 +88,7 @@ class ManyToManyPointerBase(models.Model):
     super().save(*args,**kwargs)
 
   def finalize(self):
+    """ CommitBase.commit checksums pointer records in bulk, bypassing this method, unless a model overrides it """
     str_to_hash = str( sorted(t.id for t in self.related.all()) )
     self.checksum = hash_for_string(str_to_hash)
     super().save()
@@ -0,0 +1,175 @@
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import models
+from django.db.models import Q, OuterRef, Subquery, F, prefetch_related_objects
+
+from .proxy_models import _RealPointerField
+
+
+def _display_lookups(version_cls):
+  """ (foreign keys, pointer lookups) that displaying versions of version_cls follows """
+  foreign_keys = [
+    f.name for f in version_cls._meta.fields
+    if f.many_to_one and f.name != 'eternal'
+  ]
+  pointer_lookups = [ f"{f.name}__related" for f in version_cls._meta.fields if isinstance(f, _RealPointerField) ]
+  return (foreign_keys, pointer_lookups)
+
+
+def prefetch_for_display(version_cls, versions):
+  """ what VersionQuerySet.with_related fetches, for versions already loaded (e.g. restored from the archive) """
+  (foreign_keys, pointer_lookups) = _display_lookups(version_cls)
+  prefetch_related_objects(versions, *foreign_keys, *pointer_lookups)
+  return versions
+
+
+class VersionQuerySet(models.QuerySet):
+  """
+    installed on every versioned model by VersionMeta, e.g. Division.objects.at_commit(c)
+  """
+  # the commit at_commit resolved, checked against the archive when the queryset is evaluated
+  _archive_check = None
+
+  def _clone(self):
+    clone = super()._clone()
+    clone._archive_check = self._archive_check
+    return clone
+
+  def _check_archive(self):
+    from ..archive import has_live_archived_versions
+    from ..utils import ArchivedHistoryException
+
+    if self._archive_check is not None and has_live_archived_versions(self.model, self._archive_check):
+      raise ArchivedHistoryException(self.model, self._archive_check)
+
+  def _fetch_all(self):
+    if self._result_cache is None:
+      self._check_archive()
+    super()._fetch_all()
+
+  def _iterator(self, use_chunked_fetch, chunk_size):
+    # a generator, so that async iteration checks in the thread that fetches the rows
+    self._check_archive()
+    yield from super()._iterator(use_chunked_fetch, chunk_size)
+
+  def count(self):
+    if self._result_cache is None:
+      self._check_archive()
+    return super().count()
+
+  def exists(self):
+    if self._result_cache is None:
+      self._check_archive()
+    return super().exists()
+
+  def at_commit(self, commit):
+    """
+      restricts the queryset to the versions that are "live" as of commit
+
+      membership is resolved by a subquery against the commit chain (see CommitBase.version_sets),
+      so the result stays lazy and can be filtered, ordered, sliced and counted in the database
+      unless the queryset picked a database, it reads the commit's (e.g. a replica's, see djangit.replicas)
+      fetching, counting or checking for rows raises ArchivedHistoryException when some of the live versions
+      are archived (see djangit.archive), which costs a query for models that have an archive
+    """
+    clone = self.hot_at_commit(commit)
+    clone._archive_check = commit
+    return clone
+
+  def hot_at_commit(self, commit):
+    """
+      at_commit over the hot table only, without checking the archive
+      for callers that resolve archived versions themselves, or only care about hot ones
+    """
+    if self._db is None:
+      self = self.using(commit._state.db)
+    cls = self.model
+    eternal_cls = cls._eternal_cls
+    commit_chain = commit._chain_queryset()
+
+    related_additions = (
+      cls._base_manager
+        .filter(eternal_id=OuterRef('pk'))
+        .filter(added_in__in=commit_chain)
+        .order_by('-added_in__level')
+    )
+
+    related_removals = (
+      eternal_cls.objects.filter(id=OuterRef('pk'))
+        .filter(removed_in__in=commit_chain)
+        .order_by('-removed_in__level')
+    )
+
+    live_version_ids = (
+      eternal_cls.objects
+        .annotate(proper_version=Subquery(related_additions.values('id')[:1]))
+        .annotate(addition_depth=Subquery(related_additions.values('added_in__level')[:1]))
+        .annotate(removal_depth=Subquery(related_removals.values('removed_in__level')[:1]))
+        .filter(proper_version__isnull=False)
+        .filter(
+          Q(addition_depth__gt=F('removal_depth')) |
+          Q(removal_depth__isnull=True)
+        )
+        .values('proper_version')
+    )
+
+    return self.filter(id__in=live_version_ids)
+
+  def referencing(self, target, field_name=None):
+    """
+      restricts the queryset to versions whose pointer field(s) include target
+      pass field_name when a model has several pointer fields to target's model
+    """
+    from ..references import pointer_fields_to, pointers_containing
+
+    fields = pointer_fields_to(self.model, target.__class__)
+    if field_name is not None:
+      fields = [ f for f in fields if f.name == field_name ]
+    if not fields:
+      raise ValueError(f"{self.model.__name__} has no pointer field to {target.__class__.__name__}")
+
+    condition = Q()
+    for field in fields:
+      condition |= Q(**{ f"{field.attname}__in": pointers_containing(field.related_model, target) })
+    return self.filter(condition)
+
+  def with_related(self):
+    """
+      fetches what displaying versions needs along with them, so e.g. a page listing them costs a fixed number of queries:
+      foreign keys and pointer records are joined, the rows pointer records relate to are prefetched
+    """
+    (foreign_keys, pointer_lookups) = _display_lookups(self.model)
+    return self.select_related(*foreign_keys).prefetch_related(*pointer_lookups)
+
+  def as_of(self, moment, branch_head):
+    """
+      like at_commit, for the last commit in branch_head's chain committed at or before moment
+    """
+    commit = branch_head.ancestor_as_of(moment)
+    if commit is None:
+      return self.none()
+    return self.at_commit(commit)
+
+  async def aiterator(self, chunk_size=2000):
+    """
+      async iteration that streams the queryset chunk_size rows at a time, e.g.
+
+        async for v in Division.objects.at_commit(c).aiterator():
+
+      each chunk is fetched in one hop to the thread that owns the connection (Django < 4.1 has no async ORM)
+    """
+    rows = self.iterator(chunk_size=chunk_size)
+    fetch_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while True:
+      chunk = await fetch_chunk()
+      if not chunk:
+        return
+      for v in chunk:
+        yield v
+
+  def __aiter__(self):
+    return self.aiterator()
+
+
+VersionManager = models.Manager.from_queryset(VersionQuerySet)
@@ -0,0 +1,207 @@
+import json
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.base import ModelBase
+
+from ..archive import live_eternals
+from ..concurrency import commit_to_branch
+from ..utils import LockedInformationException, StaleHeadException
+
+
+class RefMeta(ModelBase):
+  """
+    like VersionMeta, concrete subclasses name the models they link to with class attributes:
+    * commit_model: adds the 'head' foreign key of RefBase subclasses
+    * ref_model: adds the 'ref' foreign key of CheckedOutRefBase subclasses
+  """
+  def __new__(cls, cls_name, bases, cls_attrs, **kwargs):
+    new_cls = super().__new__(cls, cls_name, bases, cls_attrs, **kwargs)
+    if new_cls._meta.abstract:
+      return new_cls
+
+    if 'commit_model' in cls_attrs:
+      models.ForeignKey(
+        cls_attrs['commit_model'],
+        on_delete=models.PROTECT,
+        related_name="refs",
+      ).contribute_to_class(new_cls, 'head')
+
+    if 'ref_model' in cls_attrs:
+      models.ForeignKey(
+        cls_attrs['ref_model'],
+        on_delete=models.CASCADE,
+        related_name="checkouts",
+      ).contribute_to_class(new_cls, 'ref')
+
+    return new_cls
+
+
+class RefBase(models.Model, metaclass=RefMeta):
+  """
+    named branches and tags
+    head metadata is cached on the ref, so listing branches never has to touch the commit tree
+  """
+  BRANCH = "branch"
+  TAG = "tag"
+
+  class Meta:
+    abstract = True
+    unique_together = [ ('kind', 'name') ]
+
+  name = models.CharField(max_length=255)
+  kind = models.CharField(
+    max_length=10,
+    choices=[ (BRANCH, "branch"), (TAG, "tag") ],
+    default=BRANCH,
+  )
+
+  # cached head metadata
+  depth = models.PositiveIntegerField(default=0)
+  head_committed_at = models.DateTimeField(null=True)
+  # { version_model_name : number of live objects }
+  object_counts = models.TextField(default="{}")
+
+  @property
+  def counts(self):
+    return json.loads(self.object_counts)
+
+  @classmethod
+  def create_branch(cls, name, head):
+    return cls._create(name, cls.BRANCH, head)
+
+  @classmethod
+  def create_tag(cls, name, head):
+    if not head.checksum:
+      raise LockedInformationException("Tags can only point to finalized commits")
+    return cls._create(name, cls.TAG, head)
+
+  @classmethod
+  def _create(cls, name, kind, head):
+    ref = cls(name=name, kind=kind)
+    ref._set_head(head)
+    ref.save()
+    return ref
+
+  @classmethod
+  def branches(cls):
+    return cls.objects.filter(kind=cls.BRANCH).order_by('name')
+
+  @classmethod
+  def tags(cls):
+    return cls.objects.filter(kind=cls.TAG).order_by('name')
+
+  def move_to(self, commit):
+    if self.kind == self.TAG:
+      raise LockedInformationException("Tags cannot be moved")
+    with transaction.atomic():
+      self._set_head(commit)
+      self.save()
+    return self
+
+  def compare_and_swap(self, expected_head, commit):
+    """
+      moves the branch to commit only if its head is still expected_head, with a single conditional update
+      raises StaleHeadException (and reloads the ref) when another writer moved it first
+    """
+    if self.kind == self.TAG:
+      raise LockedInformationException("Tags cannot be moved")
+    if self.head_id != expected_head.pk:
+      raise StaleHeadException(self, expected_head)
+
+    self._set_head(commit)
+    swapped = (
+      self.__class__.objects.using(self._state.db)
+        .filter(pk=self.pk, head_id=expected_head.pk)
+        .update(
+          head=commit,
+          depth=self.depth,
+          head_committed_at=self.head_committed_at,
+          object_counts=self.object_counts,
+        )
+    )
+    if not swapped:
+      self.refresh_from_db()
+      raise StaleHeadException(self, expected_head)
+    return self
+
+  def commit_child(self, stage, **kwargs):
+    """ see djangit.concurrency.commit_to_branch """
+    return commit_to_branch(self, stage, **kwargs)
+
+  @classmethod
+  def refresh_heads(cls, commits, using=None):
+    """
+      recomputes the cached head metadata of the refs pointing to commits,
+      for when something else than moving the ref changes it: finalizing the head, rewriting history (see djangit.rewrite)
+      refs sharing a head are counted once, and all of them are written with a single bulk_update
+    """
+    refs = list(cls.objects.using(using).filter(head__in=commits).select_related('head'))
+    metadata = {}
+    for ref in refs:
+      if ref.head_id not in metadata:
+        ref._set_head(ref.head)
+        metadata[ref.head_id] = (ref.depth, ref.head_committed_at, ref.object_counts)
+      (ref.depth, ref.head_committed_at, ref.object_counts) = metadata[ref.head_id]
+    cls.objects.using(using).bulk_update(refs, ['depth', 'head_committed_at', 'object_counts'])
+    return refs
+
+  def _set_head(self, commit):
+    previous_head = self.head if self.head_id else None
+    if previous_head and commit.parent_commit_id == previous_head.pk:
+      counts = self._counts_after_child(self.counts, commit)
+    else:
+      counts = {
+        name: live_eternals(cls, commit).count()
+        for (name, cls) in commit.tracked_models.items()
+      }
+    self.head = commit
+    self.depth = commit.level
+    self.head_committed_at = commit.committed_at
+    self.object_counts = json.dumps(counts, sort_keys=True)
+
+  @staticmethod
+  def _counts_after_child(counts, commit):
+    """
+      a branch advancing by one commit only needs that commit's changes to update its counts:
+      additions of objects that weren't live at the parent, minus removals of objects that were
+    """
+    parent = commit.parent_commit
+    new_counts = dict(counts)
+    for (name, cls) in commit.tracked_models.items():
+      live_at_parent = live_eternals(cls, parent).values('pk')
+      added = getattr(commit, commit._add_attr_name_for_version_cls(cls)).values('eternal_id')
+      removed = getattr(commit, commit._rm_attr_name_for_version_cls(cls))
+      new_counts[name] = (
+        new_counts.get(name, 0)
+        + added.exclude(eternal_id__in=live_at_parent).exclude(eternal_id__in=removed.values('id')).distinct().count()
+        - removed.filter(id__in=live_at_parent).count()
+      )
+    return new_counts
+
+  def __str__(self):
+    return f"{self.kind} {self.name}"
+
+
+class CheckedOutRefBase(models.Model, metaclass=RefMeta):
+  """
+    one row per user, replacing "checked-out commit" URL params
+  """
+  class Meta:
+    abstract = True
+
+  user = models.OneToOneField(
+    settings.AUTH_USER_MODEL,
+    on_delete=models.CASCADE,
+    related_name="+",
+  )
+
+  @classmethod
+  def checkout(cls, user, ref):
+    checked_out, _created = cls.objects.update_or_create(user=user, defaults={ "ref": ref })
+    return checked_out
+
+  @classmethod
+  def ref_for(cls, user):
+    checked_out = cls.objects.filter(user=user).select_related('ref').first()
+    return checked_out and checked_out.ref
@@ -0,0 +1,462 @@
+"""
+  packs: a range of commits with everything they reference (eternals, pointer records, versions),
+  as a stream of records another database can load, see the djangit_pack and djangit_unpack commands
+
+  checksums don't cover row ids (see djangit.utils.field_identity), so each database numbers its own rows:
+  records carry the sending database's ids, the receiving one matches rows it already holds by identity
+  (eternals by uuid, pointer records, versions and commits by checksum), inserts the others with ids of its own,
+  and translates references as it goes; everything that gets loaded is re-hashed and compared to the pack
+  before the transaction commits
+  pointer targets (e.g. Tag rows) aren't versioned, they must exist with the same ids on the receiving side
+
+  pack files are gzipped JSON lines, one record per line
+"""
+import gzip
+import heapq
+import json
+import itertools
+import uuid
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import router, transaction
+from django.db.models import Q, Max
+
+from .merge import lowest_common_ancestor
+from .archive import addition_tiers
+from .models.bulk import _pointer_fields, _identity_fields, _through_attrs, _related_ids, _bulk_create_through_rows
+from .utils import (
+  chunked,
+  hash_for_string,
+  hash_for_model_instance,
+  PackIntegrityException,
+)
+
+FORMAT_VERSION = 2
+
+_JSON_TYPES = (bool, int, float, str)
+
+
+def _version_fields(version_cls):
+  return [ f for f in version_cls._meta.concrete_fields if f.name not in ('id', 'checksum') ]
+
+
+def _commit_fields(commit_cls):
+  opts = commit_cls._mptt_meta
+  # feed positions are numbered by each database, see djangit.feed
+  local_attrs = {
+    'id', 'checksum', 'feed_position',
+    opts.parent_attr, opts.left_attr, opts.right_attr, opts.tree_id_attr, opts.level_attr,
+  }
+  return [ f for f in commit_cls._meta.concrete_fields if f.name not in local_attrs ]
+
+
+def _dump_fields(instance, fields):
+  values = {}
+  for f in fields:
+    value = f.value_from_object(instance)
+    values[f.attname] = value if value is None or isinstance(value, _JSON_TYPES) else f.value_to_string(instance)
+  return values
+
+
+def _load_fields(fields, values):
+  fields_by_attname = { f.attname: f for f in fields }
+  return { attname: fields_by_attname[attname].to_python(value) for (attname, value) in values.items() }
+
+
+def commit_range(head, base=None):
+  """ the finalized commits of head's chain that aren't in base's, parents first """
+  if not head.checksum:
+    raise PackIntegrityException("Only finalized commits can be packed")
+  commits = head._chain_queryset()
+  if base is not None:
+    if lowest_common_ancestor(head, base) != base:
+      raise PackIntegrityException(f"Commit {base.pk} is not an ancestor of commit {head.pk}")
+    commits = commits.filter(level__gt=base.level)
+  return commits.order_by('level')
+
+
+def pack_records(commits, batch_size=1000, known=None):
+  """
+    yields the records of a pack for the commits queryset (see commit_range), in loading order:
+    header, eternals, pointers, versions, commits, then the commits' additions and removals
+    commits name their parent, and additions their versions, by checksum, other references are ids
+    rows are read in chunks and every row is emitted once, however many commits share it
+    known is an optional queryset of commits the receiving side has, versions they added aren't sent again
+    archived versions (see djangit.archive) are sent like the others, and get loaded into the hot tables
+  """
+  commit_cls = commits.model
+  using = commits.db
+  tracked_models = commit_cls.tracked_models
+
+  yield { "type": "header", "format": FORMAT_VERSION, "commit_model": commit_cls._meta.label }
+
+  # { name : [ hot versions, archived versions ] }, a version lives in one of the tiers along with all its additions
+  versions = {}
+  for (name, version_cls) in tracked_models.items():
+    versions[name] = []
+    for model in (version_cls, version_cls._archive_cls):
+      if model is None:
+        continue
+      tier = model._base_manager.using(using).filter(added_in__in=commits)
+      if known is not None:
+        tier = tier.exclude(added_in__in=known)
+      versions[name].append(tier.distinct())
+
+  # eternals the versions are, or point to, and the ones the commits remove
+  referenced = { version_cls._eternal_cls: Q(removed_in__in=commits) for version_cls in tracked_models.values() }
+  for (name, version_cls) in tracked_models.items():
+    for f in _identity_fields(version_cls):
+      if f.related_model in referenced:
+        for tier in versions[name]:
+          referenced[f.related_model] |= Q(id__in=tier.values(f.attname))
+
+  for (name, version_cls) in tracked_models.items():
+    eternals = (
+      version_cls._eternal_cls._base_manager.using(using)
+        .filter(referenced[version_cls._eternal_cls])
+        .distinct()
+        .order_by('pk')
+        .values_list('pk', 'uuid')
+    )
+    for batch in chunked(eternals.iterator(chunk_size=batch_size), batch_size):
+      yield {
+        "type": "eternals",
+        "model": name,
+        "ids": [ pk for (pk, _uuid) in batch ],
+        "uuids": [ str(eternal_uuid) for (_pk, eternal_uuid) in batch ],
+      }
+
+  # several version models can point to the same pointer model
+  pointer_conditions = defaultdict(Q)
+  for (name, version_cls) in tracked_models.items():
+    for f in _pointer_fields(version_cls):
+      for tier in versions[name]:
+        pointer_conditions[f.related_model] |= Q(id__in=tier.values(f.attname))
+
+  for (pointer_model, condition) in pointer_conditions.items():
+    pointers = (
+      pointer_model._base_manager.using(using)
+        .filter(condition)
+        .order_by('pk')
+        .values_list('pk', 'checksum')
+    )
+    for batch in chunked(pointers.iterator(chunk_size=batch_size), batch_size):
+      related = _related_ids(pointer_model, [ pk for (pk, _checksum) in batch ], using=using)
+      for (pk, checksum) in batch:
+        yield {
+          "type": "pointer",
+          "model": pointer_model._meta.label,
+          "id": pk,
+          "checksum": checksum,
+          "related": related[pk],
+        }
+
+  for (name, version_cls) in tracked_models.items():
+    fields = _version_fields(version_cls)
+    (hot, *archived) = [ tier.order_by('pk').iterator(chunk_size=batch_size) for tier in versions[name] ]
+    archived = ( a.restore() for tier in archived for a in tier )
+    for v in heapq.merge(hot, archived, key=lambda v: v.pk):
+      yield {
+        "type": "version",
+        "model": name,
+        "id": v.pk,
+        "checksum": v.checksum,
+        "fields": _dump_fields(v, fields),
+      }
+
+  fields = _commit_fields(commit_cls)
+  for c in commits.select_related('parent_commit').iterator(chunk_size=batch_size):
+    yield {
+      "type": "commit",
+      "id": c.pk,
+      "parent": c.parent_commit and c.parent_commit.checksum,
+      "checksum": c.checksum,
+      "fields": _dump_fields(c, fields),
+    }
+
+  for (name, version_cls) in tracked_models.items():
+    # additions name versions by checksum, a commit can add a version the receiving side got from an earlier pack
+    additions = [
+      through._base_manager.using(using)
+        .filter(**{ f"{commit_name}__in": commits })
+        .order_by(f"{commit_name}_id", f"{version_name}__checksum")
+        .values_list(f"{commit_name}_id", f"{version_name}__checksum")
+        .iterator(chunk_size=batch_size)
+      for (_model, through, commit_name, version_name) in addition_tiers(version_cls)
+    ]
+    for batch in chunked(heapq.merge(*additions), batch_size):
+      yield { "type": "adds", "model": name, "links": batch }
+
+    (through, commit_attr, target_attr) = _through_attrs(
+      commit_cls._meta.get_field(commit_cls._rm_attr_name_for_version_cls(version_cls))
+    )
+    removals = (
+      through._base_manager.using(using)
+        .filter(**{ f"{commit_attr}__in": commits })
+        .order_by(commit_attr, target_attr)
+        .values_list(commit_attr, target_attr)
+    )
+    for batch in chunked(removals.iterator(chunk_size=batch_size), batch_size):
+      yield { "type": "removes", "model": name, "links": batch }
+
+
+class _PackLoader:
+  def __init__(self, commit_cls, using, batch_size):
+    self.commit_cls = commit_cls
+    self.using = using
+    self.batch_size = batch_size
+    # { model : { id in the pack : local instance } } of the eternals and pointer records loaded or matched
+    self.identities = defaultdict(dict)
+    # { version model : { checksum : local id } }
+    self.versions = defaultdict(dict)
+    # { commit id in the pack : local commit }, and { local id : commit } of the commits the database didn't have
+    self.commits = {}
+    self.new_commits = {}
+    self.tree_ids = set()
+    self.next_tree_id = None
+
+  def load(self, records):
+    for (kind, group) in itertools.groupby(records, lambda r: r["type"]):
+      loader = getattr(self, f"_load_{kind}", None)
+      if loader is None:
+        raise PackIntegrityException(f"Unknown pack record type {kind}")
+      for batch in chunked(group, self.batch_size):
+        loader(batch)
+    return self._finish()
+
+  def _by_checksum(self, model, checksums, fields=('checksum', 'pk')):
+    """ { checksum : local row values } of the rows of model the database holds with one of checksums """
+    rows = model._base_manager.using(self.using).filter(checksum__in=list(checksums)).values_list(*fields)
+    return { row[0]: row[1:] if len(row) > 2 else row[1] for row in rows }
+
+  def _bulk_insert(self, model, objs):
+    if objs:
+      model._base_manager.using(self.using).bulk_create(objs, batch_size=self.batch_size)
+
+  def _load_header(self, batch):
+    for header in batch:
+      if header["format"] != FORMAT_VERSION:
+        raise PackIntegrityException(f"Unsupported pack format {header['format']}")
+      if header["commit_model"] != self.commit_cls._meta.label:
+        raise PackIntegrityException(f"Pack holds {header['commit_model']} commits, not {self.commit_cls._meta.label}")
+
+  def _load_eternals(self, batch):
+    for record in batch:
+      eternal_cls = self.commit_cls.tracked_models[record["model"]]._eternal_cls
+      uuids = [ uuid.UUID(u) for u in record["uuids"] ]
+      eternals = eternal_cls._base_manager.using(self.using).only('pk', 'uuid')
+      existing = set(eternals.filter(uuid__in=uuids).values_list('uuid', flat=True))
+      self._bulk_insert(eternal_cls, [ eternal_cls(uuid=u) for u in uuids if u not in existing ])
+      local = { e.uuid: e for e in eternals.filter(uuid__in=uuids) }
+      for (pack_id, u) in zip(record["ids"], uuids):
+        self.identities[eternal_cls][pack_id] = local[u]
+
+  def _load_pointer(self, batch):
+    for (label, records) in itertools.groupby(batch, lambda r: r["model"]):
+      pointer_model = apps.get_model(label)
+      related_field = pointer_model._meta.get_field('related')
+      records = list(records)
+      for r in records:
+        if hash_for_string(str(sorted(r["related"]))) != r["checksum"]:
+          raise PackIntegrityException(f"{label} {r['id']} does not match its checksum")
+
+      # pointer records are content-addressed, any local one with the same checksum will do
+      existing = self._by_checksum(pointer_model, set(r["checksum"] for r in records))
+      missing = list({ r["checksum"]: r for r in records if r["checksum"] not in existing }.values())
+      targets = set(target_id for r in missing for target_id in r["related"])
+      known_targets = set(
+        related_field.related_model._base_manager.using(self.using).filter(pk__in=targets).values_list('pk', flat=True)
+      )
+      if targets - known_targets:
+        raise PackIntegrityException(
+          f"{related_field.related_model.__name__} rows {sorted(targets - known_targets)} are missing from the receiving database"
+        )
+
+      self._bulk_insert(pointer_model, [ pointer_model(checksum=r["checksum"]) for r in missing ])
+      inserted = self._by_checksum(pointer_model, [ r["checksum"] for r in missing ])
+      _bulk_create_through_rows(
+        related_field,
+        [ (inserted[r["checksum"]], target_id) for r in missing for target_id in r["related"] ],
+        self.batch_size,
+        using=self.using,
+      )
+      local = { **existing, **inserted }
+      for r in records:
+        pointer = pointer_model(pk=local[r["checksum"]], checksum=r["checksum"])
+        pointer._state.db = self.using
+        self.identities[pointer_model][r["id"]] = pointer
+
+  def _load_version(self, batch):
+    for (name, records) in itertools.groupby(batch, lambda r: r["model"]):
+      version_cls = self.commit_cls.tracked_models[name]
+      fields = _version_fields(version_cls)
+      records = list(records)
+
+      existing = self._by_checksum(version_cls, set(r["checksum"] for r in records))
+      versions = {}
+      for r in records:
+        if r["checksum"] in existing or r["checksum"] in versions:
+          continue
+        values = _load_fields(fields, r["fields"])
+        v = version_cls(**values)
+        v._state.db = self.using
+        # references are translated to the local rows, which checksums see through their hash identities
+        for f in _identity_fields(version_cls):
+          pack_id = values[f.attname]
+          if pack_id is None:
+            continue
+          target = self.identities[f.related_model].get(pack_id)
+          if target is None:
+            raise PackIntegrityException(f"{version_cls.__name__} {r['id']} points to a {f.related_model.__name__} the pack doesn't hold")
+          setattr(v, f.name, target)
+        if hash_for_model_instance(v) != r["checksum"]:
+          raise PackIntegrityException(f"{version_cls.__name__} {r['id']} does not match its checksum")
+        v.checksum = r["checksum"]
+        versions[v.checksum] = v
+      self._bulk_insert(version_cls, list(versions.values()))
+
+      self.versions[version_cls].update(existing)
+      self.versions[version_cls].update(self._by_checksum(version_cls, versions))
+
+  def _new_tree_id(self):
+    if self.next_tree_id is None:
+      max_tree_id = self.commit_cls._base_manager.using(self.using).aggregate(m=Max('tree_id'))['m']
+      self.next_tree_id = (max_tree_id or 0) + 1
+    self.next_tree_id += 1
+    return self.next_tree_id - 1
+
+  def _load_commit(self, batch):
+    commit_cls = self.commit_cls
+    commits_here = commit_cls._base_manager.using(self.using)
+    fields = _commit_fields(commit_cls)
+
+    known = {
+      c.checksum: c
+      for c in commits_here.filter(checksum__in=[ r["checksum"] for r in batch ] + [ r["parent"] for r in batch ])
+    }
+    loaded = { c.checksum: c for c in self.new_commits.values() }
+
+    missing = []
+    for r in batch:
+      if r["checksum"] in known:
+        self.commits[r["id"]] = known[r["checksum"]]
+        continue
+      if r["parent"] is None:
+        (parent, tree_id, level) = (None, self._new_tree_id(), 0)
+      else:
+        parent = loaded.get(r["parent"]) or known.get(r["parent"])
+        if parent is None:
+          raise PackIntegrityException(f"The parent of commit {r['id']} is neither in the pack nor in the receiving database")
+        (tree_id, level) = (parent.tree_id, parent.level + 1)
+
+      # inserted with the pack's checksum, see _finish, and tree coordinates that are placeholders until then
+      c = commit_cls(
+        checksum=r["checksum"],
+        tree_id=tree_id,
+        level=level,
+        lft=0,
+        rght=0,
+        **_load_fields(fields, r["fields"]),
+      )
+      missing.append((r, parent, c))
+      loaded[c.checksum] = c
+      self.tree_ids.add(tree_id)
+
+    # parents may be in the same batch, they're linked once every commit of the batch has an id
+    self._bulk_insert(commit_cls, [ c for (_r, _parent, c) in missing ])
+    ids = self._by_checksum(commit_cls, [ c.checksum for (_r, _parent, c) in missing ])
+    for (r, _parent, c) in missing:
+      c.pk = ids[c.checksum]
+      self.commits[r["id"]] = self.new_commits[c.pk] = c
+    for (_r, parent, c) in missing:
+      c.parent_commit_id = parent and parent.pk
+    commits_here.bulk_update([ c for (_r, _parent, c) in missing ], ['parent_commit'], batch_size=self.batch_size)
+
+  def _load_adds(self, batch):
+    for record in batch:
+      version_cls = self.commit_cls.tracked_models[record["model"]]
+      # links of commits the database already had are already there
+      links = [ (self.commits[commit_id].pk, checksum) for (commit_id, checksum) in record["links"] if self.commits[commit_id].pk in self.new_commits ]
+      # versions that the commits the pack left out added are in the database already
+      local = self.versions[version_cls]
+      local.update(self._by_checksum(version_cls, set(checksum for (_commit_id, checksum) in links) - set(local)))
+      missing = set(checksum for (_commit_id, checksum) in links) - set(local)
+      if missing:
+        raise PackIntegrityException(f"{version_cls.__name__} versions {sorted(missing)} are neither in the pack nor in the receiving database")
+      _bulk_create_through_rows(
+        self.commit_cls._meta.get_field(self.commit_cls._add_attr_name_for_version_cls(version_cls)),
+        [ (commit_id, local[checksum]) for (commit_id, checksum) in links ],
+        self.batch_size,
+        using=self.using,
+      )
+
+  def _load_removes(self, batch):
+    for record in batch:
+      version_cls = self.commit_cls.tracked_models[record["model"]]
+      eternals = self.identities[version_cls._eternal_cls]
+      _bulk_create_through_rows(
+        self.commit_cls._meta.get_field(self.commit_cls._rm_attr_name_for_version_cls(version_cls)),
+        [
+          (self.commits[commit_id].pk, eternals[eternal_id].pk)
+          for (commit_id, eternal_id) in record["links"]
+          if self.commits[commit_id].pk in self.new_commits
+        ],
+        self.batch_size,
+        using=self.using,
+      )
+
+  def _finish(self):
+    commit_cls = self.commit_cls
+    tree_manager = commit_cls._tree_manager.db_manager(self.using)
+    for tree_id in self.tree_ids:
+      tree_manager.partial_rebuild(tree_id)
+
+    # parents first, so each commit's hash is computed against its parent's verified checksum
+    commits = list(
+      commit_cls._base_manager.using(self.using)
+        .filter(pk__in=list(self.new_commits))
+        .order_by('level')
+    )
+    for c in commits:
+      if c._compute_hash() != c.checksum:
+        raise PackIntegrityException(f"Commit {c.checksum} does not match its checksum")
+
+    # positions are local, loaded commits are finalized here, so the change feed numbers them after everything else
+    for (position, c) in zip(commit_cls._next_feed_positions(len(commits), self.using), commits):
+      c.feed_position = position
+    commit_cls._base_manager.using(self.using).bulk_update(commits, ['feed_position'], batch_size=self.batch_size)
+    return commits
+
+
+def load_records(commit_cls, records, using=None, batch_size=1000):
+  """
+    loads pack records into the database, in a single transaction
+    returns the commits that were added, parents first
+  """
+  using = using or router.db_for_write(commit_cls)
+  with transaction.atomic(using=using):
+    return _PackLoader(commit_cls, using, batch_size).load(records)
+
+
+def write_pack(records, path):
+  with gzip.open(path, 'wt') as f:
+    for record in records:
+      f.write(json.dumps(record, sort_keys=True))
+      f.write("\n")
+
+
+def read_pack(path):
+  with gzip.open(path, 'rt') as f:
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+
+def pack(head, path, base=None, batch_size=1000):
+  """ writes the commits of head's chain that aren't in base's to a pack file """
+  write_pack(pack_records(commit_range(head, base), batch_size=batch_size), path)
+
+
+def unpack(commit_cls, path, using=None, batch_size=1000):
+  return load_records(commit_cls, read_pack(path), using=using, batch_size=batch_size)
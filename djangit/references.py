@@ -0,0 +1,32 @@
+"""
+  reverse lookups through many-to-many pointers, e.g. "which divisions had tag X at commit C"
+
+  a pointer's auto-created through table is already the reverse index:
+  its target column is indexed and maps a target to the pointer records that contain it,
+  and the pointer foreign key on versions is indexed as well,
+  so a lookup is two indexed semi-joins instead of a scan of every pointer
+"""
+from .models.bulk import _pointer_fields, _through_attrs
+
+
+def pointer_fields_to(version_cls, target_model):
+  return [ f for f in _pointer_fields(version_cls) if f.related_model._meta.get_field('related').related_model is target_model ]
+
+
+def pointers_containing(pointer_model, target):
+  """ ids of the pointer records whose related set contains target """
+  (through, source_attr, target_attr) = _through_attrs(pointer_model._meta.get_field('related'))
+  return through._base_manager.filter(**{ target_attr: target.pk }).values(source_attr)
+
+
+def referencing(target, at_commit):
+  """
+    returns { version_cls: queryset } of the versions live at at_commit that point to target,
+    for every tracked model with a pointer field to target's model
+    raises ArchivedHistoryException when some of the versions live at at_commit are archived, see VersionQuerySet.at_commit
+  """
+  return {
+    version_cls: version_cls.objects.at_commit(at_commit).referencing(target)
+    for version_cls in at_commit.tracked_models.values()
+    if pointer_fields_to(version_cls, target.__class__)
+  }
@@ -0,0 +1,64 @@
+"""
+  read replicas: everything reachable from a finalized commit is immutable,
+  so once a replica has a commit, resolving it there is as good as resolving it on the primary
+
+    DATABASE_ROUTERS = [ 'djangit.replicas.ReplicaRouter' ]
+    DJANGIT_REPLICAS = [ 'replica' ]
+
+  replica_for(commit) (or commit.on_replica()) loads a finalized commit from the first replica that has it,
+  and the resolution API follows the commit's database: version_sets, version_for, at_commit, log...
+  drafts, and commits no replica has yet, stay on the primary
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+def replica_aliases():
+  return list(getattr(settings, 'DJANGIT_REPLICAS', []))
+
+
+def primary_alias():
+  return getattr(settings, 'DJANGIT_PRIMARY', DEFAULT_DB_ALIAS)
+
+
+def replica_for(commit, replicas=None):
+  """
+    commit as loaded from the first of replicas (default: settings.DJANGIT_REPLICAS) that has it
+    a replica has a commit when it has a commit with the same checksum, which covers its whole history
+    falls back to commit itself for drafts and commits that aren't replicated yet
+  """
+  if not commit.checksum:
+    return commit
+  for alias in (replica_aliases() if replicas is None else replicas):
+    replicated = commit.__class__.objects.using(alias).filter(checksum=commit.checksum).first()
+    if replicated is not None:
+      return replicated
+  return commit
+
+
+class ReplicaRouter:
+  """
+    lookups that start from an instance loaded from a replica (related managers, foreign keys) stay on that replica,
+    writes always go to the primary, so saving a copy-on-write clone of a replica's version doesn't touch the replica
+    everything else is left to the default routing
+  """
+
+  def _replica_of(self, hints):
+    instance = hints.get('instance')
+    db = instance is not None and instance._state.db
+    return db if db in replica_aliases() else None
+
+  def db_for_read(self, model, **hints):
+    return self._replica_of(hints)
+
+  def db_for_write(self, model, **hints):
+    if self._replica_of(hints):
+      return primary_alias()
+    return None
+
+  def allow_relation(self, obj1, obj2, **hints):
+    # a replica holds copies of the primary's rows
+    databases = { primary_alias(), *replica_aliases() }
+    if obj1._state.db in databases and obj2._state.db in databases:
+      return True
+    return None
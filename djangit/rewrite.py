@@ -0,0 +1,406 @@
+"""
+  history rewriting: operations that modify finalized commits and then restore their checksums in bulk
+"""
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+
+from .merge import lowest_common_ancestor, three_way_merge
+from .archive import addition_tiers, has_archived_additions, touches_archive, versions_with_archive
+from .gc import _references
+from .models.bulk import _bulk_create_through_rows, _bulk_create_pointers, _pointer_fields, _identity_fields
+from .utils import (
+  full_group_by,
+  hash_for_commit,
+  hash_for_model_instance,
+  current_time,
+  MergeConflictException,
+  RewriteException,
+)
+
+
+def _adds_through(commit_cls, version_cls):
+  """ returns (through_model, commit_field_name, version_field_name) """
+  m2m_field = commit_cls._meta.get_field(commit_cls._add_attr_name_for_version_cls(version_cls))
+  return (m2m_field.remote_field.through, m2m_field.m2m_field_name(), m2m_field.m2m_reverse_field_name())
+
+
+def recompute_checksums(root):
+  """
+    recomputes the checksums of root and its finalized descendants, parents before children
+    each through table (archives included) is read once for the whole subtree,
+    and all commits are written with a single bulk_update, then the refs pointing into the subtree are refreshed
+  """
+  commit_cls = root.__class__
+  root = commit_cls.objects.get(pk=root.pk)
+  subtree = root.get_descendants(include_self=True)
+
+  added_checksums = defaultdict(list)
+  for version_cls in commit_cls.tracked_models.values():
+    # merging both tiers by checksum gives the order CommitBase._compute_hash hashes versions in
+    tiers = [
+      through._base_manager
+        .filter(**{ f"{commit_name}__in": subtree })
+        .order_by(f"{version_name}__checksum", f"{commit_name}_id")
+        .values_list(f"{version_name}__checksum", f"{commit_name}_id")
+        .iterator()
+      for (_model, through, commit_name, version_name) in addition_tiers(version_cls)
+    ]
+    for (checksum, commit_id) in heapq.merge(*tiers):
+      added_checksums[commit_id].append(checksum)
+
+  checksums = {}
+  if root.parent_commit_id:
+    checksums[root.parent_commit_id] = root.parent_commit.checksum
+
+  commits = [ c for c in subtree.order_by('level') if c.checksum ]
+  renumbered = []
+  for c in commits:
+    parent_checksum = ""
+    if c.parent_commit_id:
+      parent_checksum = checksums.get(c.parent_commit_id)
+      if not parent_checksum:
+        raise RewriteException("Parent commit needs to be comitted")
+    checksum = hash_for_commit(added_checksums[c.pk], parent_checksum)
+    if checksum != c.checksum or c.feed_position is None:
+      # the change feed emits rewritten commits again, numbered after everything it emitted, see djangit.feed
+      renumbered.append(c)
+    (c.checksum, checksums[c.pk]) = (checksum, checksum)
+
+  positions = commit_cls._next_feed_positions(len(renumbered), commit_cls.objects.db)
+  for (position, c) in zip(positions, renumbered):
+    c.feed_position = position
+  commit_cls.objects.bulk_update(commits, ['checksum', 'feed_position'], batch_size=500)
+  _refresh_refs(commit_cls, subtree)
+  return commits
+
+
+def _carry_field_changes(moved_commits, changes):
+  """
+    field-level changes made on the new base to objects that the rebased commits also modified
+    are written into copies of their versions, which replace them in every moved commit that added them
+  """
+  commit_cls = moved_commits.model
+  by_class = defaultdict(dict)
+  for (version, field_values) in changes.items():
+    by_class[version.__class__][version.pk] = (version, field_values)
+
+  for (version_cls, edits) in by_class.items():
+    (through, commit_name, version_name) = _adds_through(commit_cls, version_cls)
+    for (version_id, (version, field_values)) in edits.items():
+      new_version = version.clone()
+      for (name, value) in field_values.items():
+        setattr(new_version, name, value)
+      new_version.save()
+      new_version.finalize_version()
+      through._base_manager.filter(**{
+        f"{commit_name}__in": moved_commits,
+        f"{version_name}_id": version_id,
+      }).update(**{ f"{version_name}_id": new_version.pk })
+
+
+def rebase(chain_tip, onto):
+  """
+    replays the commits between chain_tip and its common ancestor with onto on top of onto
+
+    * the range is moved in one tree operation, so descendants of the range move along with it
+    * objects touched on both sides are merged field by field, for chain_tip and for every leaf below the range,
+      any conflict aborts the rebase
+    * checksums of the moved subtree are recomputed in bulk
+    * commits whose additions were archived (see djangit.archive) can't be rebased
+    returns the refreshed chain_tip
+  """
+  commit_cls = chain_tip.__class__
+  chain_tip = commit_cls.objects.get(pk=chain_tip.pk)
+  onto = commit_cls.objects.get(pk=onto.pk)
+
+  base = lowest_common_ancestor(chain_tip, onto)
+  if base == chain_tip:
+    raise RewriteException("Cannot rebase a commit onto one of its own descendants")
+  if base == onto:
+    return chain_tip
+
+  commit_range = chain_tip._chain_queryset()
+  if base is not None:
+    commit_range = commit_range.filter(level__gt=base.level)
+  range_root = commit_range.order_by('level').first()
+
+  if not onto.checksum:
+    raise RewriteException("Can only rebase onto a finalized commit")
+
+  # branches forking off the range move too, each of them has to merge cleanly with onto
+  changes = {}
+  for tip in [ chain_tip ] + list(range_root.get_leafnodes(include_self=True).exclude(pk=chain_tip.pk)):
+    merge = three_way_merge(tip, onto)
+    if merge.conflicts:
+      raise MergeConflictException(merge.conflicts)
+    changes.update(merge.changes)
+
+  # materialize the subtree before the move changes its tree coordinates
+  moved_commits = commit_cls.objects.filter(
+    pk__in=list(range_root.get_descendants(include_self=True).values_list('pk', flat=True))
+  )
+  if has_archived_additions(moved_commits):
+    raise RewriteException("Cannot rebase archived commits, see djangit.archive")
+
+  with transaction.atomic():
+    _carry_field_changes(moved_commits, changes)
+    range_root._move_under(onto)
+    recompute_checksums(range_root)
+
+  return commit_cls.objects.get(pk=chain_tip.pk)
+
+
+def _refresh_refs(commit_cls, commits):
+  """ refs cache their head's level, commit date and object counts, which change when history above them is rewritten """
+  if hasattr(commit_cls, 'refs'):
+    commit_cls.refs.rel.related_model.refresh_heads(commits)
+
+
+def squash(first, last, archive=False, batch_size=1000):
+  """
+    replaces the linear range of finalized commits from first to last (both included)
+    with a single commit holding the range's net additions and removals
+
+    * last's children (and everything below them) are re-parented onto the squashed commit,
+      and their checksums are recomputed in bulk
+    * refs pointing to last move to the squashed commit
+    * the originals are deleted, or kept as a detached branch under first's parent with archive=True
+    * ranges whose additions were moved to the archive tables (see djangit.archive) can't be squashed
+    returns the squashed commit
+  """
+  commit_cls = last.__class__
+  first = commit_cls.objects.get(pk=first.pk)
+  last = commit_cls.objects.get(pk=last.pk)
+
+  if not last.checksum:
+    raise RewriteException("Can only squash finalized commits")
+  commit_range = last._chain_queryset().filter(level__gte=first.level)
+  if not commit_range.filter(pk=first.pk).exists():
+    raise RewriteException("The first commit of a squashed range has to be an ancestor of the last one")
+  range_ids = list(commit_range.order_by('level').values_list('pk', flat=True))
+  commit_range = commit_cls.objects.filter(pk__in=range_ids)
+  if has_archived_additions(commit_range):
+    raise RewriteException("Cannot squash archived commits, see djangit.archive")
+
+  branching = (
+    commit_range.exclude(pk=last.pk)
+      .annotate(n_children=Count('children_commits'))
+      .filter(n_children__gt=1)
+  )
+  if branching.exists():
+    raise RewriteException("Cannot squash a range that other branches fork from")
+  if hasattr(commit_cls, 'refs') and commit_cls.refs.rel.related_model.objects.filter(head__in=commit_range.exclude(pk=last.pk)).exists():
+    raise RewriteException("Cannot squash a range that refs point into")
+
+  parent = first.parent_commit
+  excluded_fields = { 'id', 'checksum', 'feed_position', 'parent_commit', 'lft', 'rght', 'tree_id', 'level' }
+  attrs = {
+    f.attname: getattr(last, f.attname)
+    for f in commit_cls._meta.concrete_fields
+    if f.name not in excluded_fields
+  }
+
+  with transaction.atomic():
+    squashed = commit_cls(parent_commit=parent, **attrs)
+    squashed.save()
+
+    for version_cls in commit_cls.tracked_models.values():
+      # the latest addition of every object the range touched is what's live at last
+      added = (
+        version_cls.objects.hot_at_commit(last)
+          .filter(added_in__in=commit_range)
+          .distinct()
+          .values_list('pk', flat=True)
+      )
+      _bulk_create_through_rows(
+        commit_cls._meta.get_field(commit_cls._add_attr_name_for_version_cls(version_cls)),
+        ( (squashed.pk, version_id) for version_id in added.iterator() ),
+        batch_size,
+      )
+
+      # removals only matter for objects that were live before the range and aren't anymore
+      removed = (
+        version_cls._eternal_cls.objects
+          .filter(removed_in__in=commit_range)
+          .exclude(id__in=version_cls.objects.hot_at_commit(last).values('eternal_id'))
+      )
+      if parent is None:
+        removed = removed.none()
+      elif touches_archive(version_cls, parent):
+        removed = removed.filter(id__in=list(versions_with_archive(version_cls, parent, removed.values('id'))))
+      else:
+        removed = removed.filter(id__in=version_cls.objects.hot_at_commit(parent).values('eternal_id'))
+      _bulk_create_through_rows(
+        commit_cls._meta.get_field(commit_cls._rm_attr_name_for_version_cls(version_cls)),
+        ( (squashed.pk, eternal_id) for eternal_id in removed.distinct().values_list('pk', flat=True).iterator() ),
+        batch_size,
+      )
+
+    commit_cls.objects.filter(pk=squashed.pk).update(
+      checksum=squashed._compute_hash(),
+      committed_at=last.committed_at or current_time(),
+    )
+
+    for child in last.children_commits.all():
+      child._move_under(squashed)
+    if hasattr(commit_cls, 'refs'):
+      last.refs.update(head=squashed)
+    recompute_checksums(squashed)
+
+    if not archive:
+      # the range is a leaf chain by now, deleting it leaves a harmless gap in the tree coordinates
+      commit_range.delete()
+
+  return commit_cls.objects.get(pk=squashed.pk)
+
+
+def _recompute_subtrees(commit_cls, commit_ids):
+  """ recomputes checksums below every commit of commit_ids, each subtree once """
+  roots = []
+  for c in commit_cls.objects.filter(pk__in=list(commit_ids)).order_by('tree_id', 'lft'):
+    if roots and roots[-1].tree_id == c.tree_id and roots[-1].lft < c.lft and c.rght < roots[-1].rght:
+      continue
+    roots.append(c)
+  for root in roots:
+    recompute_checksums(root)
+
+
+def _commits_adding(version_cls, version_ids):
+  commit_ids = set()
+  for (_model, through, commit_name, version_name) in addition_tiers(version_cls):
+    commit_ids.update(
+      through._base_manager
+        .filter(**{ f"{version_name}_id__in": version_ids })
+        .values_list(f"{commit_name}_id", flat=True)
+    )
+  return commit_ids
+
+
+def _referenced_ids(model, ids, ignored=()):
+  """ the ids of ids that something (besides models in ignored) still references """
+  unreferenced = model._base_manager.filter(*_references(model, ignored), pk__in=ids).values_list('pk', flat=True)
+  return set(ids) - set(unreferenced)
+
+
+def _delete_unreferenced_pointers(pointer_ids_by_model):
+  for (pointer_model, ids) in pointer_ids_by_model.items():
+    ids = list(ids)
+    still_referenced = _referenced_ids(pointer_model, ids)
+    pointer_model._base_manager.filter(pk__in=set(ids) - still_referenced).delete()
+
+
+def redact(commit_cls, versions, batch_size=1000, **field_values):
+  """
+    overwrites fields of finalized versions in place, e.g. redact(Commit, versions, name="[redacted]", tags=[])
+    pointer fields take lists of related ids, the pointer records they replace are deleted once nothing uses them
+    version checksums are recomputed, then the checksums of every commit adding them and of their descendants,
+    with batched reads and one bulk_update per subtree
+    archived versions (see djangit.archive) are redacted in the archive tables
+    returns the redacted versions
+  """
+  redacted = []
+  affected_commits = set()
+  replaced_pointers = defaultdict(set)
+
+  with transaction.atomic():
+    for (version_cls, v_list) in full_group_by(versions, lambda v: v.__class__):
+      ids = [ v.pk for v in v_list ]
+      pointer_fields = { f.name: f for f in _pointer_fields(version_cls) }
+      updated_fields = [ version_cls._meta.get_field(name).attname for name in field_values ] + ['checksum']
+      if version_cls.track_field_digests:
+        updated_fields.append('field_digests')
+
+      # versions only old commits reach may have been archived, their rows are redacted in the archive
+      for (model, _through, _commit_name, _version_name) in addition_tiers(version_cls):
+        rows = list(model._base_manager.filter(pk__in=ids).select_related(*[ f.name for f in _identity_fields(version_cls) ]))
+        if not rows:
+          continue
+
+        for (name, value) in field_values.items():
+          if name in pointer_fields:
+            field = pointer_fields[name]
+            replaced_pointers[field.related_model].update(
+              getattr(v, field.attname) for v in rows if getattr(v, field.attname) is not None
+            )
+            new_pointers = _bulk_create_pointers(field.related_model, [ value ] * len(rows), batch_size)
+            for (v, pointer) in zip(rows, new_pointers):
+              setattr(v, name, pointer)
+          else:
+            for v in rows:
+              setattr(v, name, value)
+
+        for v in rows:
+          v.checksum = None
+          # archived rows are hashed as the versions they were
+          version = v if model is version_cls else v.restore()
+          v.checksum = hash_for_model_instance(version)
+          if version_cls.track_field_digests:
+            v.field_digests = version._compute_field_digests()
+        model._base_manager.bulk_update(rows, updated_fields, batch_size=batch_size)
+        redacted.extend(v if model is version_cls else v.restore() for v in rows)
+
+      affected_commits |= _commits_adding(version_cls, ids)
+
+    _delete_unreferenced_pointers(replaced_pointers)
+    _recompute_subtrees(commit_cls, affected_commits)
+
+  return redacted
+
+
+def purge(commit_cls, versions=(), pointers=(), batch_size=1000):
+  """
+    true deletion: versions are removed from every commit that added them and deleted,
+    as if they had never been committed (earlier versions of their objects become live again)
+    pointer records are deleted, and the versions that pointed to them point to nothing instead
+
+    versions that other rows still reference (e.g. a Team version referenced by an Employee version) can't be purged
+    archived versions (see djangit.archive) are deleted from the archive tables
+    the checksums of affected commits and their descendants are recomputed in bulk
+  """
+  with transaction.atomic():
+    for (pointer_model, p_list) in full_group_by(pointers, lambda p: p.__class__):
+      pointer_ids = [ p.pk for p in p_list ]
+      for version_cls in commit_cls.tracked_models.values():
+        for field in _pointer_fields(version_cls):
+          if field.related_model is pointer_model:
+            pointing = [
+              v if model is version_cls else v.restore()
+              for (model, _through, _commit_name, _version_name) in addition_tiers(version_cls)
+              for v in model._base_manager.filter(**{ f"{field.attname}__in": pointer_ids })
+            ]
+            redact(commit_cls, pointing, batch_size=batch_size, **{ field.name: [] })
+      pointer_model._base_manager.filter(pk__in=pointer_ids).delete()
+
+    affected_commits = set()
+    replaced_pointers = defaultdict(set)
+    for (version_cls, v_list) in full_group_by(versions, lambda v: v.__class__):
+      ids = [ v.pk for v in v_list ]
+      # versions only old commits reach may have been archived, see djangit.archive
+      tiers = addition_tiers(version_cls)
+      still_referenced = set(ids)
+      for (model, _through, _commit_name, _version_name) in tiers:
+        # references are reverse relations of the version model, whichever table the row is in
+        still_referenced -= set(
+          model._base_manager
+            .filter(*_references(version_cls, ignored=(commit_cls,)), pk__in=ids)
+            .values_list('pk', flat=True)
+        )
+      if still_referenced:
+        raise RewriteException(f"{version_cls.__name__} versions {sorted(still_referenced)} are still referenced")
+
+      affected_commits |= _commits_adding(version_cls, ids)
+      for (model, through, _commit_name, version_name) in tiers:
+        for field in _pointer_fields(version_cls):
+          replaced_pointers[field.related_model].update(
+            model._base_manager
+              .filter(pk__in=ids, **{ f"{field.attname}__isnull": False })
+              .values_list(field.attname, flat=True)
+          )
+        through._base_manager.filter(**{ f"{version_name}_id__in": ids }).delete()
+        model._base_manager.filter(pk__in=ids).delete()
+
+    _delete_unreferenced_pointers(replaced_pointers)
+    _recompute_subtrees(commit_cls, affected_commits)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -82,7 +83,7 @@ if os.getenv('CIRCLECI'):
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-        }
+        },
     }
 else:
     DATABASES = {
@@ -94,9 +95,36 @@ else:
             'PORT': '5432',
             'HOST': '127.0.0.1',
             'TEST': { "NAME": "test-djangit-example" }
-        }
+        },
     }
 
+# a second djangit database, for packs and sync between databases, and a read replica of default, see djangit.replicas
+# the test suite needs them, other runs only get them with DJANGIT_EXTRA_DATABASES=1
+if sys.argv[1:2] == ['test'] or os.getenv('DJANGIT_EXTRA_DATABASES'):
+    if os.getenv('CIRCLECI'):
+        DATABASES['peer'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db-peer.sqlite3'),
+        }
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+        }
+    else:
+        DATABASES['peer'] = {
+            **DATABASES['default'],
+            'NAME': 'djangit-example-peer',
+            'TEST': { "NAME": "test-djangit-example-peer" }
+        }
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': 'djangit-example-replica',
+            'TEST': { "NAME": "test-djangit-example-replica" }
+        }
+
+    DATABASE_ROUTERS = [ 'djangit.replicas.ReplicaRouter' ]
+    DJANGIT_REPLICAS = [ 'replica' ]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -0,0 +1,132 @@
+"""
+  have/want negotiation between two djangit databases, like git's fetch protocol:
+
+  1. the remote advertises the checksums of its heads, the ones the local side doesn't know are "wants"
+  2. the local side walks its own history newest first, sending "haves" in batches,
+     and the remote acknowledges the checksums it knows, until every want has a common ancestor
+  3. the remote packs the commits between each want and its deepest common ancestor,
+     leaving out versions the common commits already added, and the local side loads the pack
+
+  checksums chain like git's, so a commit both sides know implies both sides know its whole ancestry
+  the two databases number their rows independently, see djangit.pack for how loaded rows get local ids
+"""
+import json
+
+from django.db import router
+from django.db.models import Q
+
+from .pack import pack_records, load_records
+from .utils import chunked
+
+
+class Endpoint:
+  """
+    one side of a sync: a commit model in a database
+    heads are the head commits of refs (a RefBase queryset) when given,
+    otherwise every finalized commit that has no finalized child
+  """
+
+  def __init__(self, commit_cls, using=None, refs=None):
+    self.commit_cls = commit_cls
+    self.using = using or router.db_for_write(commit_cls)
+    self.refs = refs
+
+  @property
+  def commits(self):
+    return self.commit_cls.objects.using(self.using).filter(checksum__isnull=False)
+
+  def heads(self):
+    if self.refs is not None:
+      return self.commits.filter(pk__in=self.refs.using(self.using).values('head_id'))
+    return self.commits.exclude(children_commits__checksum__isnull=False)
+
+  def head_checksums(self):
+    return list(self.heads().values_list('checksum', flat=True))
+
+  def history(self):
+    """ finalized commits reachable from the heads, newest first """
+    reachable = Q(pk__in=[])
+    for head in self.heads():
+      reachable |= Q(pk__in=head._chain_queryset().values('pk'))
+    return self.commits.filter(reachable).order_by('-level', 'pk')
+
+  def known(self, checksums):
+    """ the subset of checksums this side has commits for """
+    return list(self.commits.filter(checksum__in=list(checksums)).values_list('checksum', flat=True))
+
+  def _bases(self, wants, common):
+    """ { want : deepest common ancestor (or None) } """
+    return {
+      want: want._chain_queryset().filter(checksum__in=list(common)).order_by('-level').first()
+      for want in self.commits.filter(checksum__in=list(wants))
+    }
+
+  def ready(self, wants, common):
+    """ whether every want already has an ancestor in common """
+    return all(base is not None for base in self._bases(wants, common).values())
+
+  def pack(self, wants, common, batch_size=1000):
+    """ records of the commits between each want and its deepest common ancestor """
+    missing = Q(pk__in=[])
+    known = Q(pk__in=[])
+    for (want, base) in self._bases(wants, common).items():
+      chain = want._chain_queryset()
+      if base is None:
+        missing |= Q(pk__in=chain.values('pk'))
+      else:
+        missing |= Q(pk__in=chain.filter(level__gt=base.level).values('pk'))
+        known |= Q(pk__in=base._chain_queryset().values('pk'))
+
+    return pack_records(
+      self.commits.filter(missing).order_by('level'),
+      batch_size=batch_size,
+      known=self.commits.filter(known),
+    )
+
+
+class LocalTransport:
+  """
+    talks to an Endpoint of the same process, e.g. another database alias
+    everything crossing the transport goes through JSON, as it would over a wire
+  """
+
+  def __init__(self, endpoint):
+    self.endpoint = endpoint
+
+  @staticmethod
+  def _wire(data):
+    return json.loads(json.dumps(data))
+
+  def head_checksums(self):
+    return self._wire(self.endpoint.head_checksums())
+
+  def known(self, checksums):
+    return self._wire(self.endpoint.known(self._wire(checksums)))
+
+  def ready(self, wants, common):
+    return self._wire(self.endpoint.ready(self._wire(wants), self._wire(common)))
+
+  def pack(self, wants, common):
+    for record in self.endpoint.pack(self._wire(wants), self._wire(common)):
+      yield self._wire(record)
+
+
+def fetch(local, transport, batch_size=256):
+  """
+    brings the commits of the remote's heads that local (an Endpoint) is missing into local's database
+    returns the commits that were added, parents first
+  """
+  remote_heads = transport.head_checksums()
+  already_known = set(local.known(remote_heads))
+  wants = [ checksum for checksum in remote_heads if checksum not in already_known ]
+  if not wants:
+    return []
+
+  common = []
+  haves = local.history().values_list('checksum', flat=True)
+  for batch in chunked(haves.iterator(chunk_size=batch_size), batch_size):
+    common.extend(transport.known(batch))
+    if common and transport.ready(wants, common):
+      break
+
+  return load_records(local.commit_cls, transport.pack(wants, common), using=local.using)
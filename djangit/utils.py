@@ -1,9 +1,12 @@
 import json
+import hashlib
+import itertools
 from collections import defaultdict
 import datetime
 import math
 
 
+from django.db import connections, router
 from django.forms import model_to_dict
 from django.utils import timezone
 
@@ -26,28 +29,104 @@ def find(iterator, key):
 
 
 def hash_for_string(str):
-  # abs() because hash potentially returns negative int
-  # [2:] because hex returns string starting in 0x 
-  return hex(
-    abs(
-      hash(str)
-    )
-  )[2:]
+  # a stable digest rather than hash(), which is salted per process,
+  # so checksums can be verified by another process or database (see djangit.pack)
+  return hashlib.sha1(str.encode()).hexdigest()
+
+def hash_for_commit(added_checksums, parent_checksum):
+  """ added_checksums are the checksums of the versions a commit adds, in tracked-model then checksum order """
+  return hash_for_string( "".join(added_checksums) + parent_checksum )
+
+def field_identity(instance, field, value):
+  """
+    the form of a field's value that checksums cover
+    foreign keys to models with a hash_identity (eternals, pointer records) are represented by it instead of the id,
+    ids are assigned by each database, hash identities are the same in all of them
+  """
+  if value is not None and field.many_to_one and hasattr(field.related_model, 'hash_identity'):
+    return getattr(instance, field.name).hash_identity
+  if isinstance(value, datetime.datetime):
+    return value.__str__()
+  return value
 
 def hash_for_model_instance(instance):
-  """ returns a git-like hash-string for a model instance """
+  """
+    returns a git-like hash-string for a model instance
+    it doesn't depend on ids: the primary key is left out, and foreign keys are hashed by their field_identity,
+    so a version hashes the same in every database (see djangit.pack)
+  """
 
   
   # we exclude m2m because we want their 'versioning' to be updated independently 
   m2m_attrs =  [ f.attname for f in instance._meta.many_to_many ]
   inst_dict = {
-    k: ( v.__str__() if isinstance(v, datetime.datetime) else v )
+    k: field_identity(instance, instance._meta.get_field(k), v)
     for (k,v) in model_to_dict(instance).items()
-    if k not in m2m_attrs
+    if k not in m2m_attrs and k != instance._meta.pk.name
   }
   json_str = json.dumps(inst_dict, sort_keys=True)
   return hash_for_string(json_str)
 
+def chunked(iterable, size):
+  """ yields lists of at most size items, without ever materializing the whole iterable """
+  iterator = iter(iterable)
+  while True:
+    chunk = list(itertools.islice(iterator, size))
+    if not chunk:
+      return
+    yield chunk
+
+def bulk_create_with_pks(model, objs, batch_size=None):
+  """
+    bulk_create that guarantees primary keys are set on the created instances
+    backends that can't return ids from bulk inserts fall back to one insert per row
+  """
+  connection = connections[router.db_for_write(model)]
+  if connection.features.can_return_rows_from_bulk_insert:
+    return model._base_manager.bulk_create(objs, batch_size=batch_size)
+
+  for obj in objs:
+    # save_base skips save() overrides, which may refuse pre-checksummed rows
+    obj.save_base(force_insert=True)
+  return objs
+
 
 class LockedInformationException(Exception):
-  pass
\ No newline at end of file
+  pass
+
+class MergeConflictException(Exception):
+  def __init__(self, conflicts):
+    super().__init__(f"Cannot apply a merge with {len(conflicts)} unresolved conflict(s)")
+    self.conflicts = conflicts
+
+class ConstraintViolationException(Exception):
+  def __init__(self, violations):
+    super().__init__(
+      "Commit violates versioned constraints:\n" + "\n".join(repr(v) for v in violations)
+    )
+    self.violations = violations
+
+class StaleHeadException(Exception):
+  """ a branch's head moved since the caller read it, see RefBase.compare_and_swap """
+  def __init__(self, ref, expected_head):
+    super().__init__(f"{ref} no longer points to commit {expected_head.pk}")
+    self.ref = ref
+    self.expected_head = expected_head
+
+class RewriteException(Exception):
+  """ a history rewrite (see djangit.rewrite) can't be applied to the commits or versions it was given """
+  pass
+
+class PackIntegrityException(Exception):
+  """ a pack doesn't match its checksums, or conflicts with what the receiving database holds """
+  pass
+
+class ArchivedHistoryException(Exception):
+  """ a lazy queryset can't cover versions that are archived, see djangit.archive """
+  def __init__(self, version_cls, commit):
+    super().__init__(
+      f"Some {version_cls.__name__} versions live at commit {commit.pk} are archived, "
+      "resolve them with commit.version_sets() or commit.version_for()"
+    )
+    self.version_cls = version_cls
+    self.commit = commit
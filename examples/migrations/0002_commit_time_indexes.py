@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examples', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commit',
+            name='committed_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='commit',
+            name='time',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, null=True),
+        ),
+    ]
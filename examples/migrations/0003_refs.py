@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('examples', '0002_commit_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ref',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('kind', models.CharField(choices=[('branch', 'branch'), ('tag', 'tag')], default='branch', max_length=10)),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('head_committed_at', models.DateTimeField(null=True)),
+                ('object_counts', models.TextField(default='{}')),
+                ('head', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='refs', to='examples.commit')),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('kind', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CheckedOutRef',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ref', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkouts', to='examples.ref')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examples', '0003_refs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='field_digests',
+            field=models.TextField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:46
+
+import djangit.models.proxy_models
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examples', '0005_gc_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTeam',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('checksum', models.CharField(max_length=100, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('name', models.TextField()),
+                ('added_in', models.ManyToManyField(related_name='_examples_archivedteam_added_in_+', to='examples.Commit')),
+                ('division', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_archivedteam_division', to='examples.eternaldivision')),
+                ('eternal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_archivedteam_eternal', to='examples.eternalteam')),
+                ('tags', djangit.models.proxy_models._RealPointerField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_archivedteam_tags', to='examples.tag_manytomanypointer')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedEmployee',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('checksum', models.CharField(max_length=100, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('name', models.TextField()),
+                ('field_digests', models.TextField(editable=False, null=True)),
+                ('added_in', models.ManyToManyField(related_name='_examples_archivedemployee_added_in_+', to='examples.Commit')),
+                ('eternal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_archivedemployee_eternal', to='examples.eternalemployee')),
+                ('tags', djangit.models.proxy_models._RealPointerField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_archivedemployee_tags', to='examples.tag_manytomanypointer')),
+                ('team', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_archivedemployee_team', to='examples.team')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDivision',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('checksum', models.CharField(max_length=100, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('name', models.TextField()),
+                ('added_in', models.ManyToManyField(related_name='_examples_archiveddivision_added_in_+', to='examples.Commit')),
+                ('eternal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_archiveddivision_eternal', to='examples.eternaldivision')),
+                ('tags', djangit.models.proxy_models._RealPointerField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_archiveddivision_tags', to='examples.tag_manytomanypointer')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examples', '0006_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commit',
+            name='feed_position',
+            field=models.PositiveIntegerField(editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examples', '0007_commit_feed_position'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commit',
+            index=models.Index(fields=['tree_id', 'committed_at'], name='examples_commit_as_of'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:53
+
+from django.db import migrations, models
+import uuid
+
+
+ETERNAL_MODELS = ['eternaldivision', 'eternalemployee', 'eternalteam']
+
+
+def fill_uuids(apps, schema_editor):
+    # a callable default is evaluated once for every existing row, each of them needs its own uuid
+    for name in ETERNAL_MODELS:
+        model = apps.get_model('examples', name)
+        for eternal in model.objects.using(schema_editor.connection.alias).only('pk'):
+            eternal.uuid = uuid.uuid4()
+            eternal.save(update_fields=['uuid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examples', '0008_commit_as_of_index'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=name,
+                name='uuid',
+                field=models.UUIDField(editable=False, null=True),
+            )
+            for name in ETERNAL_MODELS
+        ],
+        migrations.RunPython(fill_uuids, migrations.RunPython.noop),
+        *[
+            migrations.AlterField(
+                model_name=name,
+                name='uuid',
+                field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+            )
+            for name in ETERNAL_MODELS
+        ],
+    ]
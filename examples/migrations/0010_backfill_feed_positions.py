@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:02
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def number_finalized_commits(apps, schema_editor):
+    # commits are numbered when they're finalized now, those the change feed hasn't seen yet never will be otherwise
+    Commit = apps.get_model('examples', 'Commit')
+    commits = Commit.objects.using(schema_editor.connection.alias)
+    last = commits.aggregate(last=Max('feed_position'))['last'] or 0
+    pending = (
+        commits
+            .filter(checksum__isnull=False, feed_position__isnull=True)
+            .order_by('committed_at', 'pk')
+            .values_list('pk', flat=True)
+    )
+    for (offset, pk) in enumerate(list(pending), 1):
+        commits.filter(pk=pk).update(feed_position=last + offset)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examples', '0009_eternal_uuid'),
+    ]
+
+    operations = [
+        migrations.RunPython(number_finalized_commits, migrations.RunPython.noop),
+    ]
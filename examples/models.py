@@ -1,6 +1,9 @@
 from django.db import models
 # from djangit.models.commit import create_version_parent, CommitBase, create_versioning_decorator, PointerField
 from djangit.models.commit import VersionedModel, CommitBase, PointerField
+from djangit.models.refs import RefBase, CheckedOutRefBase
+from djangit.models.archive import ArchivedVersionBase
+from djangit.constraints import UniqueTogether, EternalExists
 
 
 class Commit(CommitBase):
@@ -9,6 +12,14 @@ class Commit(CommitBase):
   )
 
 
+class Ref(RefBase):
+  commit_model=Commit
+
+
+class CheckedOutRef(CheckedOutRefBase):
+  ref_model=Ref
+
+
 # version_model = create_version_parent(Commit)
 # add_versioning = create_versioning_decorator(Commit)
 
@@ -30,6 +41,10 @@ class Division(VersionedModel):
 
 class Team(VersionedModel):
   commit_model=Commit
+  versioned_constraints=[
+    UniqueTogether(['name', 'division']),
+    EternalExists('division'),
+  ]
   name = models.TextField()
   division = models.ForeignKey(
     "examples.EternalDivision",
@@ -44,6 +59,7 @@ class Team(VersionedModel):
 
 class Employee(VersionedModel):
   commit_model=Commit
+  track_field_digests=True
   name=models.TextField()
   team = models.ForeignKey(
     "examples.Team",
@@ -55,4 +71,15 @@ class Employee(VersionedModel):
 
 
   def __str__(self):
-    return self.name
\ No newline at end of file
+    return self.name
+
+class ArchivedDivision(ArchivedVersionBase):
+  version_model=Division
+
+
+class ArchivedTeam(ArchivedVersionBase):
+  version_model=Team
+
+
+class ArchivedEmployee(ArchivedVersionBase):
+  version_model=Employee
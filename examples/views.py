@@ -1,10 +1,14 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.http import Http404
 from django.http.response import HttpResponseRedirect
 from django.views import View
 from django.views import generic
 from django.urls import path, reverse
 
 from djangit.models.commit import VersionModelForm
+from djangit.models.querysets import prefetch_for_display
+from djangit.log import object_history, paginate_by_level
+from djangit.archive import touches_archive, versions_with_archive
 
 from .models import (
   Commit,
@@ -14,28 +18,78 @@ from .models import (
 # Create your views here.
 
 
+def before_level(request):
+  """ the ?before= cursor of paginated logs """
+  before = request.GET.get("before")
+  if not before:
+    return None
+  if not before.isdigit():
+    raise Http404(f"Invalid cursor {before}")
+  return int(before)
+
+
 class GitLog(generic.ListView):
   template_name = "git-log.html"
+  context_object_name = "commits"
+
   def get_queryset(self):
-    import IPython; IPython.embed()
+    self.head = get_object_or_404(Commit, pk=self.kwargs['commit_pk'])
+    (page, self.next_cursor) = self.head.log(
+      before_level=before_level(self.request),
+    )
+    return page
+
+  def get_context_data(self,*args,**kwargs):
+    return {
+      **super().get_context_data(*args,**kwargs),
+      "head": self.head,
+      "next_cursor": self.next_cursor,
+    }
 
 class ViewCommit(generic.DetailView):
   template_name="commit_detail.html"
   def get_object(self):
-    return Commit.objects.get(pk=self.kwargs['commit_pk'])
+    return get_object_or_404(Commit, pk=self.kwargs['commit_pk'])
 
   def get_context_data(self,*args,**kwargs):
+    versions = {}
+    for cls in self.object.tracked_models.values():
+      if touches_archive(cls, self.object):
+        # lazy querysets don't reach the archive, old commits are resolved over both tables
+        versions[cls] = prefetch_for_display(cls, list(versions_with_archive(cls, self.object).values()))
+      else:
+        versions[cls] = cls.objects.hot_at_commit(self.object).with_related()
     ret = {
       **super().get_context_data(*args,**kwargs),
-      "versions":self.object.version_sets,
+      "versions": versions,
     }
     return ret
 
 
 class GitObjectLog(generic.ListView):
-  template_name = "commit-view.html"
-  def get_queryset(self,commit_pk):
-    import IPython; IPython.embed()
+  template_name = "git-object-log.html"
+  context_object_name = "commits"
+
+  def get_queryset(self):
+    self.head = get_object_or_404(Commit, pk=self.kwargs['commit_pk'])
+    version_cls = Commit.tracked_models.get(self.kwargs['model'])
+    if version_cls is None:
+      raise Http404(f"No tracked model named {self.kwargs['model']}")
+    self.eternal = get_object_or_404(version_cls._eternal_cls, pk=self.kwargs['eternal_pk'])
+    (page, self.next_cursor) = paginate_by_level(
+      object_history(self.head, self.eternal),
+      before_level=before_level(self.request),
+    )
+    return page
+
+  def get_context_data(self,*args,**kwargs):
+    return {
+      **super().get_context_data(*args,**kwargs),
+      "head": self.head,
+      "model": self.kwargs['model'],
+      "eternal": self.eternal,
+      "next_cursor": self.next_cursor,
+    }
 
 
 class DivisionVersionForm(VersionModelForm):
@@ -66,6 +120,6 @@ class EditDivision(generic.FormView):
 urlpatterns = [
   path("commit/<int:commit_pk>/", ViewCommit.as_view(), name="view-commit"),
   path("commit/<int:commit_pk>/history/",GitLog.as_view(), name="git-log"),
-  path("commit/<int:commit_pk>/<str:model>/<int:eternal_pk>/history/", GitLog.as_view(), name="git-object-log"),
+  path("commit/<int:commit_pk>/<str:model>/<int:eternal_pk>/history/", GitObjectLog.as_view(), name="git-object-log"),
   path("add_version/division/<int:division_pk>",EditDivision.as_view(),name="add-division-version"),
 ]
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+  benchmarks of core operations over synthetic repositories (see tests/synthetic.py),
+  run against a throwaway test database, e.g. SQLite with CIRCLECI=1:
+
+    ./manage.py runscript benchmark                                  # every profile
+    ./manage.py runscript benchmark --script-args deep wide save      # some profiles, then record the results
+    ./manage.py runscript benchmark --script-args tolerance=2
+
+  each benchmark keeps its best wall time out of REPEAT runs, and the number of queries it ran
+  `save` appends the results to scripts/benchmark_history.json, which later runs compare against:
+  the run fails (exit code 1) when a benchmark runs more queries than the last saved run of the same profile,
+  or gets slower by more than `tolerance` times (1.5 by default) and NOISE seconds
+"""
+import os
+import json
+import time
+import subprocess
+import contextlib
+
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases, CaptureQueriesContext
+from django.utils import timezone
+
+from djangit.diffs import Diff
+from djangit.models import _RealPointerField
+from examples.models import Commit, Division, Team, Employee
+from tests.synthetic import generate
+
+
+HISTORY = os.path.join(os.path.dirname(__file__), "benchmark_history.json")
+REPEAT = 5
+NOISE = 0.01
+
+PROFILES = {
+  "deep": dict(depth=200, width=20),
+  "wide": dict(depth=5, width=2000, edits=200, churn=50),
+  "models": dict(depth=30, width=200, edits=20, models=(Division, Team, Employee)),
+  "bushy": dict(depth=40, width=20, branches=30, branch_depth=5),
+  "tagged": dict(depth=60, width=20, tags=60),
+}
+
+
+def bench_version_sets(repo, measured):
+  with measured():
+    repo.main[-1].version_sets()
+
+
+def bench_lazy_counts(repo, measured):
+  with measured():
+    for queryset in repo.main[-1].version_sets(lazy=True).values():
+      queryset.count()
+
+
+def bench_version_for(repo, measured):
+  # an object nothing touched since it was imported, the deepest lookup there is
+  head = repo.main[-1]
+  live = Division.objects.at_commit(head).order_by('pk')
+  division = live.filter(added_in=repo.main[0]).first() or live.first()
+  with measured():
+    head.version_for(division.eternal)
+
+
+def bench_commit(repo, measured):
+  commit = Commit.objects.create(parent_commit=repo.main[-1])
+  versions = list(Division.objects.at_commit(repo.main[-1]).order_by('pk')[:10])
+  commit.stage_changes({ v: { "name": f"{v.name} (benchmark)" } for v in versions })
+  with measured():
+    commit.commit()
+
+
+def bench_descendants(repo, measured):
+  with measured():
+    repo.main[0].descendants()
+
+
+def bench_ancestors(repo, measured):
+  with measured():
+    repo.main[-1].ancestors()
+
+
+def bench_diff(repo, measured):
+  head = repo.main[-1]
+  with measured():
+    parent = head.parent_commit
+    diffs = []
+    for version_cls in head.tracked_models.values():
+      added = list(getattr(head, head._add_attr_name_for_version_cls(version_cls)).all())
+      before = {
+        previous.eternal_id: previous
+        for previous in version_cls.objects.at_commit(parent).filter(eternal_id__in=[ v.eternal_id for v in added ])
+      }
+      for v in added:
+        previous = before.get(v.eternal_id)
+        if previous is None:
+          continue
+        for field in version_cls._content_fields():
+          if isinstance(field, _RealPointerField):
+            # pointer records are copied on write, a changed relation is a different record
+            diffs.append(getattr(v, field.attname) != getattr(previous, field.attname))
+          else:
+            diffs.append(Diff(field, v, v, previous, previous).diff())
+
+
+def bench_form(repo, measured):
+  from examples.views import DivisionVersionForm
+
+  division = Division.objects.at_commit(repo.main[-1]).order_by('pk').first()
+  with measured():
+    form = DivisionVersionForm({ "name": f"{division.name} (form)", "tags": [] }, instance=division)
+    form.is_valid()
+    form.save()
+
+
+BENCHMARKS = {
+  "version_sets": bench_version_sets,
+  "lazy_counts": bench_lazy_counts,
+  "version_for": bench_version_for,
+  "commit": bench_commit,
+  "descendants": bench_descendants,
+  "ancestors": bench_ancestors,
+  "diff": bench_diff,
+  "form": bench_form,
+}
+
+
+def _measure(bench, repo):
+  timings = []
+  queries = []
+
+  @contextlib.contextmanager
+  def measured():
+    # the query log is capped, with DEBUG on it fills up while generating
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as captured:
+      start = time.perf_counter()
+      yield
+      timings.append(time.perf_counter() - start)
+    queries.append(len(captured))
+
+  for _i in range(REPEAT):
+    bench(repo, measured)
+  return { "seconds": min(timings), "queries": max(queries) }
+
+
+def _describe(params):
+  return { k: ([ m.__name__ for m in v ] if k == "models" else v) for (k, v) in params.items() }
+
+
+def _load_history():
+  if not os.path.exists(HISTORY):
+    return []
+  with open(HISTORY) as f:
+    return json.load(f)
+
+
+def _baseline(history, profile, params):
+  for run in reversed(history):
+    if profile in run["profiles"] and run["profiles"][profile]["params"] == params:
+      return run["profiles"][profile]["results"]
+  return {}
+
+
+def _regressions(results, baseline, tolerance):
+  regressions = {}
+  for (name, result) in results.items():
+    before = baseline.get(name)
+    if before is None:
+      continue
+    if result["queries"] > before["queries"]:
+      regressions[name] = f"{before['queries']} -> {result['queries']} queries"
+    elif result["seconds"] > before["seconds"] * tolerance and result["seconds"] - before["seconds"] > NOISE:
+      regressions[name] = f"{before['seconds'] * 1000:.1f} -> {result['seconds'] * 1000:.1f} ms"
+  return regressions
+
+
+def _git_revision():
+  try:
+    return subprocess.check_output([ "git", "rev-parse", "--short", "HEAD" ], text=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def run(*args):
+  profiles = [ a for a in args if a in PROFILES ] or list(PROFILES)
+  save = "save" in args
+  tolerance = next(( float(a.split("=", 1)[1]) for a in args if a.startswith("tolerance=") ), 1.5)
+
+  history = _load_history()
+  run_record = { "at": timezone.now().isoformat(), "revision": _git_revision(), "profiles": {} }
+  failed = False
+
+  old_config = setup_databases(verbosity=0, interactive=False, aliases={ connection.alias })
+  try:
+    for profile in profiles:
+      params = _describe(PROFILES[profile])
+      start = time.perf_counter()
+      repo = generate(**PROFILES[profile])
+      print(f"{profile}: generated {len(repo.main)} main commits in {time.perf_counter() - start:.1f}s")
+
+      results = { name: _measure(bench, repo) for (name, bench) in BENCHMARKS.items() }
+      regressions = _regressions(results, _baseline(history, profile, params), tolerance)
+      for (name, result) in results.items():
+        print(f"  {name:14} {result['seconds'] * 1000:9.2f} ms {result['queries']:6} queries  {regressions.get(name, '')}")
+      failed = failed or bool(regressions)
+      run_record["profiles"][profile] = { "params": params, "results": results }
+
+      # every profile starts from an empty database
+      teardown_databases(old_config, verbosity=0)
+      old_config = setup_databases(verbosity=0, interactive=False, aliases={ connection.alias })
+  finally:
+    teardown_databases(old_config, verbosity=0)
+
+  if save:
+    with open(HISTORY, "w") as f:
+      json.dump(history + [ run_record ], f, indent=2)
+
+  return 1 if failed else 0
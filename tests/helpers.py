@@ -0,0 +1,27 @@
+"""
+  helpers shared by the test modules
+"""
+from examples.models import Commit
+
+
+def get_refreshed(model_inst):
+  # refresh_from_db() does not work properly on instance that are copied, it impacts copies/originals and populates false data
+  return model_inst.__class__.objects.get(pk=model_inst.pk)
+
+
+def edit(version, **attrs):
+  """ a saved copy of version with attrs changed """
+  new_version = version.clone()
+  for (k, v) in attrs.items():
+    setattr(new_version, k, v)
+  new_version.save()
+  return new_version
+
+
+def commit_with(parent, versions=(), removals=()):
+  """ a finalized child of parent adding versions and removing removals """
+  c = Commit.objects.create(parent_commit=parent and get_refreshed(parent))
+  c._add_versions(list(versions))
+  c._remove_objects(list(removals))
+  c.commit()
+  return get_refreshed(c)
@@ -0,0 +1,146 @@
+"""
+  synthetic repositories, for scale tests and benchmarks (see scripts/benchmark.py), e.g.
+
+    repo = generate(depth=200, width=50, branches=10, tags=20)
+
+  * width: objects per tracked model, imported by the first commits (one bulk_import per model)
+  * depth: commits on the main branch after those, each editing `edits` objects per model
+    and replacing `churn` objects of the last model (removing some, adding as many new ones)
+  * branches: side branches forking off evenly spaced main commits, `branch_depth` commits each
+  * tags: tags on evenly spaced main commits
+  * models: the tracked models that get objects, among Division, Team and Employee, in that order
+    (teams need divisions, employees need teams)
+  * pointer_targets: Tag rows that pointer fields pick `tags_per_object` of
+
+  the same arguments always generate the same rows
+"""
+import random
+import types
+
+from djangit.utils import bulk_create_with_pks
+from examples.models import Commit, Ref, Division, Team, Employee, Tag
+
+
+def _fields(model, i, rng, pointer_targets, tags_per_object, live):
+  fields = {
+    "name": f"{model.__name__.lower()} {i}",
+    "tags": rng.sample(pointer_targets, min(tags_per_object, len(pointer_targets))),
+  }
+  if model is Team:
+    fields["division_id"] = rng.choice(list(live[Division]))
+  if model is Employee:
+    fields["team_id"] = rng.choice(list(live[Team].values())).pk
+  return fields
+
+
+class _Generator:
+  def __init__(self, models, width, edits, churn, tags_per_object, pointer_targets, seed):
+    self.models = models
+    self.width = width
+    self.edits = edits
+    self.churn = churn
+    self.tags_per_object = tags_per_object
+    self.rng = random.Random(seed)
+    self.pointer_targets = [ t.pk for t in bulk_create_with_pks(Tag, [ Tag(name=f"tag {i}") for i in range(pointer_targets) ]) ]
+    self.created = { model: 0 for model in models }
+
+  def _new_fields(self, model, live):
+    self.created[model] += 1
+    return _fields(model, self.created[model], self.rng, self.pointer_targets, self.tags_per_object, live)
+
+  def initial(self):
+    """ one bulk-imported commit per model, returns (commits, { model : { eternal_id : version } }) """
+    commits = []
+    live = {}
+    parent = None
+    for model in self.models:
+      rows = [ self._new_fields(model, live) for _i in range(self.width) ]
+      parent = Commit.bulk_import({ model: rows }, parent_commit=parent, message=f"import {model.__name__}")
+      commits.append(parent)
+      live[model] = { v.eternal_id: v for v in model.objects.at_commit(parent) }
+    return (commits, live)
+
+  def step(self, parent, live, message):
+    """ a commit on top of parent, returns (commit, live state at that commit) """
+    live = { model: dict(versions) for (model, versions) in live.items() }
+    commit = Commit.objects.create(parent_commit=parent, message=message)
+
+    leaf = self.models[-1]
+    removed = self.rng.sample(list(live[leaf]), min(self.churn, len(live[leaf])))
+    for eternal_id in removed:
+      del live[leaf][eternal_id]
+    getattr(commit, commit._rm_attr_name_for_version_cls(leaf)).add(*removed)
+
+    # objects being removed aren't edited
+    changes = {}
+    for model in self.models:
+      for version in self.rng.sample(list(live[model].values()), min(self.edits, len(live[model]))):
+        changes[version] = { "name": f"{version.name}'" }
+    commit.stage_changes(changes)
+    added = []
+    for _i in range(len(removed)):
+      fields = self._new_fields(leaf, live)
+      tags = fields.pop("tags")
+      v = leaf.create_initial(**fields)
+      v.set_m2m('tags', tags)
+      added.append(v)
+    # unlike _add_versions, add() keeps the edits stage_changes added
+    getattr(commit, commit._add_attr_name_for_version_cls(leaf)).add(*added)
+    live[leaf].update({ v.eternal_id: v for v in added })
+
+    commit.commit()
+    # the versions commit() finalized, the instances above still lack their checksums
+    for model in self.models:
+      live[model].update({ v.eternal_id: v for v in getattr(commit, commit._add_attr_name_for_version_cls(model)).all() })
+    return (Commit.objects.get(pk=commit.pk), live)
+
+
+def generate(
+  depth=10,
+  width=10,
+  edits=2,
+  churn=1,
+  branches=0,
+  branch_depth=3,
+  tags=0,
+  models=(Division, Team, Employee),
+  pointer_targets=20,
+  tags_per_object=2,
+  seed=0,
+):
+  """
+    returns a namespace with
+    * main: main branch commits, root first
+    * branches: { name : branch commits, fork first }
+    * refs: the main Ref, then one per side branch, then the tags
+    * live: { model : { eternal_id : version } } at the head of main
+  """
+  models = [ m for m in (Division, Team, Employee) if m in models ]
+  generator = _Generator(models, width, edits, churn, tags_per_object, pointer_targets, seed)
+
+  (main, live) = generator.initial()
+  forks = [ (round(len(main) - 1 + (b + 1) * depth / (branches + 1)), f"branch-{b}") for b in range(branches) ]
+  states = { len(main) - 1: live }
+  for level in range(len(main), len(main) + depth):
+    (commit, live) = generator.step(main[-1], live, f"main {level}")
+    main.append(commit)
+    if any(fork == level for (fork, _name) in forks):
+      states[level] = live
+
+  side_branches = {}
+  for (level, name) in forks:
+    (head, branch_live) = (main[level], states[level])
+    commits = [ head ]
+    for i in range(branch_depth):
+      (head, branch_live) = generator.step(head, branch_live, f"{name} {i}")
+      commits.append(head)
+    side_branches[name] = commits
+
+  refs = [ Ref.create_branch("main", main[-1]) ]
+  refs += [ Ref.create_branch(name, commits[-1]) for (name, commits) in side_branches.items() ]
+  refs += [
+    Ref.create_tag(f"v{t}", main[round(t * (len(main) - 1) / max(tags - 1, 1))])
+    for t in range(tags)
+  ]
+
+  return types.SimpleNamespace(main=main, branches=side_branches, refs=refs, live=live)
@@ -0,0 +1,232 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from examples.models import Division, Team, Tag, Commit, Ref, ArchivedDivision, ArchivedTeam
+from djangit.archive import archive_versions
+from djangit.constraints import UniqueTogether, EternalExists
+from djangit.feed import change_feed
+from djangit.pack import commit_range, pack_records, load_records
+from djangit.references import referencing
+from djangit.rewrite import recompute_checksums, rebase, squash, redact, purge
+from djangit.utils import RewriteException, ArchivedHistoryException, hash_for_model_instance
+from tests.helpers import get_refreshed, commit_with
+
+
+class ArchiveTestCase(TestCase):
+  databases = { 'default', 'peer' }
+
+  def setUp(self):
+    tag = Tag.objects.create(name="tag")
+    Tag.objects.using('peer').create(pk=tag.pk, name="tag")
+    self.div1_v0 = Division.create_initial(name="division 1")
+    self.div1_v0.set_m2m('tags', [tag.id])
+    self.div2 = Division.create_initial(name="division 2")
+    self.c0 = commit_with(None, [self.div1_v0, self.div2])
+
+    self.div1_v1 = get_refreshed(self.div1_v0).clone()
+    self.div1_v1.name = "division one"
+    self.div1_v1.save()
+    self.c1 = commit_with(self.c0, [self.div1_v1], removals=[self.div2])
+
+    Commit.objects.filter(pk__in=[self.c0.pk, self.c1.pk]).update(
+      committed_at=timezone.now() - datetime.timedelta(days=100)
+    )
+    self.div3 = Division.create_initial(name="division 3")
+    self.c2 = commit_with(self.c1, [self.div3])
+
+  def archive(self):
+    archive_versions(Commit, before=timezone.now() - datetime.timedelta(days=30))
+    self.assertTrue(ArchivedDivision.objects.exists())
+
+  def test_archive(self):
+    live_at = { c: c.version_sets()[Division] for c in [self.c0, self.c1, self.c2] }
+
+    out = StringIO()
+    call_command('djangit_archive', 'examples.Commit', '--older-than-days', '30', stdout=out)
+    self.assertIn("examples.Division: 2 archived", out.getvalue().splitlines())
+
+    # only what recent commits can reach stays hot
+    self.assertEqual(set(Division.objects.all()), { self.div1_v1, self.div3 })
+    self.assertEqual(set(ArchivedDivision.objects.values_list('pk', flat=True)), { self.div1_v0.pk, self.div2.pk })
+
+    self.assertEqual(self.c2.version_sets()[Division], live_at[self.c2])
+    self.assertEqual(set(self.c2.version_sets(lazy=True)[Division]), set(live_at[self.c2].values()))
+
+    # old commits resolve through the archive
+    for c in [self.c0, self.c1]:
+      self.assertEqual(c.version_sets()[Division], live_at[c])
+    restored = self.c0.version_for(self.div2.eternal)
+    self.assertIsInstance(restored, Division)
+    self.assertEqual(restored.name, "division 2")
+    self.assertEqual(restored.checksum, live_at[self.c0][self.div2.eternal_id].checksum)
+    self.assertEqual(list(restored.tags.related.all()) if restored.tags else [], [])
+    self.assertEqual(list(self.c0.version_for(self.div1_v0.eternal).tags.related.values_list('name', flat=True)), ["tag"])
+
+  def test_lazy_querysets(self):
+    self.archive()
+    tag = Tag.objects.get()
+
+    # recent commits resolve in the hot table alone
+    self.assertEqual(set(Division.objects.at_commit(self.c2)), { self.div1_v1, self.div3 })
+    self.assertEqual(list(referencing(tag, at_commit=self.c2)[Division]), [ self.div1_v1 ])
+
+    # old ones would silently miss their archived versions
+    for live in [
+      Division.objects.at_commit(self.c0),
+      self.c0.version_sets(lazy=True)[Division],
+      referencing(tag, at_commit=self.c0)[Division],
+    ]:
+      with self.assertRaises(ArchivedHistoryException):
+        list(live)
+      with self.assertRaises(ArchivedHistoryException):
+        live.count()
+    self.assertEqual(list(Division.objects.hot_at_commit(self.c0)), [])
+
+    # branch object counts read both tables
+    self.assertEqual(Ref.create_branch("old", self.c0).counts, { "division": 2, "team": 0, "employee": 0 })
+
+  def test_constraints_on_archived_history(self):
+    team_a = Team.create_initial(name="team a", division=self.div1_v0.eternal)
+    team_b = Team.create_initial(name="team b", division=self.div2.eternal)
+    old = commit_with(self.c0, [team_a, team_b])
+    Commit.objects.filter(pk=old.pk).update(committed_at=timezone.now() - datetime.timedelta(days=100))
+    self.archive()
+    self.assertEqual(set(ArchivedTeam.objects.values_list('pk', flat=True)), { team_a.pk, team_b.pk })
+
+    # division 2 is only live in the archive
+    c = Commit.objects.create(parent_commit=old)
+    c._add_versions([ Team.create_initial(name="team c", division=self.div2.eternal) ])
+    self.assertEqual(c.constraint_violations(), [])
+
+    # clashing with an archived team
+    clash = Team.create_initial(name="team a", division=self.div1_v0.eternal)
+    c._add_versions([ clash ])
+    self.assertEqual([ (type(v.constraint), v.eternal_id) for v in c.constraint_violations() ], [
+      (UniqueTogether, clash.eternal_id),
+    ])
+
+    # removing a division an archived team points to
+    c = Commit.objects.create(parent_commit=old)
+    c._remove_objects([ self.div2.eternal ])
+    self.assertEqual([ (type(v.constraint), v.eternal_id) for v in c.constraint_violations() ], [
+      (EternalExists, team_b.eternal_id),
+    ])
+
+  def test_rewriting_archived_history(self):
+    checksums = dict(Commit.objects.values_list('pk', 'checksum'))
+    self.archive()
+
+    recompute_checksums(self.c0)
+    self.assertEqual(dict(Commit.objects.values_list('pk', 'checksum')), checksums)
+
+    with self.assertRaises(RewriteException):
+      squash(self.c0, self.c1)
+
+    # rebasing recent commits is fine, the merge resolves the old side through the archive
+    onto = commit_with(self.c1, [Division.create_initial(name="division 4")])
+    c2 = rebase(self.c2, onto)
+    self.assertEqual(c2.parent_commit, onto)
+    self.assertEqual(c2.checksum, c2._compute_hash())
+    self.assertEqual(
+      { v.name for v in c2.version_sets()[Division].values() },
+      { "division one", "division 3", "division 4" },
+    )
+    self.assertEqual(get_refreshed(self.c0).checksum, checksums[self.c0.pk])
+
+  def test_pack_archived_history(self):
+    live_at_c0 = self.c0.version_sets()[Division]
+    self.archive()
+
+    load_records(Commit, pack_records(commit_range(self.c2)), using='peer')
+    for c in [self.c0, self.c1, self.c2]:
+      self.assertEqual(Commit.objects.using('peer').get(pk=c.pk).checksum, c.checksum)
+    # the receiving side has no reason to archive them
+    self.assertEqual(
+      set(Division.objects.using('peer').at_commit(Commit.objects.using('peer').get(pk=self.c0.pk))),
+      set(live_at_c0.values()),
+    )
+
+  def test_history_readers(self):
+    self.archive()
+
+    added = [ (e["commit"], e["version_id"]) for e in change_feed(Commit) if e["op"] == "add" ]
+    self.assertEqual(added, [
+      (self.c0.pk, self.div1_v0.pk), (self.c0.pk, self.div2.pk), (self.c1.pk, self.div1_v1.pk), (self.c2.pk, self.div3.pk),
+    ])
+
+    (page, _cursor) = self.c2.log()
+    self.assertEqual([ c.change_counts["division"] for c in page ], [ (1, 0), (1, 1), (2, 0) ])
+
+    history = list(self.c2.relevant_history_with_respect_to(self.div2.eternal))
+    self.assertEqual([ (c, c.added_version_id, c.removed) for c in history ], [
+      (self.c1, None, True), (self.c0, self.div2.pk, False),
+    ])
+
+    blamed = self.c2.blame(self.div1_v0.eternal)
+    self.assertEqual(blamed["name"], self.c1)
+    self.assertEqual(blamed["tags"], self.c0)
+
+  def test_merging_archived_history(self):
+    stale = commit_with(self.c0, [Division.create_initial(name="division 4")])
+    Commit.objects.filter(pk=stale.pk).update(committed_at=timezone.now() - datetime.timedelta(days=100))
+    self.archive()
+
+    merge = self.c2.three_way_merge(get_refreshed(stale))
+    self.assertTrue(merge.is_clean)
+    self.assertEqual([ v.name for v in merge.versions ], [ "division 4" ])
+
+    # adopting an archived version brings it back to the hot table
+    working = Commit.objects.create(parent_commit=self.c2)
+    merge.apply(working)
+    working.commit()
+    self.assertEqual(
+      { v.name for v in get_refreshed(working).version_sets()[Division].values() },
+      { "division one", "division 3", "division 4" },
+    )
+    self.assertFalse(ArchivedDivision.objects.filter(pk=merge.versions[0].pk).exists())
+    self.assertEqual(get_refreshed(stale).checksum, stale.checksum)
+
+  def assertChecksumsStable(self):
+    checksums = dict(Commit.objects.values_list('pk', 'checksum'))
+    recompute_checksums(self.c0)
+    self.assertEqual(dict(Commit.objects.values_list('pk', 'checksum')), checksums)
+
+  def test_redact_archived(self):
+    self.archive()
+    checksums = dict(Commit.objects.values_list('pk', 'checksum'))
+
+    [redacted] = redact(Commit, [self.c0.version_for(self.div2.eternal)], name="[redacted]")
+    archived = ArchivedDivision.objects.get(pk=self.div2.pk)
+    self.assertEqual(archived.name, "[redacted]")
+    redacted.checksum = None
+    self.assertEqual(archived.checksum, hash_for_model_instance(redacted))
+    self.assertEqual(get_refreshed(self.c0).version_for(self.div2.eternal).name, "[redacted]")
+
+    for c in [self.c0, self.c1, self.c2]:
+      self.assertNotEqual(get_refreshed(c).checksum, checksums[c.pk])
+    self.assertChecksumsStable()
+
+  def test_purge_archived(self):
+    self.archive()
+    pointer = self.c0.version_for(self.div1_v0.eternal).tags
+
+    purge(Commit, pointers=[pointer])
+    self.assertIsNone(ArchivedDivision.objects.get(pk=self.div1_v0.pk).tags)
+    self.assertFalse(pointer.__class__.objects.filter(pk=pointer.pk).exists())
+
+    purge(Commit, versions=[self.c0.version_for(self.div2.eternal)])
+    self.assertFalse(ArchivedDivision.objects.filter(pk=self.div2.pk).exists())
+    self.assertEqual(list(get_refreshed(self.c0).version_sets()[Division]), [ self.div1_v0.eternal_id ])
+    self.assertChecksumsStable()
+
+  def test_commit_page(self):
+    self.archive()
+    response = self.client.get(reverse("view-commit", args=(self.c0.pk,)))
+    self.assertContains(response, "division 1")
+    self.assertContains(response, "division 2")
+    self.assertContains(response, "tag")
@@ -0,0 +1,62 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+
+from examples.models import Division, Commit
+from tests.helpers import get_refreshed
+
+
+class AsyncTestCase(TestCase):
+
+  def setUp(self):
+    self.div1 = Division.create_initial(name="division1")
+    self.div2 = Division.create_initial(name="division2")
+    self.c0 = Commit.objects.create()
+    self.c0._add_versions([self.div1, self.div2])
+    self.c0.commit()
+
+    self.div1_v1 = self.div1.clone()
+    self.div1_v1.name = "division one"
+    self.div1_v1.save()
+    self.c1 = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    self.c1._add_versions([self.div1_v1])
+    self.c1._remove_objects([self.div2])
+
+  async def test_acommit(self):
+    await self.c1.acommit()
+    c1 = await sync_to_async(get_refreshed)(self.c1)
+    self.assertIsNotNone(c1.checksum)
+    self.assertEqual(c1.checksum, await sync_to_async(c1._compute_hash)())
+
+  async def test_aversion_sets(self):
+    await self.c1.acommit()
+    self.assertEqual(
+      await self.c1.aversion_sets(),
+      await sync_to_async(self.c1.version_sets)(),
+    )
+    self.assertEqual(
+      (await self.c0.aversion_sets())[Division],
+      { self.div1.eternal_id: self.div1, self.div2.eternal_id: self.div2 },
+    )
+
+    # concurrent reads of different commits
+    (sets0, sets1) = await asyncio.gather(self.c0.aversion_sets(), self.c1.aversion_sets())
+    self.assertEqual(set(sets0[Division].values()), { self.div1, self.div2 })
+    self.assertEqual(set(sets1[Division].values()), { self.div1_v1 })
+
+  async def test_aversions_for(self):
+    await self.c1.acommit()
+    self.assertEqual(await self.c0.aversions_for(self.div1.eternal), self.div1)
+    self.assertEqual(await self.c1.aversions_for(self.div1.eternal), self.div1_v1)
+    self.assertIsNone(await self.c1.aversions_for(self.div2.eternal))
+
+  async def test_aiterator(self):
+    lazy_sets = await self.c0.aversion_sets(lazy=True)
+    streamed = [ v async for v in lazy_sets[Division].order_by('pk').aiterator(chunk_size=1) ]
+    self.assertEqual(streamed, [ self.div1, self.div2 ])
+
+    self.assertEqual(
+      [ v async for v in Division.objects.at_commit(self.c1).filter(name="division one") ],
+      [ self.div1_v1 ],
+    )
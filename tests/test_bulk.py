@@ -0,0 +1,166 @@
+import copy
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from examples.models import Division, Team, Tag, Commit
+from djangit.utils import hash_for_model_instance, hash_for_string
+
+
+class BulkImportTestCase(TestCase):
+
+  def test_bulk_import(self):
+    t1 = Tag.objects.create(name="category 1")
+    t2 = Tag.objects.create(name="category 2")
+
+    c0 = Commit.bulk_import({
+      Division: (
+        { "name": f"division {i}", "tags": ([t2.id, t1.id] if i % 2 else []) }
+        for i in range(5)
+      ),
+    }, batch_size=2, message="initial import")
+
+    self.assertTrue(c0.checksum)
+    self.assertEqual(c0.message, "initial import")
+
+    divisions = c0.version_sets()[Division]
+    self.assertEqual(len(divisions), 5)
+    for d in divisions.values():
+      # same checksum finalize_version() would have produced
+      unfinalized = copy.copy(d)
+      unfinalized.checksum = None
+      self.assertEqual(d.checksum, hash_for_model_instance(unfinalized))
+      if d.tags:
+        self.assertEqual(set(d.tags.related.all()), set([t1, t2]))
+        self.assertEqual(d.tags.checksum, hash_for_string(str([t1.id, t2.id])))
+      else:
+        self.assertTrue(int(d.name[-1]) % 2 == 0)
+
+    # follow-up imports can reference the eternals created above
+    division_eternal_id = next(iter(divisions))
+    c1 = Commit.bulk_import(
+      [ (Team, [{ "name": "team", "division_id": division_eternal_id }]) ],
+      parent_commit=c0,
+    )
+    self.assertEqual(c1.parent_commit, c0)
+    self.assertEqual(len(c1.version_sets()[Division]), 5)
+    [team] = c1.version_sets()[Team].values()
+    self.assertEqual(team.division_id, division_eternal_id)
+    self.assertIsNone(team.tags)
+
+
+class StageChangesTestCase(TestCase):
+
+  def test_stage_changes(self):
+    t1 = Tag.objects.create(name="category 1")
+    t2 = Tag.objects.create(name="category 2")
+
+    c0 = Commit.objects.create()
+    finalized = Division.create_initial(name="finalized")
+    finalized.set_m2m('tags', [t1.id])
+    c0._add_versions([finalized])
+    c0.commit()
+    finalized = Division.objects.get(pk=finalized.pk)
+
+    working = Commit.objects.create(parent_commit=c0)
+    draft = Division.create_initial(name="draft")
+    draft.set_m2m('tags', [t1.id])
+    draft_pointer = draft.tags
+    untouched_tags = Division.create_initial(name="untouched tags")
+
+    with CaptureQueriesContext(connection) as staging:
+      results = working.stage_changes({
+        finalized: { "name": "finalized, edited", "tags": [t1.id, t2.id] },
+        draft: { "name": "draft, edited", "tags": [t2.id] },
+        untouched_tags: { "name": "renamed" },
+      })
+    # a fixed number of queries per version class, see tests/test_query_budgets.py for how that holds with size
+    self.assertLessEqual(len(staging), 12)
+
+    # finalized versions are copied on write
+    new_version = results[finalized]
+    self.assertNotEqual(new_version.pk, finalized.pk)
+    self.assertEqual(new_version.eternal_id, finalized.eternal_id)
+    self.assertEqual(Division.objects.get(pk=finalized.pk).name, "finalized")
+    self.assertEqual(set(new_version.tags.related.all()), set([t1, t2]))
+    self.assertNotEqual(new_version.tags.pk, finalized.tags_id)
+
+    # drafts are edited in place, as are their unfinalized pointer records
+    self.assertEqual(results[draft].pk, draft.pk)
+    refreshed_draft = Division.objects.get(pk=draft.pk)
+    self.assertEqual(refreshed_draft.name, "draft, edited")
+    self.assertEqual(refreshed_draft.tags_id, draft_pointer.pk)
+    self.assertEqual(list(refreshed_draft.tags.related.all()), [t2])
+
+    working.commit()
+    self.assertEqual(
+      { v.pk for v in working.version_sets()[Division].values() },
+      { new_version.pk, draft.pk, untouched_tags.pk }
+    )
+    self.assertEqual(Division.objects.get(pk=untouched_tags.pk).name, "renamed")
+
+  def test_shared_draft_pointers(self):
+    t1 = Tag.objects.create(name="category 1")
+    t2 = Tag.objects.create(name="category 2")
+    working = Commit.objects.create()
+    draft = Division.create_initial(name="draft")
+    draft.set_m2m('tags', [t1.id])
+    # the copy shares the draft's unfinalized pointer record
+    copy_of_draft = draft.clone()
+    copy_of_draft.save()
+    bystander = draft.clone()
+    bystander.save()
+
+    results = working.stage_changes({
+      draft: { "tags": [t2.id] },
+      copy_of_draft: { "tags": [t1.id, t2.id] },
+    })
+
+    self.assertEqual(list(Division.objects.get(pk=draft.pk).tags.related.all()), [t2])
+    self.assertEqual(set(Division.objects.get(pk=copy_of_draft.pk).tags.related.all()), { t1, t2 })
+    self.assertEqual(list(Division.objects.get(pk=bystander.pk).tags.related.all()), [t1])
+    self.assertIs(results[draft], draft)
+
+
+class StageTestCase(TestCase):
+
+  def test_stage(self):
+    c0 = Commit.objects.create()
+    div1 = Division.create_initial(name="division 1")
+    div2 = Division.create_initial(name="division 2")
+    c0._add_versions([div1, div2])
+    c0.commit()
+
+    working = Commit.objects.create(parent_commit=c0)
+    div1_v1 = div1.clone()
+    div1_v1.name = "division one"
+    div1_v1.save()
+    div3 = Division.create_initial(name="division 3")
+    working._add_versions([div1_v1, div3])
+    working._remove_objects([div2])
+
+    staged = working.stage(versions=[div1_v1], removals=[div2.eternal], message="staged")
+
+    self.assertTrue(staged.checksum)
+    self.assertEqual(staged.message, "staged")
+    self.assertEqual(staged.parent_commit, c0)
+    self.assertEqual(staged._versions_added_for_class(Division), [div1_v1])
+    self.assertEqual(list(staged.removes_division.all()), [div2.eternal])
+    self.assertTrue(Division.objects.get(pk=div1_v1.pk).checksum)
+
+    working = Commit.objects.get(pk=working.pk)
+    self.assertEqual(working.parent_commit, staged)
+    self.assertEqual(working.ancestors(), [staged, c0])
+    self.assertEqual(working._versions_added_for_class(Division), [div3])
+    self.assertEqual(list(working.removes_division.all()), [])
+    self.assertEqual(c0.descendants(), [staged, working])
+
+    self.assertEqual(
+      set(working.version_sets()[Division].values()),
+      set([div1_v1, div3])
+    )
+    self.assertEqual(
+      set(Commit.objects.get(pk=staged.pk).version_sets()[Division].values()),
+      set([div1_v1])
+    )
@@ -0,0 +1,168 @@
+import time
+import logging
+import threading
+
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase
+
+from examples.models import Division, Commit, Ref
+from djangit.utils import LockedInformationException, StaleHeadException
+from tests.helpers import get_refreshed
+
+
+logger = logging.getLogger(__name__)
+
+
+def add_division(name, attempts=None):
+  def stage(commit):
+    if attempts is not None:
+      attempts.append(name)
+    commit._add_versions([ Division.create_initial(name=name) ])
+  return stage
+
+
+class CompareAndSwapTestCase(TestCase):
+
+  def setUp(self):
+    self.c0 = Commit.objects.create()
+    self.c0._add_versions([ Division.create_initial(name="division1") ])
+    self.c0.commit()
+    self.main = Ref.create_branch("main", self.c0)
+
+  def test_compare_and_swap(self):
+    c1 = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    c1.commit()
+    c2 = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    c2.commit()
+
+    stale = get_refreshed(self.main)
+    self.main.compare_and_swap(self.c0, c1)
+    self.assertEqual(get_refreshed(self.main).head, c1)
+
+    # the other writer read the head before it moved
+    with self.assertRaises(StaleHeadException):
+      stale.compare_and_swap(self.c0, c2)
+    self.assertEqual(stale.head, c1)
+    self.assertEqual(get_refreshed(self.main).head, c1)
+
+    with self.assertRaises(StaleHeadException):
+      self.main.compare_and_swap(self.c0, c2)
+
+    tag = Ref.create_tag("v1", c1)
+    with self.assertRaises(LockedInformationException):
+      tag.compare_and_swap(c1, c2)
+
+  def test_commit_is_append_only(self):
+    c1 = Commit.objects.create(parent_commit=get_refreshed(self.c0), message="first")
+    stale = get_refreshed(c1)
+    c1.commit()
+    with self.assertRaises(LockedInformationException):
+      stale.commit()
+
+    # a sibling inserted after c1 was loaded shifts the tree, finalizing c1 must not write its stale coordinates back
+    c2 = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    c2_stale = get_refreshed(c2)
+    Commit.objects.create(parent_commit=get_refreshed(c2))
+    c2_stale.commit()
+    c2 = get_refreshed(c2)
+    self.assertEqual(c2.checksum, c2_stale.checksum)
+    self.assertEqual(c2.get_descendant_count(), 1)
+
+  def test_commit_sends_post_save(self):
+    saved = []
+    def receiver(sender, instance, update_fields, **kwargs):
+      saved.append((sender, instance.pk, instance.checksum is not None, 'checksum' in update_fields))
+    c1 = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    division = Division.create_initial(name="division2")
+    c1._add_versions([ division ])
+
+    post_save.connect(receiver, sender=Commit)
+    post_save.connect(receiver, sender=Division)
+    try:
+      c1.commit()
+    finally:
+      post_save.disconnect(receiver, sender=Commit)
+      post_save.disconnect(receiver, sender=Division)
+    self.assertEqual(saved, [ (Division, division.pk, True, True), (Commit, c1.pk, True, True) ])
+
+  def test_commit_child(self):
+    c1 = self.main.commit_child(add_division("division2"), message="add division2")
+    main = get_refreshed(self.main)
+    self.assertEqual(main.head, c1)
+    self.assertEqual(main.counts["division"], 2)
+    self.assertEqual(get_refreshed(c1).message, "add division2")
+
+
+class ConcurrentCommitsTestCase(TransactionTestCase):
+  """ writers racing to advance the same branch """
+
+  commits_per_writer = 4
+
+  def _race(self, main, writers):
+    """ returns the commits each writer got back, the number of attempts they took, and the commit rate """
+    errors = []
+    committed = []
+    attempts = []
+
+    def write(writer):
+      try:
+        for i in range(self.commits_per_writer):
+          committed.append(main.commit_child(add_division(f"writer {writer} commit {i}", attempts), attempts=50, backoff=0.002))
+      except Exception as e:
+        errors.append(e)
+      finally:
+        connection.close()
+
+    threads = [ threading.Thread(target=write, args=(writer,)) for writer in range(writers) ]
+    start = time.perf_counter()
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    elapsed = time.perf_counter() - start
+    self.assertEqual(errors, [])
+    return (committed, len(attempts), writers * self.commits_per_writer / elapsed)
+
+  def test_stress(self):
+    c0 = Commit.objects.create()
+    c0.commit()
+    main = Ref.create_branch("main", c0)
+
+    expected_depth = 0
+    expected_names = []
+    rates = {}
+    for writers in (1, 2, 4):
+      (committed, attempts, rate) = self._race(main, writers)
+      logger.info("%d writer(s): %.1f commits/s, %d attempts", writers, rate, attempts)
+      rates[writers] = rate
+      expected_depth += writers * self.commits_per_writer
+      expected_names += [ f"writer {w} commit {i}" for w in range(writers) for i in range(self.commits_per_writer) ]
+
+      # no commit was lost or duplicated: each one a writer got back is on the branch, adding its own division once
+      main = get_refreshed(main)
+      chain = main.head.get_ancestors(include_self=True)
+      self.assertEqual(len({ c.pk for c in committed }), writers * self.commits_per_writer)
+      self.assertTrue({ c.pk for c in committed } <= { c.pk for c in chain })
+      self.assertEqual(
+        sorted(Division.objects.at_commit(main.head).values_list('name', flat=True)),
+        sorted(expected_names),
+      )
+
+      # every commit landed, one after the other, on a single linear branch
+      self.assertEqual(main.depth, expected_depth)
+      self.assertEqual(main.counts["division"], expected_depth)
+      self.assertEqual(Division.objects.at_commit(main.head).count(), expected_depth)
+      self.assertEqual(Commit.objects.count(), expected_depth + 1)
+      self.assertFalse(Commit.objects.filter(checksum__isnull=True).exists())
+      for commit in main.head.get_ancestors(include_self=True):
+        self.assertLessEqual(commit.get_children().count(), 1)
+        self.assertEqual(commit.checksum, commit._compute_hash())
+
+      # a writer only retries after another one advanced the branch, so each commit costs at most one attempt per writer
+      self.assertLessEqual(attempts, writers * self.commits_per_writer * writers)
+
+    # insertions into the tree are serialized, so adding writers can't raise the commit rate,
+    # but contention (lock waits, retries, backoff) must not collapse it either
+    self.assertGreaterEqual(rates[4], rates[1] / 4)
+    self.assertGreaterEqual(rates[2], rates[1] / 2)
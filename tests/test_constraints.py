@@ -0,0 +1,57 @@
+from django.test import TestCase
+
+from examples.models import Division, Team, Commit
+from djangit.constraints import VersionedConstraint, UniqueTogether, EternalExists
+from djangit.utils import ConstraintViolationException
+from tests.helpers import get_refreshed
+
+
+class ConstraintTestCase(TestCase):
+
+  def setUp(self):
+    self.division = Division.create_initial(name="division")
+    self.team = Team.create_initial(name="team", division=self.division.eternal)
+    self.c0 = Commit.objects.create()
+    self.c0._add_versions([self.division, self.team])
+    self.c0.commit()
+
+  def test_unique_together(self):
+    c1 = Commit.objects.create(parent_commit=self.c0)
+    duplicate = Team.create_initial(name="team", division=self.division.eternal)
+    c1._add_versions([duplicate, Team.create_initial(name="other team", division=self.division.eternal)])
+
+    with self.assertRaises(ConstraintViolationException) as cm:
+      c1.commit()
+    [violation] = cm.exception.violations
+    self.assertIsInstance(violation.constraint, UniqueTogether)
+    self.assertEqual(violation.eternal_id, duplicate.eternal_id)
+    self.assertIsNone(get_refreshed(c1).checksum)
+
+    # replacing the clashing object in the same commit is fine
+    c1._remove_objects([self.team])
+    c1.commit()
+    self.assertTrue(get_refreshed(c1).checksum)
+
+  def test_eternal_exists(self):
+    c1 = Commit.objects.create(parent_commit=self.c0)
+    c1._remove_objects([self.division])
+    with self.assertRaises(ConstraintViolationException) as cm:
+      c1.commit()
+    [violation] = cm.exception.violations
+    self.assertIsInstance(violation.constraint, EternalExists)
+    self.assertEqual(violation.eternal_id, self.team.eternal_id)
+
+    unknown_division = Division.create_initial(name="never committed")
+    c2 = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    c2._add_versions([Team.create_initial(name="orphan", division=unknown_division.eternal)])
+    self.assertEqual(len(c2.constraint_violations()), 1)
+
+    c2._add_versions([unknown_division])
+    self.assertEqual(c2.constraint_violations(), [])
+
+  def test_constraints_implement_violations(self):
+    class Incomplete(VersionedConstraint):
+      pass
+
+    with self.assertRaises(TypeError):
+      Incomplete()
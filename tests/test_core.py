@@ -1,16 +1,13 @@
-from unittest import skip
+from unittest import skip, mock
 
 from django.test import TestCase
 
 
 from .create_data import create_data
 from examples.models import Division, Team, Tag, Employee, Commit
+from djangit.models.commit import VersionedModel
 from djangit.utils import LockedInformationException
-
-
-def get_refreshed(model_inst):
-  # refresh_from_db() does not work properly on instance that are copied, it impacts copies/originals and populates false data
-  return model_inst.__class__.objects.get(pk=model_inst.pk)
+from .helpers import get_refreshed
 
 
 class BasicTestCase(TestCase):
@@ -268,3 +265,62 @@ class BasicTestCase(TestCase):
         div2.eternal_id : div2, 
       }
     )
+
+
+class FinalizeOverrideTestCase(TestCase):
+
+  def test_overrides_are_honoured(self):
+    tag = Tag.objects.create(name="tag")
+    div = Division.create_initial(name="division")
+    div.set_m2m('tags', [tag.id])
+    c0 = Commit.objects.create()
+    c0._add_versions([div])
+
+    finalized = []
+    def finalize_version(version):
+      finalized.append(version.pk)
+      version.name = version.name.upper()
+      VersionedModel.finalize_version(version)
+
+    pointer_cls = div.tags.__class__
+    with mock.patch.object(Division, 'finalize_version', finalize_version), \
+        mock.patch.object(pointer_cls, 'finalize', autospec=True, side_effect=pointer_cls.finalize) as finalize:
+      c0.commit()
+
+    self.assertEqual(finalized, [div.pk])
+    self.assertEqual(finalize.call_count, 1)
+    div = get_refreshed(div)
+    self.assertEqual(div.name, "DIVISION")
+    self.assertTrue(div.checksum)
+    self.assertTrue(div.tags.checksum)
+
+
+class OtherDatabaseTestCase(TestCase):
+  databases = { 'default', 'peer' }
+
+  def create_on(self, using, name, tag):
+    pointer = Division._meta.get_field('tags').related_model.objects.using(using).create()
+    pointer.related.add(tag)
+    eternal = Division._eternal_cls.objects.using(using).create()
+    return Division.objects.using(using).create(eternal=eternal, name=name, tags=pointer)
+
+  def test_commit_on_another_database(self):
+    # both databases number their rows from 1, so ids collide
+    default_division = self.create_on('default', "default", Tag.objects.create(name="tag"))
+    c0 = Commit.objects.create()
+    c0._add_versions([default_division])
+    c0.commit()
+    default_division = get_refreshed(default_division)
+
+    peer_division = self.create_on('peer', "peer", Tag.objects.using('peer').create(name="tag"))
+    self.assertEqual(peer_division.pk, default_division.pk)
+    peer_c0 = Commit.objects.using('peer').create()
+    peer_c0._add_versions([peer_division])
+    peer_c0.commit()
+
+    peer_division = Division.objects.using('peer').get(pk=peer_division.pk)
+    self.assertTrue(peer_division.checksum)
+    self.assertTrue(peer_division.tags.checksum)
+    self.assertEqual(Commit.objects.using('peer').get(pk=peer_c0.pk).checksum, peer_c0._compute_hash())
+    self.assertEqual(get_refreshed(default_division).checksum, default_division.checksum)
+    self.assertEqual(get_refreshed(default_division).tags.checksum, default_division.tags.checksum)
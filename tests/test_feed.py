@@ -0,0 +1,125 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from examples.models import Division, Tag, Commit
+from djangit.feed import change_feed
+from djangit.rewrite import redact
+from tests.helpers import get_refreshed
+
+
+class ChangeFeedTestCase(TestCase):
+
+  def setUp(self):
+    self.tag = Tag.objects.create(name="tag")
+    self.div1 = Division.create_initial(name="division1")
+    self.div1.set_m2m('tags', [self.tag.id])
+    self.div2 = Division.create_initial(name="division2")
+    self.c0 = Commit.objects.create()
+    self.c0._add_versions([self.div1, self.div2])
+    self.c0.commit()
+
+    self.c1 = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    self.c1._remove_objects([self.div2])
+    self.c1.commit()
+
+    # never finalized, stays out of the feed
+    Commit.objects.create(parent_commit=get_refreshed(self.c1))
+
+  def test_change_feed(self):
+    events = list(change_feed(Commit, chunk_size=1))
+    self.assertEqual(
+      [ (e["op"], e["commit"], e.get("eternal_id")) for e in events ],
+      [
+        ("add", self.c0.pk, self.div1.eternal_id),
+        ("add", self.c0.pk, self.div2.eternal_id),
+        ("commit", self.c0.pk, None),
+        ("remove", self.c1.pk, self.div2.eternal_id),
+        ("commit", self.c1.pk, None),
+      ]
+    )
+    self.assertEqual(events[0]["fields"], { "name": "division1", "tags": [self.tag.id] })
+    self.assertEqual(events[1]["fields"], { "name": "division2", "tags": [] })
+
+    # resuming from a commit event's position only emits later commits
+    self.assertEqual([ e["position"] for e in events if e["op"] == "commit" ], [ 1, 2 ])
+    self.assertEqual(list(change_feed(Commit, cursor=events[2]["position"])), events[3:])
+    self.assertEqual(list(change_feed(Commit, cursor=events[4]["position"])), [])
+
+  def test_cursors(self):
+    c1 = get_refreshed(self.c1)
+    after_c0 = list(change_feed(Commit, cursor=get_refreshed(self.c0).feed_position))
+    self.assertEqual([ (e["op"], e["commit"]) for e in after_c0 ], [ ("remove", c1.pk), ("commit", c1.pk) ])
+
+    # checksums and commit ids resolve to the commit's position
+    self.assertEqual(list(change_feed(Commit, cursor=self.c0.checksum)), after_c0)
+    self.assertEqual(list(change_feed(Commit, cursor=get_refreshed(self.c0))), after_c0)
+    self.assertEqual(list(change_feed(Commit, after_commit=self.c0.pk)), after_c0)
+    self.assertEqual(list(change_feed(Commit, after_commit=self.c0.checksum)), after_c0)
+    self.assertEqual(list(change_feed(Commit, cursor=str(c1.feed_position))), [])
+
+    # the position of a rewritten commit stays a valid cursor
+    redact(Commit, [self.div1], name="[redacted]")
+    self.assertEqual(
+      [ (e["op"], e["commit"]) for e in change_feed(Commit, cursor=c1.feed_position) if e["op"] == "commit" ],
+      [ ("commit", self.c0.pk), ("commit", self.c1.pk) ],
+    )
+
+    unfinalized = Commit.objects.filter(checksum__isnull=True).get()
+    for kwargs in ({ "cursor": "not-a-checksum" }, { "cursor": 1000 }, { "after_commit": unfinalized.pk }, { "cursor": unfinalized }):
+      with self.assertRaises(Commit.DoesNotExist):
+        change_feed(Commit, **kwargs)
+
+  def test_reading_does_not_write(self):
+    self.assertEqual([ get_refreshed(c).feed_position for c in (self.c0, self.c1) ], [ 1, 2 ])
+    with self.assertNumQueries(0):
+      change_feed(Commit)
+    # resolving a cursor and streaming only select, so the feed can read from a replica
+    with CaptureQueriesContext(connection) as queries:
+      list(change_feed(Commit, cursor=self.c0.checksum))
+    self.assertFalse([ q["sql"] for q in queries if not q["sql"].startswith("SELECT") ])
+
+  def test_slow_commits_are_not_skipped(self):
+    # a commit stamped before c1 whose transaction only ends after a consumer read c1
+    slow = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    self.assertEqual([ e["commit"] for e in change_feed(Commit) if e["op"] == "commit" ], [ self.c0.pk, self.c1.pk ])
+    cursor = get_refreshed(self.c1).feed_position
+
+    slow._add_versions([ Division.create_initial(name="division3") ])
+    slow.commit()
+    Commit.objects.filter(pk=slow.pk).update(committed_at=get_refreshed(self.c0).committed_at)
+
+    self.assertEqual(
+      [ (e["op"], e["commit"]) for e in change_feed(Commit, cursor=cursor) ],
+      [ ("add", slow.pk), ("commit", slow.pk) ],
+    )
+
+  def test_rewritten_commits_are_emitted_again(self):
+    cursor = [ e for e in change_feed(Commit) if e["op"] == "commit" ][-1]["position"]
+    redact(Commit, [self.div1], name="[redacted]")
+
+    events = list(change_feed(Commit, cursor=cursor))
+    self.assertEqual([ (e["op"], e["commit"]) for e in events if e["op"] == "commit" ], [
+      ("commit", self.c0.pk), ("commit", self.c1.pk),
+    ])
+    self.assertEqual(events[0]["fields"]["name"], "[redacted]")
+    self.assertEqual(events[-1]["checksum"], get_refreshed(self.c1).checksum)
+
+  def test_command(self):
+    for cursor in (
+      ('--cursor', str(get_refreshed(self.c0).feed_position)),
+      ('--cursor', self.c0.checksum),
+      ('--after-commit', str(self.c0.pk)),
+    ):
+      out = StringIO()
+      call_command('djangit_feed', 'examples.Commit', *cursor, stdout=out)
+      lines = [ json.loads(l) for l in out.getvalue().splitlines() ]
+      self.assertEqual([ l["op"] for l in lines ], ["remove", "commit"])
+      self.assertEqual(lines[-1]["checksum"], get_refreshed(self.c1).checksum)
+
+    with self.assertRaisesMessage(CommandError, "No finalized commit matches cursor deadbeef"):
+      call_command('djangit_feed', 'examples.Commit', '--cursor', 'deadbeef', stdout=StringIO())
@@ -0,0 +1,68 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from examples.models import Division, Team, Employee, Tag, Commit
+from djangit.gc import collect_garbage
+from tests.helpers import get_refreshed
+
+
+class GarbageCollectionTestCase(TestCase):
+
+  def setUp(self):
+    tag = Tag.objects.create(name="tag")
+    self.division = Division.create_initial(name="division")
+    self.division.set_m2m('tags', [tag.id])
+    self.c0 = Commit.objects.create()
+    self.c0._add_versions([self.division])
+    self.c0.commit()
+
+    # a copy-on-write edit that was abandoned, with its own pointer record
+    self.abandoned = get_refreshed(self.division).clone()
+    self.abandoned.save()
+    self.abandoned.set_m2m('tags', [])
+    self.abandoned.set_m2m('tags', [tag.id])
+    # never committed: an orphan team, and an employee version that references it
+    self.team = Team.create_initial(name="team", division=self.division.eternal)
+    self.employee = Employee.create_initial(name="employee", team=self.team)
+
+    # staged in a working commit, so reachable
+    self.staged = Division.create_initial(name="staged")
+    self.working = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    self.working._add_versions([self.staged])
+
+  def age_everything(self):
+    an_hour_ago = timezone.now() - datetime.timedelta(hours=1)
+    for model in [ Division, Team, Employee, Division._eternal_cls, Team._eternal_cls, Employee._eternal_cls, self.division.tags.__class__ ]:
+      model._base_manager.update(created_at=an_hour_ago)
+
+  def test_grace_period(self):
+    counts = collect_garbage(Commit, grace=datetime.timedelta(minutes=30))
+    self.assertEqual(sum(counts.values()), 0)
+    self.assertTrue(Division.objects.filter(pk=self.abandoned.pk).exists())
+
+  def test_collect_garbage(self):
+    self.age_everything()
+
+    dry_run = collect_garbage(Commit, grace=datetime.timedelta(minutes=30), dry_run=True)
+    self.assertEqual(dry_run['examples.Division'], 1)
+    self.assertEqual(Division.objects.count(), 3)
+
+    out = StringIO()
+    call_command('djangit_gc', 'examples.Commit', '--grace-hours', '0.5', '--batch-size', '1', stdout=out)
+    lines = out.getvalue().splitlines()
+    self.assertIn("examples.Division: 1 reclaimed", lines)
+    self.assertIn("examples.Team: 1 reclaimed", lines)
+    self.assertIn("examples.Employee: 1 reclaimed", lines)
+    self.assertIn("examples.EternalTeam: 1 reclaimed", lines)
+    self.assertIn("examples.EternalEmployee: 1 reclaimed", lines)
+    # the abandoned pointer record; the committed one stays, and so does the staged version's eternal
+    self.assertIn("examples.Tag_ManyToManyPointer: 1 reclaimed", lines)
+    self.assertIn("examples.EternalDivision: 0 reclaimed", lines)
+
+    self.assertEqual(set(Division.objects.all()), { self.division, self.staged })
+    self.assertFalse(Team.objects.exists())
+    self.assertEqual(get_refreshed(self.division).tags.related.count(), 1)
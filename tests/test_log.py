@@ -0,0 +1,160 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from examples.models import Division, Commit
+from tests.helpers import get_refreshed
+
+
+class CommitLogTestCase(TestCase):
+
+  def setUp(self):
+    self.commits = []
+    parent = None
+    for i in range(5):
+      c = Commit.objects.create(parent_commit=parent, message=f"commit {i}")
+      c._add_versions([ Division.create_initial(name=f"division {i}.{j}") for j in range(i) ])
+      if parent:
+        c._remove_objects(parent._versions_added_for_class(Division)[:1])
+      c.commit()
+      parent = get_refreshed(c)
+      self.commits.append(parent)
+
+  def test_log(self):
+    head = self.commits[-1]
+
+    with self.assertNumQueries(1):
+      (page, cursor) = head.log(page_size=2)
+    self.assertEqual(page, [self.commits[4], self.commits[3]])
+    self.assertEqual(page[0].change_counts["division"], (4, 1))
+    self.assertEqual(page[0].change_counts["team"], (0, 0))
+
+    (page, cursor) = head.log(before_level=cursor, page_size=2)
+    self.assertEqual(page, [self.commits[2], self.commits[1]])
+    self.assertEqual(page[1].change_counts["division"], (1, 0))
+
+    (page, cursor) = head.log(before_level=cursor, page_size=2)
+    self.assertEqual(page, [self.commits[0]])
+    self.assertIsNone(cursor)
+
+  def test_view(self):
+    head = self.commits[-1]
+    response = self.client.get(reverse("git-log", args=(head.pk,)))
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(list(response.context["commits"]), list(reversed(self.commits)))
+    self.assertContains(response, "division: +4 -1")
+
+  def test_view_not_found(self):
+    head = self.commits[-1]
+    self.assertEqual(self.client.get(reverse("git-log", args=(head.pk + 100,))).status_code, 404)
+    self.assertEqual(self.client.get(reverse("git-log", args=(head.pk,)) + "?before=nonsense").status_code, 404)
+
+
+class ObjectHistoryTestCase(TestCase):
+
+  def test_object_history(self):
+    from djangit.log import object_history
+
+    div_v0 = Division.create_initial(name="division")
+    c0 = Commit.objects.create()
+    c0._add_versions([div_v0, Division.create_initial(name="other division")])
+    c0.commit()
+
+    c1 = Commit.objects.create(parent_commit=c0)
+    c1._add_versions([Division.create_initial(name="unrelated")])
+    c1.commit()
+
+    div_v1 = div_v0.clone()
+    div_v1.save()
+    c2 = Commit.objects.create(parent_commit=get_refreshed(c1))
+    c2._add_versions([div_v1])
+    c2.commit()
+
+    c3 = Commit.objects.create(parent_commit=get_refreshed(c2))
+    c3._remove_objects([div_v0.eternal])
+    c3.commit()
+    c3 = get_refreshed(c3)
+
+    with self.assertNumQueries(1):
+      history = list(object_history(c3, div_v0.eternal))
+    self.assertEqual(history, [c3, get_refreshed(c2), c0])
+    self.assertEqual(
+      [ (c.added_version_id, c.removed) for c in history ],
+      [ (None, True), (div_v1.pk, False), (div_v0.pk, False) ]
+    )
+
+    response = self.client.get(
+      reverse("git-object-log", args=(c3.pk, "division", div_v0.eternal_id)) + "?before=3"
+    )
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(list(response.context["commits"]), [get_refreshed(c2), c0])
+
+    for args in [ (c3.pk + 100, "division", div_v0.eternal_id), (c3.pk, "nonsense", div_v0.eternal_id), (c3.pk, "division", 1000) ]:
+      self.assertEqual(self.client.get(reverse("git-object-log", args=args)).status_code, 404)
+    url = reverse("git-object-log", args=(c3.pk, "division", div_v0.eternal_id))
+    self.assertEqual(self.client.get(url + "?before=-1").status_code, 404)
+
+
+class BlameTestCase(TestCase):
+
+  def commit_with(self, parent, versions=(), removals=(), finalize=True):
+    c = Commit.objects.create(parent_commit=parent and get_refreshed(parent))
+    c._add_versions(list(versions))
+    c._remove_objects(list(removals))
+    if finalize:
+      c.commit()
+    return get_refreshed(c)
+
+  def edit(self, version, **attrs):
+    new_version = get_refreshed(version).clone()
+    for (k, v) in attrs.items():
+      setattr(new_version, k, v)
+    new_version.save()
+    return new_version
+
+  def test_blame(self):
+    from examples.models import Tag
+
+    t1 = Tag.objects.create(name="category 1")
+    t2 = Tag.objects.create(name="category 2")
+
+    v0 = Division.create_initial(name="a")
+    v0.set_m2m('tags', [t1.id])
+    c0 = self.commit_with(None, [v0])
+    v1 = self.edit(v0, name="b")
+    c1 = self.commit_with(c0, [v1])
+    v2 = self.edit(v1)
+    v2.set_m2m('tags', [t1.id, t2.id])
+    c2 = self.commit_with(c1, [v2])
+    # a fresh pointer record with the same tags is not a change
+    v3 = self.edit(v2)
+    v3.set_m2m('tags', [t2.id])
+    v3.set_m2m('tags', [t1.id, t2.id])
+    c3 = self.commit_with(c2, [v3])
+    self.assertNotEqual(get_refreshed(v3).tags_id, get_refreshed(v2).tags_id)
+
+    with self.assertNumQueries(3):
+      self.assertEqual(c3.blame(v0.eternal), { "name": c1, "tags": c2 })
+
+    c4 = self.commit_with(c3, removals=[v0.eternal])
+    self.assertIsNone(c4.blame(v0.eternal))
+    c5 = self.commit_with(c4, [v3])
+    self.assertEqual(c5.blame(v0.eternal), { "name": c5, "tags": c5 })
+
+  def test_blame_with_field_digests(self):
+    from examples.models import Employee, Team
+
+    division = Division.create_initial(name="division")
+    team = Team.create_initial(name="team", division=division.eternal)
+    e0 = Employee.create_initial(name="x", team=team)
+    c0 = self.commit_with(None, [division, team, e0])
+    self.assertTrue(get_refreshed(e0).field_digests)
+
+    e1 = self.edit(e0, name="y")
+    c1 = self.commit_with(c0, [e1])
+    self.assertEqual(c1.blame(e0.eternal), { "name": c1, "team": c0, "tags": c0 })
+
+    # versions of a working commit have no digests yet
+    e2 = self.edit(e1, name="z")
+    working = self.commit_with(c1, [e2], finalize=False)
+    self.assertIsNone(get_refreshed(e2).field_digests)
+    self.assertEqual(working.blame(e0.eternal), { "name": working, "team": c0, "tags": c0 })
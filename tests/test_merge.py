@@ -0,0 +1,93 @@
+from django.test import TestCase
+
+from examples.models import Division, Tag, Commit
+from djangit.merge import lowest_common_ancestor
+from djangit.utils import MergeConflictException
+from tests.helpers import get_refreshed, edit
+
+
+class MergeTestCase(TestCase):
+
+  def setUp(self):
+    self.t1 = Tag.objects.create(name="category 1")
+    self.t2 = Tag.objects.create(name="category 2")
+
+    self.c0 = Commit.objects.create()
+    self.div1 = Division.create_initial(name="division 1")
+    self.div1.set_m2m('tags', [self.t1.id])
+    self.div2 = Division.create_initial(name="division 2")
+    self.div3 = Division.create_initial(name="division 3")
+    self.c0._add_versions([self.div1, self.div2, self.div3])
+    self.c0.commit()
+    self.div1 = get_refreshed(self.div1)
+
+  def test_merge(self):
+    div4 = Division.create_initial(name="division 4")
+    c1 = Commit.objects.create(parent_commit=self.c0)
+    c1._add_versions([div4])
+    c1.commit()
+    base = get_refreshed(c1)
+
+    ours = Commit.objects.create(parent_commit=base)
+    our_div1 = edit(self.div1, name="division one")
+    our_div4 = edit(div4, name="division four")
+    ours._add_versions([our_div1, our_div4])
+    ours._remove_objects([self.div3])
+    ours.commit()
+
+    theirs = Commit.objects.create(parent_commit=get_refreshed(base))
+    their_div1 = edit(self.div1)
+    their_div1.set_m2m('tags', [self.t1.id, self.t2.id])
+    their_div2 = edit(self.div2, name="division two")
+    their_div3 = edit(self.div3, name="division three")
+    their_div4 = edit(div4, name="division IV")
+    div5 = Division.create_initial(name="division 5")
+    theirs._add_versions([their_div1, their_div2, their_div3, their_div4, div5])
+    theirs.commit()
+
+    ours = get_refreshed(ours)
+    theirs = get_refreshed(theirs)
+    self.assertEqual(lowest_common_ancestor(ours, theirs), base)
+
+    result = ours.three_way_merge(theirs)
+    self.assertEqual(result.base, base)
+    self.assertFalse(result.is_clean)
+    self.assertEqual(
+      sorted((c.eternal_id, c.field and c.field.name) for c in result.conflicts),
+      [ (self.div3.eternal_id, None), (div4.eternal_id, "name") ]
+    )
+    self.assertEqual(set(result.versions), set([their_div2, div5]))
+    self.assertEqual(result.removals, [])
+    self.assertEqual(list(result.changes), [our_div1])
+    self.assertEqual(result.changes[our_div1]['tags'].pk, their_div1.tags_id)
+
+    with self.assertRaises(MergeConflictException):
+      result.apply(Commit.objects.create(parent_commit=ours))
+
+  def test_apply_clean_merge(self):
+    ours = Commit.objects.create(parent_commit=self.c0)
+    our_div1 = edit(self.div1, name="division one")
+    ours._add_versions([our_div1])
+    ours.commit()
+
+    theirs = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    their_div1 = edit(self.div1)
+    their_div1.set_m2m('tags', [self.t2.id])
+    theirs._add_versions([their_div1])
+    theirs._remove_objects([self.div2])
+    theirs.commit()
+
+    ours = get_refreshed(ours)
+    result = ours.three_way_merge(get_refreshed(theirs))
+    self.assertTrue(result.is_clean)
+    self.assertEqual(result.removals, [self.div2.eternal])
+
+    merged = Commit.objects.create(parent_commit=ours)
+    result.apply(merged)
+    merged.commit()
+
+    live = get_refreshed(merged).version_sets()[Division]
+    self.assertEqual(set(live), set([self.div1.eternal_id, self.div3.eternal_id]))
+    merged_div1 = live[self.div1.eternal_id]
+    self.assertEqual(merged_div1.name, "division one")
+    self.assertEqual(list(merged_div1.tags.related.all()), [self.t2])
@@ -0,0 +1,129 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from examples.models import Division, Team, Tag, Commit
+from djangit.feed import change_feed
+from djangit.pack import commit_range, pack_records, load_records
+from djangit.utils import PackIntegrityException
+from tests.helpers import get_refreshed
+
+
+class PackTestCase(TestCase):
+  databases = { 'default', 'peer' }
+
+  def setUp(self):
+    # pointer targets aren't versioned, the receiving database is expected to have them
+    tag = Tag.objects.create(name="tag")
+    Tag.objects.using('peer').create(pk=tag.pk, name="tag")
+
+    self.div1 = Division.create_initial(name="division1")
+    self.div1.set_m2m('tags', [tag.id])
+    self.div2 = Division.create_initial(name="division2")
+    team = Team.create_initial(name="team", division=self.div1.eternal)
+    self.c0 = Commit.objects.create(message="initial")
+    self.c0._add_versions([self.div1, self.div2, team])
+    self.c0.commit()
+
+    div1_v1 = get_refreshed(self.div1).clone()
+    div1_v1.name = "division one"
+    div1_v1.save()
+    self.c1 = Commit.objects.create(parent_commit=get_refreshed(self.c0))
+    self.c1._add_versions([div1_v1])
+    self.c1._remove_objects([self.div2])
+    self.c1.commit()
+    self.c1 = get_refreshed(self.c1)
+
+    (fd, self.path) = tempfile.mkstemp(suffix=".pack.gz")
+    os.close(fd)
+    self.addCleanup(os.remove, self.path)
+
+  def unpack(self):
+    out = StringIO()
+    call_command('djangit_unpack', 'examples.Commit', self.path, '--database', 'peer', stdout=out)
+    return out.getvalue().strip()
+
+  def test_pack_and_unpack(self):
+    call_command('djangit_pack', 'examples.Commit', self.path, '--head', self.c1.checksum)
+    self.assertEqual(self.unpack(), "Loaded 2 new commit(s)")
+
+    peer_c1 = Commit.objects.using('peer').get(checksum=self.c1.checksum)
+    self.assertEqual(peer_c1.message, "")
+    self.assertEqual(peer_c1.parent_commit.checksum, self.c0.checksum)
+    self.assertEqual(Commit.objects.using('peer').get(checksum=self.c0.checksum).message, "initial")
+    self.assertEqual(
+      set(Division.objects.using('peer').at_commit(peer_c1).values_list('name', flat=True)),
+      { "division one" },
+    )
+    self.assertEqual(
+      list(Division.objects.using('peer').at_commit(peer_c1).values_list('tags__related__name', flat=True)),
+      [ "tag" ],
+    )
+
+    # loading the same pack again is a no-op
+    self.assertEqual(self.unpack(), "Loaded 0 new commit(s)")
+
+    # packs can start from a commit the receiving side already has
+    c2 = Commit.objects.create(parent_commit=self.c1)
+    c2._add_versions([Division.create_initial(name="division3")])
+    c2.commit()
+    call_command('djangit_pack', 'examples.Commit', self.path, '--head', str(c2.pk), '--base', str(self.c1.pk))
+    self.assertEqual(self.unpack(), "Loaded 1 new commit(s)")
+    peer_c2 = Commit.objects.using('peer').get(checksum=get_refreshed(c2).checksum)
+    self.assertEqual(peer_c2._chain_queryset().count(), 3)
+    self.assertEqual(Division.objects.using('peer').at_commit(peer_c2).count(), 2)
+
+  def test_unpack_into_non_empty_database(self):
+    # the peer numbers its own rows from 1 as well, so every id in the pack is taken there
+    eternal = Division._eternal_cls.objects.using('peer').create()
+    local_division = Division.objects.using('peer').create(eternal=eternal, name="local division")
+    self.assertEqual(local_division.pk, self.div1.pk)
+    local_c0 = Commit.objects.using('peer').create(message="local")
+    local_c0._add_versions([local_division])
+    local_c0.commit()
+    self.assertEqual(local_c0.pk, self.c0.pk)
+
+    call_command('djangit_pack', 'examples.Commit', self.path, '--head', self.c1.checksum)
+    self.assertEqual(self.unpack(), "Loaded 2 new commit(s)")
+
+    peer_c1 = Commit.objects.using('peer').get(checksum=self.c1.checksum)
+    self.assertNotEqual(peer_c1.pk, self.c1.pk)
+    self.assertEqual(
+      list(Division.objects.using('peer').at_commit(peer_c1).values_list('name', 'tags__related__name')),
+      [ ("division one", "tag") ],
+    )
+    self.assertEqual(Division.objects.using('peer').at_commit(peer_c1).get().eternal.uuid, self.div1.eternal.uuid)
+    peer_c0 = Commit.objects.using('peer').get(checksum=self.c0.checksum)
+    self.assertEqual(
+      set(Team.objects.using('peer').at_commit(peer_c0).values_list('division__uuid', flat=True)),
+      { self.div1.eternal.uuid },
+    )
+
+    # the peer's own history is untouched, and its change feed emits the loaded commits after it, parents first
+    local_c0 = Commit.objects.using('peer').get(pk=local_c0.pk)
+    self.assertEqual(local_c0.checksum, local_c0._compute_hash())
+    self.assertEqual(
+      [ (e["commit"], e["position"]) for e in change_feed(Commit, using='peer') if e["op"] == "commit" ],
+      [ (local_c0.pk, 1), (peer_c0.pk, 2), (peer_c1.pk, 3) ],
+    )
+    self.assertEqual(
+      list(Division.objects.using('peer').at_commit(local_c0).values_list('name', flat=True)),
+      [ "local division" ],
+    )
+
+  def test_verification(self):
+    records = list(pack_records(commit_range(self.c1)))
+    for record in records:
+      if record["type"] == "version" and record["fields"]["name"] == "division2":
+        record["fields"]["name"] = "tampered"
+
+    with self.assertRaises(PackIntegrityException):
+      load_records(Commit, records, using='peer')
+    self.assertEqual(Commit.objects.using('peer').count(), 0)
+    self.assertEqual(Division.objects.using('peer').count(), 0)
+
+    with self.assertRaises(PackIntegrityException):
+      commit_range(get_refreshed(self.c0), base=self.c1)
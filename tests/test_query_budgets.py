@@ -0,0 +1,168 @@
+"""
+  query budgets: each operation runs against synthetic repositories of growing size (see tests/synthetic.py),
+  and has to run the same number of queries, with the same SQL shapes, whatever the size
+  a scaling regression (an N+1, a recursion that queries per commit) fails here before it reaches production
+"""
+import re
+
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from examples.models import Division, Team, Employee, Commit
+from tests.synthetic import generate
+
+
+SIZES = (2, 4, 8)
+
+
+def sql_shape(sql):
+  """
+    the statement with its literals and savepoint names masked,
+    and the lists that grow with the number of rows (IN lists, multi-row inserts, bulk_update cases) collapsed
+  """
+  sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+  sql = re.sub(r'"s\d+_x\d+"', "?", sql)
+  sql = re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+  sql = re.sub(r"IN \((?:\?, )*\?\)", "IN (...)", sql)
+  sql = re.sub(r"(VALUES \([^()]*\))(?:, \([^()]*\))+", r"\1, ...", sql)
+  sql = re.sub(r"(SELECT \?(?:, \?)*)(?: UNION ALL SELECT \?(?:, \?)*)+", r"\1 UNION ALL ...", sql)
+  return re.sub(r"(WHEN \([^()]*\) THEN \? )(?:WHEN \([^()]*\) THEN \? )+", r"\1... ", sql)
+
+
+def record(operation):
+  """
+    the SQL shapes of the queries operation() runs, in order
+    on backends that can't return ids from bulk inserts, bulk_create_with_pks inserts one row at a time,
+    those runs of identical inserts count as one
+  """
+  with CaptureQueriesContext(connection) as captured:
+    operation()
+  shapes = []
+  for shape in ( sql_shape(q['sql']) for q in captured ):
+    if (
+      not connection.features.can_return_rows_from_bulk_insert and
+      shape.startswith("INSERT") and
+      shapes and shapes[-1] == shape
+    ):
+      continue
+    shapes.append(shape)
+  return shapes
+
+
+def head_of(repo):
+  # a fresh instance, so nothing is served from caches the generator filled
+  return Commit.objects.get(pk=repo.main[-1].pk)
+
+
+class QueryBudgetTestCase(TestCase):
+
+  def assertConstantQueries(self, operation, budget, **generate_kwargs):
+    """
+      generates a repository per size (generate_kwargs values can be functions of the size),
+      then checks operation(repo) stays within budget queries and runs the same SQL at every size
+    """
+    recorded = {}
+    for size in SIZES:
+      kwargs = { k: (v(size) if callable(v) else v) for (k, v) in generate_kwargs.items() }
+      with transaction.atomic():
+        repo = generate(**kwargs)
+        recorded[size] = record(lambda: operation(repo))
+        transaction.set_rollback(True)
+
+    smallest = recorded[SIZES[0]]
+    self.assertLessEqual(len(smallest), budget, "\n".join(smallest))
+    for size in SIZES[1:]:
+      self.assertEqual(
+        recorded[size],
+        smallest,
+        f"queries differ between sizes {SIZES[0]} and {size}",
+      )
+
+  def test_version_sets(self):
+    self.assertConstantQueries(
+      lambda repo: head_of(repo).version_sets(),
+      budget=1 + 6,
+      depth=lambda n: n, width=lambda n: n,
+    )
+
+  def test_version_for(self):
+    def operation(repo):
+      head = head_of(repo)
+      eternal = Division._eternal_cls.objects.order_by('pk').first()
+      self.assertEqual(head.version_for(eternal), head.version_sets()[Division].get(eternal.pk))
+
+    self.assertConstantQueries(
+      operation,
+      budget=2 + 2 + 6,
+      depth=lambda n: n, width=4, churn=0, models=(Division,),
+    )
+
+  def test_ancestors_and_descendants(self):
+    def operation(repo):
+      head = head_of(repo)
+      root = Commit.objects.get(pk=repo.main[0].pk)
+      self.assertEqual(head.ancestors(), repo.main[-2::-1])
+      self.assertEqual(root.descendants(), repo.main[1:])
+
+    self.assertConstantQueries(operation, budget=2 + 2, depth=lambda n: n, width=2, models=(Division,))
+
+  def test_history(self):
+    def operation(repo):
+      head = head_of(repo)
+      eternal = Division._eternal_cls.objects.order_by('pk').first()
+      head.relevant_history_with_respect_to(eternal)
+      head.log()
+
+    self.assertConstantQueries(operation, budget=1 + 1 + 2, depth=lambda n: n, width=2, edits=2, models=(Division,))
+
+  def test_commit(self):
+    def operation(repo):
+      head = head_of(repo)
+      commit = Commit.objects.create(parent_commit=head)
+      commit.stage_changes({ v: { "name": f"{v.name} edited" } for v in repo.live[Employee].values() })
+      commit = Commit.objects.get(pk=commit.pk)
+      with CaptureQueriesContext(connection) as committing:
+        commit.commit()
+      self.commit_queries = len(committing)
+
+    # the commit edits every employee, staging and committing both have to stay flat
+    # committing looks up the refs pointing to the commit once, to refresh their cached head metadata,
+    # and checks whether the commit reaches the archives of Team and Division, which Team's constraints read;
+    # it takes the next feed position, finalizing in a savepoint so a position a concurrent commit took can be retried
+    self.assertConstantQueries(operation, budget=23 + 1 + 2 + 3, depth=2, width=lambda n: n, models=(Division, Team, Employee))
+    self.assertLessEqual(self.commit_queries, 13 + 1 + 2 + 3)
+
+  def test_validate_constraints(self):
+    def operation(repo):
+      commit = Commit.objects.create(parent_commit=head_of(repo))
+      commit.stage_changes({ v: { "name": f"{v.name} edited" } for v in repo.live[Team].values() })
+      commit = Commit.objects.get(pk=commit.pk)
+      with CaptureQueriesContext(connection) as validating:
+        self.assertEqual(commit.constraint_violations(), [])
+      self.validation_queries = len(validating)
+
+    # the commit edits every team, each of Team's versioned constraints is a single query,
+    # plus one per model they read (Team and Division), checking whether the commit reaches its archive
+    self.assertConstantQueries(operation, budget=12 + 2, depth=2, width=lambda n: n, models=(Division, Team))
+    self.assertLessEqual(self.validation_queries, 2 + 2)
+
+  def test_object_table(self):
+    template = Template("{% load helpers %}{% for v in versions %}{% object_table v %}{% endfor %}")
+
+    def operation(repo):
+      versions = Team.objects.at_commit(head_of(repo)).with_related()
+      template.render(Context({ "versions": versions }))
+
+    # one more, at_commit checking that none of the live versions are archived
+    self.assertConstantQueries(operation, budget=3 + 1, depth=1, width=lambda n: n, models=(Division, Team))
+
+  def test_commit_page(self):
+    def operation(repo):
+      response = self.client.get(reverse("view-commit", args=(repo.main[-1].pk,)))
+      self.assertEqual(response.status_code, 200)
+
+    # one more per tracked model, checking whether the commit reaches the archive
+    self.assertConstantQueries(operation, budget=8 + 3, depth=2, width=lambda n: n)
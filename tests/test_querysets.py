@@ -0,0 +1,92 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from examples.models import Division, Commit
+from tests.helpers import get_refreshed
+
+
+class AtCommitTestCase(TestCase):
+
+  def test_at_commit(self):
+    c0 = Commit.objects.create()
+    div1_v0 = Division.create_initial(name="division1")
+    div2 = Division.create_initial(name="division2")
+    c0._add_versions([div1_v0, div2])
+    c0.commit()
+
+    div1_v1 = div1_v0.clone()
+    div1_v1.name = "division one"
+    div1_v1.save()
+    div3 = Division.create_initial(name="division3")
+
+    c1 = Commit.objects.create(parent_commit=c0)
+    c1._add_versions([div1_v1, div3])
+    c1._remove_objects([div2])
+    c1.commit()
+
+    self.assertEqual(
+      set(Division.objects.at_commit(c0)),
+      set([div1_v0, div2])
+    )
+    # c1 is deliberately not refreshed, its tree coordinates are resolved in the db
+    live_at_c1 = Division.objects.at_commit(c1)
+    self.assertEqual(set(live_at_c1), set([div1_v1, div3]))
+    self.assertEqual(live_at_c1.count(), 2)
+    self.assertEqual(
+      list(live_at_c1.filter(name__icontains="three").values_list('name', flat=True)),
+      []
+    )
+    self.assertEqual(
+      list(live_at_c1.order_by('-name').values_list('name', flat=True)[:1]),
+      ["division3"]
+    )
+
+    # one query counts, the other checks that none of the live versions are archived
+    with self.assertNumQueries(2):
+      self.assertEqual(Division.objects.at_commit(c1).filter(name__icontains="one").count(), 1)
+    with self.assertNumQueries(1):
+      self.assertEqual(Division.objects.hot_at_commit(c1).filter(name__icontains="one").count(), 1)
+
+    self.assertEqual(
+      c1.version_sets()[Division],
+      { v.eternal_id : v for v in [div1_v1, div3] }
+    )
+
+
+class AsOfTestCase(TestCase):
+
+  def test_as_of(self):
+    jan = timezone.make_aware(datetime.datetime(2019, 1, 31))
+    feb = timezone.make_aware(datetime.datetime(2019, 2, 28))
+
+    c0 = Commit.objects.create()
+    div_v0 = Division.create_initial(name="january name")
+    c0._add_versions([div_v0])
+    c0.commit()
+    Commit.objects.filter(pk=c0.pk).update(committed_at=jan - datetime.timedelta(days=1))
+
+    div_v1 = div_v0.clone()
+    div_v1.name = "february name"
+    div_v1.save()
+    c1 = Commit.objects.create(parent_commit=c0)
+    c1._add_versions([div_v1])
+    c1.commit()
+    Commit.objects.filter(pk=c1.pk).update(committed_at=feb - datetime.timedelta(days=1))
+
+    # unfinalized working commit never counts
+    Commit.objects.create(parent_commit=get_refreshed(c1))
+
+    head = get_refreshed(c1)
+    self.assertEqual(head.ancestor_as_of(jan), c0)
+    self.assertEqual(head.ancestor_as_of(feb), c1)
+    self.assertEqual(head.ancestor_as_of(jan - datetime.timedelta(days=30)), None)
+
+    self.assertEqual(list(Division.objects.as_of(jan, head)), [div_v0])
+    self.assertEqual(list(Division.objects.as_of(feb, head)), [div_v1])
+    self.assertEqual(Division.objects.as_of(jan - datetime.timedelta(days=30), head).count(), 0)
+    self.assertEqual(
+      head.version_sets_as_of(jan)[Division],
+      { div_v0.eternal_id : div_v0 }
+    )
@@ -0,0 +1,45 @@
+from django.test import TestCase
+
+from examples.models import Division, Team, Employee, Tag, Commit
+from djangit.references import referencing
+from tests.helpers import get_refreshed
+
+
+class ReferencingTestCase(TestCase):
+
+  def test_referencing(self):
+    tag_a = Tag.objects.create(name="a")
+    tag_b = Tag.objects.create(name="b")
+
+    div1 = Division.create_initial(name="division1")
+    div1.set_m2m('tags', [tag_a.id])
+    div2 = Division.create_initial(name="division2")
+    div2.set_m2m('tags', [tag_a.id, tag_b.id])
+    team = Team.create_initial(name="team", division=div1.eternal)
+    team.set_m2m('tags', [tag_b.id])
+
+    c0 = Commit.objects.create()
+    c0._add_versions([div1, div2, team])
+    c0.commit()
+
+    div1_v1 = get_refreshed(div1).clone()
+    div1_v1.save()
+    div1_v1.set_m2m('tags', [tag_b.id])
+    c1 = Commit.objects.create(parent_commit=get_refreshed(c0))
+    c1._add_versions([div1_v1])
+    c1._remove_objects([div2])
+    c1.commit()
+
+    at_c0 = referencing(tag_a, at_commit=c0)
+    self.assertEqual(set(at_c0), { Division, Team, Employee })
+    self.assertEqual(set(at_c0[Division]), { div1, div2 })
+    self.assertEqual(list(at_c0[Team]), [])
+
+    # one more query checks that none of the live versions are archived
+    with self.assertNumQueries(2):
+      self.assertEqual(list(Division.objects.at_commit(c1).referencing(tag_a)), [])
+    self.assertEqual(set(Division.objects.at_commit(c1).referencing(tag_b)), { div1_v1 })
+    self.assertEqual(set(Team.objects.at_commit(c1).referencing(tag_b, field_name='tags')), { team })
+
+    with self.assertRaises(ValueError):
+      Division.objects.referencing(div1.eternal)
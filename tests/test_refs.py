@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from examples.models import Division, Commit, Ref, CheckedOutRef
+from djangit.utils import LockedInformationException
+from tests.helpers import get_refreshed
+
+
+class RefTestCase(TestCase):
+
+  def test_refs(self):
+    c0 = Commit.objects.create()
+    div1 = Division.create_initial(name="division 1")
+    div2 = Division.create_initial(name="division 2")
+    c0._add_versions([div1, div2])
+    c0.commit()
+
+    main = Ref.create_branch("main", c0)
+    self.assertEqual(main.counts, { "division": 2, "employee": 0, "team": 0 })
+    self.assertEqual(main.depth, 0)
+    self.assertEqual(main.head_committed_at, c0.committed_at)
+
+    c1 = Commit.objects.create(parent_commit=c0)
+    div1_v1 = div1.clone()
+    div1_v1.save()
+    c1._add_versions([div1_v1, Division.create_initial(name="division 3")])
+    c1._remove_objects([div2])
+    c1.commit()
+    c1 = get_refreshed(c1)
+
+    # advancing by a single child commit is counted incrementally
+    main.move_to(c1)
+    main = get_refreshed(main)
+    self.assertEqual(main.head, c1)
+    self.assertEqual(main.depth, 1)
+    self.assertEqual(main.counts["division"], 2)
+    self.assertEqual(main.counts["division"], Division.objects.at_commit(c1).count())
+
+    main.move_to(c0)
+    self.assertEqual(get_refreshed(main).counts["division"], 2)
+
+    v1 = Ref.create_tag("v1", c1)
+    with self.assertRaises(LockedInformationException):
+      v1.move_to(c0)
+    with self.assertRaises(LockedInformationException):
+      Ref.create_tag("draft", Commit.objects.create(parent_commit=c1))
+
+    self.assertEqual(list(Ref.branches()), [main])
+    self.assertEqual(list(Ref.tags()), [v1])
+
+    user = User.objects.create(username="someone")
+    self.assertIsNone(CheckedOutRef.ref_for(user))
+    CheckedOutRef.checkout(user, main)
+    CheckedOutRef.checkout(user, v1)
+    self.assertEqual(CheckedOutRef.ref_for(user), v1)
+    self.assertEqual(CheckedOutRef.objects.count(), 1)
+
+  def test_finalizing_the_head(self):
+    c0 = Commit.objects.create()
+    main = Ref.create_branch("main", c0)
+    c0._add_versions([Division.create_initial(name="division 1")])
+    c0.commit()
+
+    main = get_refreshed(main)
+    self.assertEqual(main.head_committed_at, get_refreshed(c0).committed_at)
+    self.assertEqual(main.counts["division"], 1)
@@ -0,0 +1,81 @@
+from django.test import TestCase
+
+from examples.models import Division, Tag, Commit
+from djangit.pack import commit_range, pack_records, load_records
+from djangit.replicas import replica_for
+from tests.helpers import get_refreshed
+
+
+class ReplicaTestCase(TestCase):
+  databases = { 'default', 'replica' }
+
+  def setUp(self):
+    tag = Tag.objects.create(name="tag")
+    Tag.objects.using('replica').create(pk=tag.pk, name="tag")
+
+    self.div1 = Division.create_initial(name="division1")
+    self.div1.set_m2m('tags', [tag.id])
+    self.div2 = Division.create_initial(name="division2")
+    self.c0 = Commit.objects.create()
+    self.c0._add_versions([self.div1, self.div2])
+    self.c0.commit()
+    self.c0 = get_refreshed(self.c0)
+
+    # replication is simulated with a pack, it only got as far as c0
+    load_records(Commit, pack_records(commit_range(self.c0)), using='replica')
+
+    self.c1 = Commit.objects.create(parent_commit=self.c0)
+    self.c1._remove_objects([self.div2])
+    self.c1.commit()
+    self.c1 = get_refreshed(self.c1)
+    self.draft = Commit.objects.create(parent_commit=self.c1)
+
+  def test_replica_for(self):
+    replicated = self.c0.on_replica()
+    self.assertEqual(replicated._state.db, 'replica')
+    self.assertEqual(replicated.checksum, self.c0.checksum)
+
+    # not replicated yet, and drafts, stay on the primary
+    self.assertIs(replica_for(self.c1), self.c1)
+    self.assertIs(replica_for(self.draft), self.draft)
+    self.assertIs(replica_for(self.c0, replicas=[]), self.c0)
+
+  def test_resolution_reads_the_replica(self):
+    replicated = self.c0.on_replica()
+    expected = self.c0.version_sets()
+
+    with self.assertNumQueries(0, using='default'):
+      version_sets = replicated.version_sets()
+      self.assertEqual(version_sets, expected)
+      self.assertEqual(replicated.version_for(self.div1.eternal), self.div1)
+      self.assertEqual(Division.objects.at_commit(replicated).count(), 2)
+      self.assertEqual(
+        list(Division.objects.at_commit(replicated).filter(name="division1").values_list('tags__related__name', flat=True)),
+        ["tag"],
+      )
+      (page, _cursor) = replicated.log()
+      self.assertEqual(page, [replicated])
+
+    for v in version_sets[Division].values():
+      self.assertEqual(v._state.db, 'replica')
+
+    # an explicit database still wins
+    self.assertEqual(Division.objects.using('default').at_commit(replicated).db, 'default')
+
+  def test_writes_go_to_the_primary(self):
+    replicated_div1 = self.c0.on_replica().version_for(self.div1.eternal)
+    div1_v1 = replicated_div1.clone()
+    div1_v1.name = "division one"
+    div1_v1.save()
+
+    self.assertEqual(div1_v1._state.db, 'default')
+    self.assertEqual(replicated_div1._state.db, 'replica')
+    self.assertEqual(Division.objects.get(pk=div1_v1.pk).name, "division one")
+    self.assertFalse(Division.objects.using('replica').filter(pk=div1_v1.pk).exists())
+
+    self.draft._add_versions([div1_v1])
+    self.draft.commit()
+    self.assertEqual(
+      set(Division.objects.at_commit(self.draft).values_list('name', flat=True)),
+      { "division one" },
+    )
@@ -0,0 +1,217 @@
+from django.test import TestCase
+
+from examples.models import Division, Team, Employee, Tag, Commit, Ref
+from djangit.rewrite import rebase, squash, redact, purge
+from djangit.utils import hash_for_model_instance
+from djangit.utils import MergeConflictException, RewriteException
+from tests.helpers import get_refreshed, edit, commit_with
+
+
+class RebaseTestCase(TestCase):
+
+  def setUp(self):
+    self.t1 = Tag.objects.create(name="category 1")
+    self.div1 = Division.create_initial(name="division 1")
+    self.div2 = Division.create_initial(name="division 2")
+    self.c0 = commit_with(None, [self.div1, self.div2])
+    self.div1 = get_refreshed(self.div1)
+
+  def test_rebase(self):
+    div1_renamed = edit(self.div1, name="division one")
+    a1 = commit_with(self.c0, [div1_renamed])
+    div3 = Division.create_initial(name="division 3")
+    a2 = commit_with(a1, [div3])
+
+    div1_tagged = edit(self.div1)
+    div1_tagged.set_m2m('tags', [self.t1.id])
+    b1 = commit_with(self.c0, [div1_tagged], removals=[self.div2])
+
+    old_checksum = a2.checksum
+    new_tip = rebase(a2, b1)
+
+    self.assertEqual(new_tip.ancestors(), [get_refreshed(a1), b1, self.c0])
+    self.assertNotEqual(new_tip.checksum, old_checksum)
+    for c in [get_refreshed(a1), new_tip]:
+      self.assertEqual(c.checksum, c._compute_hash())
+
+    live = new_tip.version_sets()[Division]
+    self.assertEqual(set(live), set([self.div1.eternal_id, div3.eternal_id]))
+    merged_div1 = live[self.div1.eternal_id]
+    self.assertEqual(merged_div1.name, "division one")
+    self.assertEqual(list(merged_div1.tags.related.all()), [self.t1])
+    self.assertTrue(merged_div1.checksum)
+
+    # the rebased-away version is untouched, it just isn't referenced by a1 anymore
+    self.assertEqual(get_refreshed(div1_renamed).name, "division one")
+    self.assertEqual(get_refreshed(a1)._versions_added_for_class(Division), [merged_div1])
+
+  def test_refs_below_the_range(self):
+    a1 = commit_with(self.c0, [Division.create_initial(name="division 3")])
+    main = Ref.create_branch("main", a1)
+    b1 = commit_with(self.c0, removals=[self.div2])
+    b2 = commit_with(b1, [edit(self.div1, name="division one")])
+
+    rebase(a1, b2)
+
+    main = get_refreshed(main)
+    self.assertEqual(main.depth, 3)
+    self.assertEqual(main.counts["division"], 2)
+
+  def test_conflicting_rebase(self):
+    a1 = commit_with(self.c0, [edit(self.div1, name="ours")])
+    b1 = commit_with(self.c0, [edit(self.div1, name="theirs")])
+
+    with self.assertRaises(MergeConflictException):
+      rebase(a1, b1)
+    self.assertEqual(get_refreshed(a1).parent_commit, self.c0)
+
+  def test_branches_off_the_range(self):
+    a1 = commit_with(self.c0, [Division.create_initial(name="division 3")])
+    a2 = commit_with(a1, [Division.create_initial(name="division 4")])
+    div1_tagged = edit(self.div1)
+    div1_tagged.set_m2m('tags', [self.t1.id])
+    side = commit_with(a1, [div1_tagged])
+    b1 = commit_with(self.c0, [edit(self.div1, name="division one")])
+
+    rebase(a2, b1)
+
+    # the side branch moved along, and got b1's rename merged into its own edit
+    side = get_refreshed(side)
+    self.assertEqual(side.parent_commit, get_refreshed(a1))
+    self.assertEqual(side.checksum, side._compute_hash())
+    merged_div1 = side.version_for(self.div1.eternal)
+    self.assertEqual(merged_div1.name, "division one")
+    self.assertEqual(list(merged_div1.tags.related.all()), [self.t1])
+
+  def test_conflicting_branch_off_the_range(self):
+    a1 = commit_with(self.c0, [Division.create_initial(name="division 3")])
+    a2 = commit_with(a1, [Division.create_initial(name="division 4")])
+    commit_with(a1, [edit(self.div1, name="ours")])
+    b1 = commit_with(self.c0, [edit(self.div1, name="theirs")])
+
+    with self.assertRaises(MergeConflictException):
+      rebase(a2, b1)
+    self.assertEqual(get_refreshed(a1).parent_commit, self.c0)
+
+  def test_onto_descendant(self):
+    a1 = commit_with(self.c0, [edit(self.div1, name="ours")])
+    with self.assertRaises(RewriteException):
+      rebase(self.c0, a1)
+
+
+class SquashTestCase(TestCase):
+
+  def setUp(self):
+    self.div1 = Division.create_initial(name="division 1")
+    self.div2 = Division.create_initial(name="division 2")
+    self.c0 = commit_with(None, [self.div1, self.div2])
+
+    self.div1_v1 = edit(get_refreshed(self.div1), name="division one")
+    self.c1 = commit_with(self.c0, [self.div1_v1], removals=[self.div2])
+    self.temporary = Division.create_initial(name="temporary")
+    self.c2 = commit_with(self.c1, [self.temporary])
+    self.div1_v2 = edit(get_refreshed(self.div1_v1), name="division I")
+    self.c3 = commit_with(self.c2, [self.div1_v2], removals=[self.temporary])
+
+    self.div3 = Division.create_initial(name="division 3")
+    self.c4 = commit_with(self.c3, [self.div3])
+    self.ref = Ref.create_branch("main", self.c4)
+
+  def test_squash(self):
+    live_before = self.c4.version_sets()[Division]
+    old_checksum = self.c4.checksum
+
+    squashed = squash(self.c1, self.c3)
+
+    self.assertFalse(Commit.objects.filter(pk__in=[self.c1.pk, self.c2.pk, self.c3.pk]).exists())
+    self.assertEqual(
+      set(squashed.adds_division.all()), { self.div1_v2 }
+    )
+    self.assertEqual(
+      set(squashed.removes_division.all()), { get_refreshed(self.div2).eternal }
+    )
+
+    c4 = get_refreshed(self.c4)
+    self.assertEqual(c4.ancestors(), [squashed, self.c0])
+    self.assertEqual(c4.version_sets()[Division], live_before)
+    self.assertNotEqual(c4.checksum, old_checksum)
+    for c in [squashed, c4]:
+      self.assertEqual(c.checksum, c._compute_hash())
+
+    ref = get_refreshed(self.ref)
+    self.assertEqual(ref.head, c4)
+    self.assertEqual(ref.depth, 2)
+
+  def test_archive(self):
+    squashed = squash(self.c1, self.c3, archive=True)
+    c3 = get_refreshed(self.c3)
+    self.assertEqual(c3.checksum, self.c3.checksum)
+    self.assertEqual(list(c3.children_commits.all()), [])
+    self.assertEqual(squashed.version_sets()[Division], c3.version_sets()[Division])
+    self.assertEqual(get_refreshed(self.c4).parent_commit, squashed)
+
+  def test_refs_into_range(self):
+    Ref.create_tag("v1", self.c2)
+    with self.assertRaises(RewriteException):
+      squash(self.c1, self.c3)
+
+
+class PurgeTestCase(TestCase):
+
+  def setUp(self):
+    self.secret_tag = Tag.objects.create(name="secret")
+    self.div1 = Division.create_initial(name="division 1")
+    self.div1.set_m2m('tags', [self.secret_tag.id])
+    self.c0 = commit_with(None, [self.div1])
+    self.div1 = get_refreshed(self.div1)
+
+    self.leaked = edit(self.div1, name="secret name")
+    self.c1 = commit_with(self.c0, [self.leaked])
+    self.c2 = commit_with(self.c1, [Division.create_initial(name="division 2")])
+
+  def assertChecksumsConsistent(self):
+    for c in Commit.objects.all():
+      self.assertEqual(c.checksum, c._compute_hash())
+
+  def test_redact(self):
+    [redacted] = redact(Commit, [self.leaked], name="[redacted]")
+    self.assertEqual(get_refreshed(self.leaked).name, "[redacted]")
+    redacted.checksum = None
+    self.assertEqual(get_refreshed(self.leaked).checksum, hash_for_model_instance(redacted))
+
+    self.assertEqual(get_refreshed(self.c0).checksum, self.c0.checksum)
+    self.assertNotEqual(get_refreshed(self.c1).checksum, self.c1.checksum)
+    self.assertNotEqual(get_refreshed(self.c2).checksum, self.c2.checksum)
+    self.assertChecksumsConsistent()
+
+  def test_purge_versions(self):
+    purge(Commit, versions=[self.leaked])
+
+    self.assertFalse(Division.objects.filter(pk=self.leaked.pk).exists())
+    self.assertEqual(get_refreshed(self.c2).version_sets()[Division][self.div1.eternal_id], self.div1)
+    self.assertChecksumsConsistent()
+
+  def test_purge_refreshes_refs(self):
+    main = Ref.create_branch("main", self.c2)
+    [added] = get_refreshed(self.c2)._versions_added_for_class(Division)
+    purge(Commit, versions=[added])
+    self.assertEqual(get_refreshed(main).counts["division"], 1)
+
+  def test_purge_pointers(self):
+    pointer = self.div1.tags
+    purge(Commit, pointers=[pointer])
+
+    self.assertFalse(pointer.__class__.objects.filter(pk=pointer.pk).exists())
+    self.assertFalse(pointer.__class__.related.through.objects.filter(tag=self.secret_tag).exists())
+    self.assertIsNone(get_refreshed(self.div1).tags)
+    self.assertIsNone(get_refreshed(self.leaked).tags)
+    self.assertNotEqual(get_refreshed(self.c0).checksum, self.c0.checksum)
+    self.assertChecksumsConsistent()
+
+  def test_referenced_versions(self):
+    team = Team.create_initial(name="team", division=self.div1.eternal)
+    employee = Employee.create_initial(name="employee", team=team)
+    commit_with(self.c2, [team, employee])
+    with self.assertRaises(RewriteException):
+      purge(Commit, versions=[team])
+    self.assertTrue(Team.objects.filter(pk=team.pk).exists())
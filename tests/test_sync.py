@@ -0,0 +1,92 @@
+from django.test import TestCase
+
+from examples.models import Division, Tag, Commit, Ref
+from djangit.sync import Endpoint, LocalTransport, fetch
+
+
+def make_commit(parent, *names, using='default'):
+  commits = Commit.objects.using(using)
+  c = commits.create(parent_commit=parent and commits.get(checksum=parent.checksum))
+  c._add_versions([
+    Division.objects.using(using).create(eternal=Division._eternal_cls.objects.using(using).create(), name=name)
+    for name in names
+  ])
+  c.commit()
+  return commits.get(pk=c.pk)
+
+
+class SyncTestCase(TestCase):
+  databases = { 'default', 'peer' }
+
+  def setUp(self):
+    self.remote = Endpoint(Commit, using='default')
+    self.local = Endpoint(Commit, using='peer')
+    self.transport = LocalTransport(self.remote)
+
+    self.c0 = make_commit(None, "division0")
+    self.c1 = make_commit(self.c0, "division1")
+
+  def test_fetch(self):
+    self.assertEqual(
+      [ c.checksum for c in fetch(self.local, self.transport) ],
+      [ self.c0.checksum, self.c1.checksum ],
+    )
+    self.assertEqual(fetch(self.local, self.transport), [])
+
+    c2 = make_commit(self.c1, "division2")
+    branch = make_commit(self.c0, "branched division")
+
+    records = []
+    pack = self.transport.pack
+    def recording_pack(wants, common):
+      for record in pack(wants, common):
+        records.append(record)
+        yield record
+    self.transport.pack = recording_pack
+
+    fetched = fetch(self.local, self.transport, batch_size=1)
+    self.assertEqual(set(c.checksum for c in fetched), { c2.checksum, branch.checksum })
+    # only the versions of the missing commits cross the transport
+    self.assertEqual(
+      sorted(r["fields"]["name"] for r in records if r["type"] == "version"),
+      [ "branched division", "division2" ],
+    )
+
+    peer_c2 = Commit.objects.using('peer').get(checksum=c2.checksum)
+    self.assertEqual(
+      set(Division.objects.using('peer').at_commit(peer_c2).values_list('name', flat=True)),
+      { "division0", "division1", "division2" },
+    )
+
+  def test_fetch_after_divergence(self):
+    fetch(self.local, self.transport)
+
+    # both sides go on from c1 and use the same ids for different rows
+    local_c2 = make_commit(self.c1, "local division", using='peer')
+    remote_c2 = make_commit(self.c1, "remote division")
+    self.assertEqual(local_c2.pk, remote_c2.pk)
+    self.assertEqual(
+      Division.objects.using('peer').at_commit(local_c2).get(name="local division").pk,
+      Division.objects.at_commit(remote_c2).get(name="remote division").pk,
+    )
+
+    self.assertEqual([ c.checksum for c in fetch(self.local, self.transport) ], [ remote_c2.checksum ])
+    peer_remote_c2 = Commit.objects.using('peer').get(checksum=remote_c2.checksum)
+    self.assertEqual(peer_remote_c2.parent_commit, local_c2.parent_commit)
+    self.assertEqual(
+      set(Division.objects.using('peer').at_commit(peer_remote_c2).values_list('name', flat=True)),
+      { "division0", "division1", "remote division" },
+    )
+    self.assertEqual(
+      set(Division.objects.using('peer').at_commit(local_c2).values_list('name', flat=True)),
+      { "division0", "division1", "local division" },
+    )
+
+  def test_refs(self):
+    Ref.create_branch("main", self.c0)
+    make_commit(self.c1, "unpublished")
+
+    remote = Endpoint(Commit, using='default', refs=Ref.objects.all())
+    self.assertEqual(remote.head_checksums(), [ self.c0.checksum ])
+    fetched = fetch(self.local, LocalTransport(remote))
+    self.assertEqual([ c.checksum for c in fetched ], [ self.c0.checksum ])
@@ -0,0 +1,39 @@
+from django.test import TestCase
+
+from examples.models import Division, Team, Employee, Commit, Ref
+from tests.synthetic import generate
+
+
+class SyntheticRepositoryTestCase(TestCase):
+
+  def test_generate(self):
+    repo = generate(depth=6, width=5, edits=2, churn=1, branches=2, branch_depth=2, tags=3)
+
+    # one import commit per model, then the main branch
+    self.assertEqual(len(repo.main), 3 + 6)
+    self.assertEqual([ c.level for c in repo.main ], list(range(9)))
+    head = repo.main[-1]
+    self.assertEqual(
+      { model: set(versions.values()) for (model, versions) in repo.live.items() },
+      { model: set(versions.values()) for (model, versions) in head.version_sets().items() },
+    )
+    for model in (Division, Team, Employee):
+      self.assertEqual(model.objects.at_commit(head).count(), 5)
+
+    self.assertEqual(sorted(repo.branches), [ "branch-0", "branch-1" ])
+    for commits in repo.branches.values():
+      self.assertEqual(len(commits), 3)
+      self.assertEqual(commits[-1].parent_commit.parent_commit, commits[0])
+      self.assertIn(commits[0], repo.main)
+
+    self.assertEqual(Ref.branches().count(), 3)
+    self.assertEqual([ t.head for t in Ref.tags() ], [ repo.main[0], repo.main[4], repo.main[8] ])
+    self.assertFalse(Commit.objects.filter(checksum__isnull=True).exists())
+
+  def test_deterministic(self):
+    names = []
+    for _run in range(2):
+      repo = generate(depth=3, width=3, models=(Division,))
+      names.append(sorted(Division.objects.at_commit(repo.main[-1]).values_list('name', flat=True)))
+      Ref.objects.all().delete()
+    self.assertEqual(names[0], names[1])